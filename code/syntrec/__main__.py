@@ -0,0 +1,3 @@
+from syntrec.syntrec import main
+
+raise SystemExit(main())
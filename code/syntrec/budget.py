@@ -0,0 +1,247 @@
+"""
+Provides per-document budgets for preprocessing. A few huge or pathological
+documents can dominate the wall time of a preprocessing run, or exhaust memory
+and take the whole run down with them.
+
+A `DocumentBudget` limits the number of characters and sections of each
+document; documents over budget are either truncated (keeping the title, the
+first sections and as much text as fits, cut at a space) or skipped. A
+`BudgetedProcessor` additionally tokenizes documents in a worker process under
+a wall-time limit: a worker that overruns is killed and the document skipped.
+Workers are recycled after a number of documents or when their memory use has
+grown too far, so throughput stays steady over long runs.
+"""
+
+import copy
+import multiprocessing
+import resource
+import warnings
+
+TRUNCATE = 'truncate'
+SKIP = 'skip'
+
+class BudgetExceeded(Exception):
+    """
+    Raised when a document is skipped for exceeding its budget.
+    """
+
+class DocumentBudget:
+    """
+    Limits on the size of a single document. Any limit may be None, meaning no
+    limit. `policy` is either 'truncate' or 'skip'.
+    """
+
+    def __init__(self, max_chars=None, max_sections=None, policy=TRUNCATE):
+
+        if policy not in (TRUNCATE, SKIP):
+            raise ValueError("Unsupported budget policy: %s" % policy)
+
+        self.max_chars = max_chars
+        self.max_sections = max_sections
+        self.policy = policy
+
+    def apply(self, document):
+        """
+        Applies the budget to a document, returning the document itself if it
+        is within budget or a truncated copy if not. Raises `BudgetExceeded`
+        if the document is over budget and the policy is to skip.
+        """
+
+        sections = document.sections
+        num_chars = sum(len(section.content or '') for section in sections)
+
+        over_sections = self.max_sections is not None and \
+                len(sections) > self.max_sections
+        over_chars = self.max_chars is not None and num_chars > self.max_chars
+        if not (over_sections or over_chars):
+            return document
+
+        if self.policy == SKIP:
+            raise BudgetExceeded("%d sections, %d characters" % (
+                len(sections), num_chars))
+
+        if over_sections:
+            sections = sections[:self.max_sections]
+
+        if self.max_chars is not None:
+            remaining = self.max_chars
+            kept = []
+            for section in sections:
+                content = section.content or ''
+                if len(content) > remaining:
+                    section = copy.copy(section)
+                    cut = content.rfind(' ', 0, remaining)
+                    section.content = content[:cut if cut > 0 else remaining]
+                    kept.append(section)
+                    break
+                kept.append(section)
+                remaining -= len(content)
+            sections = kept
+
+        truncated = copy.copy(document)
+        truncated.sections = sections
+
+        return truncated
+
+class BudgetedProcessor:
+    """
+    Tokenizes documents in a worker process, applying a document budget and a
+    wall-time limit of `max_seconds` per document. The worker is replaced
+    after `max_documents` documents or once its peak memory has grown by more
+    than `max_rss_growth` megabytes. Instances are called like the tokenizers
+    of `syntrec.preprocess.get_tokenizer`, raising `BudgetExceeded` for
+    skipped documents.
+
+    Workers are forked from the current process, so they inherit its
+    Parmenides settings.
+    """
+
+    def __init__(self, processor, budget=None, max_seconds=None,
+            max_documents=None, max_rss_growth=None):
+
+        self.processor = processor
+        self.budget = budget or DocumentBudget()
+        self.max_seconds = max_seconds
+        self.max_documents = max_documents
+        self.max_rss_growth = max_rss_growth
+
+        self.connection = None
+        self.process = None
+        self.num_processed = 0
+
+        self.log = []
+        self.stats = {'processed': 0, 'truncated': 0, 'skipped': 0,
+                'timeouts': 0, 'recycled': 0}
+
+    def __call__(self, document):
+
+        try:
+            budgeted = self.budget.apply(document)
+        except BudgetExceeded as error:
+            self.skip(document, str(error))
+            raise
+        if budgeted is not document:
+            self.stats['truncated'] += 1
+            self.log.append((document.identifier, 'truncated'))
+
+        if self.process is None:
+            self.start()
+
+        self.connection.send(budgeted)
+        if not self.connection.poll(self.max_seconds):
+            self.stop(kill=True)
+            self.stats['timeouts'] += 1
+            reason = "exceeded %s seconds" % self.max_seconds
+            self.skip(document, reason)
+            raise BudgetExceeded(reason)
+
+        try:
+            tokens, error, rss_growth = self.connection.recv()
+        except EOFError:
+            # The worker died, most likely after running out of memory.
+            self.stop(kill=True)
+            reason = "worker exited while processing"
+            self.skip(document, reason)
+            raise BudgetExceeded(reason)
+        self.num_processed += 1
+        self.stats['processed'] += 1
+
+        if (self.max_documents is not None and \
+                self.num_processed >= self.max_documents) or \
+                (self.max_rss_growth is not None and \
+                rss_growth > self.max_rss_growth):
+            self.stop()
+            self.stats['recycled'] += 1
+
+        if error is not None:
+            raise error
+
+        return tokens
+
+    def skip(self, document, reason):
+
+        self.stats['skipped'] += 1
+        self.log.append((document.identifier, 'skipped: %s' % reason))
+        warnings.warn("Skipping document %s: %s" % (document.identifier,
+            reason))
+
+    def start(self):
+
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=work,
+                args=(child, self.processor), daemon=True)
+        self.process.start()
+        child.close()
+        self.num_processed = 0
+
+    def stop(self, kill=False):
+
+        if self.process is None:
+            return
+
+        if kill:
+            self.process.kill()
+        else:
+            self.connection.send(None)
+        self.process.join()
+        self.connection.close()
+        self.process = None
+        self.connection = None
+
+    def write_log(self, filename):
+
+        with open(filename, 'w') as outfile:
+            for doc_id, action in self.log:
+                outfile.write("%s\t%s\n" % (doc_id, action))
+
+    def close(self):
+
+        self.stop()
+
+def get_budgeted_processor(processor, max_chars=None, max_sections=None,
+        policy=TRUNCATE, max_seconds=None, max_documents=None,
+        max_rss_growth=None):
+    """
+    Gets a budgeted processor from a flat set of budget settings, as recorded
+    in pipeline parameters.
+    """
+
+    return BudgetedProcessor(processor,
+            DocumentBudget(max_chars, max_sections, policy),
+            max_seconds, max_documents, max_rss_growth)
+
+def work(connection, processor):
+    """
+    Tokenizes documents received over a connection until a `None` message is
+    received, replying with the tokens (or the error raised), and the growth
+    in the worker's peak memory, in megabytes, since it started.
+    """
+
+    from syntrec.preprocess import get_tokenizer
+
+    get_tokens = get_tokenizer(processor)
+    initial_rss = get_peak_rss()
+
+    while True:
+        document = connection.recv()
+        if document is None:
+            break
+
+        tokens = None
+        error = None
+        try:
+            tokens = get_tokens(document)
+        except Exception as exception:
+            error = exception
+
+        connection.send((tokens, error, get_peak_rss() - initial_rss))
+
+    connection.close()
+
+def get_peak_rss():
+    """
+    Gets the peak resident set size of the current process in megabytes.
+    """
+
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
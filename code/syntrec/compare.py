@@ -0,0 +1,213 @@
+"""
+Provides comparisons of many runs with paired significance tests. Whether
+syntactic terms help is judged by comparing runs (PARMLSI against WORDLSI,
+say) topic by topic, over many models, topic counts and topic fields, which
+means dozens of run files and hundreds of pairs.
+
+The runs are loaded into a single array holding the relevance of the document
+at each rank of each topic of each run, from which the measures of
+`syntrec.metrics` are computed for every run and topic at once. Pairs of runs
+are then compared with two paired tests over the topics, each drawing its
+resamples once for all pairs, so that every test is a matrix product:
+
+* the randomization test, which flips the sign of the difference of each
+  topic at random, and
+* the bootstrap test, which resamples the topics with replacement and
+  measures how far the mean difference strays from the observed one; the
+  bootstrap also gives a confidence interval for the difference.
+
+Topics are those judged in the qrels and ranked by at least one run; a run
+that does not rank a topic scores zero on it, as with `trec_eval -c`.
+"""
+
+import itertools
+import os
+
+import numpy as np
+
+from syntrec.metrics import CUTOFF, read_run
+
+NUM_SAMPLES = 10000
+CONFIDENCE = 0.95
+
+class RunSet:
+    """
+    A set of runs over the same topics. `relevance` holds the relevance of
+    the document at each rank, with one row per run and topic, and `ideal`
+    the relevances of the judged documents of each topic in descending order.
+    """
+
+    def __init__(self, names, topics, relevance, ideal):
+
+        self.names = names
+        self.topics = topics
+        self.relevance = relevance
+        self.ideal = ideal
+
+    @classmethod
+    def load(cls, filenames, qrels, names=None):
+        """
+        Loads run files, named after the files unless `names` are given,
+        against a dictionary of relevance judgments (see
+        `syntrec.metrics.read_qrels`).
+        """
+
+        names = names or [os.path.splitext(os.path.basename(filename))[0] \
+                for filename in filenames]
+        rankings = [read_run(filename) for filename in filenames]
+
+        topics = sorted(set(qrels) & set(topic for ranked in rankings for \
+                topic in ranked))
+        if not topics:
+            raise ValueError("No ranked topic has relevance judgments")
+        depth = max(len(ranked[topic]) for ranked in rankings for topic in \
+                ranked if topic in qrels)
+
+        relevance = np.zeros((len(rankings), len(topics), depth),
+                dtype=np.int8)
+        for run, ranked in enumerate(rankings):
+            for position, topic in enumerate(topics):
+                judgments = qrels[topic]
+                row = [judgments.get(doc_id, 0) for doc_id in \
+                        ranked.get(topic, [])]
+                relevance[run, position, :len(row)] = row
+
+        gains = [sorted((value for value in qrels[topic].values() if \
+                value > 0), reverse=True) for topic in topics]
+        ideal = np.zeros((len(topics), max(max(len(topic_gains) for \
+                topic_gains in gains), 1)), dtype=np.int8)
+        for position, topic_gains in enumerate(gains):
+            ideal[position, :len(topic_gains)] = topic_gains
+
+        return cls(names, topics, np.maximum(relevance, 0), ideal)
+
+    def get_scores(self, k=CUTOFF):
+        """
+        Gets the score of every run on every topic for each measure, as a
+        dictionary mapping measure names to arrays with one row per run.
+        """
+
+        relevant = self.relevance > 0
+        ranks = np.arange(1, self.relevance.shape[2] + 1)
+        num_relevant = (self.ideal > 0).sum(axis=1)
+
+        precisions = np.cumsum(relevant, axis=2) / ranks
+        average_precision = (precisions * relevant).sum(axis=2) / \
+                np.maximum(num_relevant, 1)
+
+        discounts = 1 / np.log2(np.arange(2, k + 2))
+        top = self.relevance[:, :, :k]
+        dcg = (top * discounts[:top.shape[2]]).sum(axis=2)
+        ideal = self.ideal[:, :k]
+        ideal_dcg = (ideal * discounts[:ideal.shape[1]]).sum(axis=1)
+        ndcg = np.divide(dcg, ideal_dcg, out=np.zeros_like(dcg),
+                where=ideal_dcg > 0)
+
+        return {
+            'map': average_precision,
+            'P_%d' % k: relevant[:, :, :k].sum(axis=2) / k,
+            'ndcg_cut_%d' % k: ndcg,
+        }
+
+def compare(scores, pairs=None, num_samples=NUM_SAMPLES, seed=0,
+        confidence=CONFIDENCE):
+    """
+    Compares pairs of runs on the per-topic scores of a measure (an array with
+    one row per run), by default every pair. Returns a list with a dictionary
+    for each pair: the runs' indexes and mean scores, the mean difference, its
+    confidence interval from the bootstrap, and the two-sided p-values of
+    the randomization and bootstrap tests, with Holm's correction for the
+    number of pairs.
+    """
+
+    num_runs, num_topics = scores.shape
+    if pairs is None:
+        pairs = list(itertools.combinations(range(num_runs), 2))
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    differences = scores[pairs[:, 0]] - scores[pairs[:, 1]]
+    observed = differences.mean(axis=1)
+
+    random_state = np.random.RandomState(seed)
+    signs = random_state.choice([-1.0, 1.0], size=(num_samples, num_topics))
+    counts = random_state.multinomial(num_topics, [1 / num_topics] * \
+            num_topics, size=num_samples).astype(np.float64)
+
+    # Small tolerances keep resamples equal to the observed difference from
+    # being lost to rounding.
+    tolerance = 1e-12
+    permuted = differences @ signs.T / num_topics
+    p_randomization = ((np.abs(permuted) >= np.abs(observed)[:, None] - \
+            tolerance).sum(axis=1) + 1) / (num_samples + 1)
+
+    bootstrapped = differences @ counts.T / num_topics
+    shifted = bootstrapped - observed[:, None]
+    p_bootstrap = ((np.abs(shifted) >= np.abs(observed)[:, None] - \
+            tolerance).sum(axis=1) + 1) / (num_samples + 1)
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(bootstrapped, [tail, 100 - tail], axis=1)
+
+    means = scores.mean(axis=1)
+    results = []
+    for number, (first, second) in enumerate(pairs):
+        results.append({
+            'first': int(first),
+            'second': int(second),
+            'first_mean': float(means[first]),
+            'second_mean': float(means[second]),
+            'difference': float(observed[number]),
+            'low': float(low[number]),
+            'high': float(high[number]),
+            'p_randomization': float(p_randomization[number]),
+            'p_bootstrap': float(p_bootstrap[number]),
+        })
+
+    for test in ('randomization', 'bootstrap'):
+        adjusted = holm([result['p_%s' % test] for result in results])
+        for result, value in zip(results, adjusted):
+            result['p_%s_holm' % test] = value
+
+    return results
+
+def holm(pvalues):
+    """
+    Adjusts p-values for multiple comparisons with Holm's step-down method.
+    """
+
+    pvalues = np.asarray(pvalues, dtype=np.float64)
+    order = np.argsort(pvalues)
+    factors = len(pvalues) - np.arange(len(pvalues))
+    adjusted = np.minimum(np.maximum.accumulate(pvalues[order] * factors), 1)
+
+    result = np.empty_like(adjusted)
+    result[order] = adjusted
+
+    return [float(value) for value in result]
+
+def print_means(names, scores):
+    """
+    Prints the mean of each measure for each run.
+    """
+
+    measures = sorted(scores)
+    width = max(len(name) for name in names)
+    print("%-*s %s" % (width, 'run', ' '.join('%11s' % measure for \
+            measure in measures)))
+    for run, name in enumerate(names):
+        print("%-*s %s" % (width, name, ' '.join('%11.4f' % \
+                scores[measure][run].mean() for measure in measures)))
+
+def print_comparisons(names, results, confidence=CONFIDENCE):
+    """
+    Prints the comparisons of pairs of runs.
+    """
+
+    width = max(len(name) for name in names)
+    print("%-*s %-*s %9s %19s %9s %9s %9s %9s" % (width, 'first', width,
+        'second', 'diff', '%d%% interval' % round(confidence * 100),
+        'p (rand)', 'holm', 'p (boot)', 'holm'))
+    for result in results:
+        print("%-*s %-*s %9.4f [%8.4f, %8.4f] %9.4f %9.4f %9.4f %9.4f" % (
+            width, names[result['first']], width, names[result['second']],
+            result['difference'], result['low'], result['high'],
+            result['p_randomization'], result['p_randomization_holm'],
+            result['p_bootstrap'], result['p_bootstrap_holm']))
@@ -0,0 +1,299 @@
+"""
+Provides readers for preprocessed term files. A term file is a space-separated
+text file in which each line represents a document: the first word of each
+line is the document's identifier and the remaining words are its terms.
+Syntactic terms are expanded into templates as they are read.
+
+A template replaces one subterm of a term with a blank: `_:N:x` blanks the
+left subterm of a join at height N and `x:N:_` the right. Which templates are
+generated is set by a `TemplatePolicy`: how many levels below each term to go,
+which of the two shapes to generate, and which templates to keep by their
+document frequency. The frequencies are learned when the dictionary is built
+(see `syntrec.dictionary`), so the dictionary of a policy with frequency
+bounds holds only the templates within them. Corpora over such a dictionary
+bind the policy to it, so the others are not generated at all on later
+passes, and never reach a bag of words or a model.
+"""
+
+import re
+
+from syntrec.offsets import TermFileIndex
+
+TERM_HEIGHT = re.compile(r':(\d+):')
+
+LEFT = 'left'
+RIGHT = 'right'
+SHAPES = [LEFT, RIGHT]
+
+class TemplatePolicy:
+    """
+    The templates generated from each term: those at most `max_depth` levels
+    below it (or without limit if `max_depth` is None) of the given shapes.
+    Templates in fewer than `min_df` documents, or in more than the fraction
+    `max_df` of documents, are left out of the dictionary (either bound may
+    be None, meaning no bound). With no arguments, the policy generates both
+    shapes to three levels and keeps every template.
+    """
+
+    def __init__(self, max_depth=3, shapes=None, min_df=None, max_df=None):
+
+        self.max_depth = max_depth
+        self.shapes = list(SHAPES if shapes is None else shapes)
+        self.min_df = min_df
+        self.max_df = max_df
+        self.vocabulary = None
+
+        for shape in self.shapes:
+            if shape not in SHAPES:
+                raise ValueError("Unsupported template shape: %s" % shape)
+
+    @classmethod
+    def from_dict(cls, data):
+
+        return cls(**data)
+
+    def to_dict(self):
+
+        return {
+            'max_depth': self.max_depth,
+            'shapes': self.shapes,
+            'min_df': self.min_df,
+            'max_df': self.max_df,
+        }
+
+    def bind(self, vocabulary):
+        """
+        Gets a copy of the policy which generates only the templates in a
+        vocabulary (any container of tokens, such as the `token2id` of a
+        dictionary built under the policy). Templates pruned by the frequency
+        bounds are then skipped as terms are expanded, rather than generated
+        on every pass over a corpus and dropped by `doc2bow`. A policy
+        without frequency bounds is returned as it is.
+        """
+
+        if not self.is_filtered():
+            return self
+
+        bound = TemplatePolicy(self.max_depth, self.shapes, self.min_df,
+                self.max_df)
+        bound.vocabulary = vocabulary
+
+        return bound
+
+    def get_templates(self, term):
+        """
+        Gets the templates of a single term.
+        """
+
+        if not self.shapes or self.max_depth == 0 or ':' not in term:
+            return []
+
+        tree = TermTree.from_term(term)
+
+        return list(tree.get_templates(max_depth=self.max_depth,
+            left=LEFT in self.shapes, right=RIGHT in self.shapes,
+            vocabulary=self.vocabulary))
+
+    def is_filtered(self):
+
+        return self.min_df is not None or self.max_df is not None
+
+    def filter_dictionary(self, dictionary):
+        """
+        Removes the templates outside the document frequency bounds from a
+        gensim dictionary, renumbering the remaining tokens.
+        """
+
+        if not self.is_filtered():
+            return
+
+        max_count = None
+        if self.max_df is not None:
+            max_count = self.max_df * dictionary.num_docs
+        bad_ids = [token_id for token, token_id in \
+                dictionary.token2id.items() if is_template(token) and \
+                ((self.min_df is not None and \
+                dictionary.dfs.get(token_id, 0) < self.min_df) or \
+                (max_count is not None and \
+                dictionary.dfs.get(token_id, 0) > max_count))]
+        dictionary.filter_tokens(bad_ids=bad_ids)
+        dictionary.compactify()
+
+def get_policy(templates):
+    """
+    Gets a template policy from a policy, a dictionary of its arguments, or
+    None for the default policy.
+    """
+
+    if templates is None:
+        return TemplatePolicy()
+    elif isinstance(templates, TemplatePolicy):
+        return templates
+    else:
+        return TemplatePolicy.from_dict(templates)
+
+def is_template(token):
+
+    return token.startswith('_:') or token.endswith(':_')
+
+class TrecReader:
+    """
+    An iterator over documents in a term file. Each returned document is a
+    tuple containing the document ID and the list of tokens, including any
+    templates generated from the document's terms under a template policy
+    (see `TemplatePolicy`; by default, the default policy).
+
+    The reader's `index` is the term file's offset index, which maps document
+    positions to IDs. A reader may be limited to the documents at positions
+    `start` to `stop`, so that several readers can share a file.
+    """
+
+    def __init__(self, filename, templates=None, start=0, stop=None):
+
+        self.filename = filename
+        self.templates = get_policy(templates)
+        self.index = TermFileIndex.load(filename)
+        self.start = start
+        self.stop = len(self.index) if stop is None else stop
+
+    def __iter__(self):
+
+        if self.start >= self.stop:
+            return
+
+        with open(self.filename, 'rb') as infile:
+            infile.seek(int(self.index.offsets[self.start]))
+            for _ in range(self.stop - self.start):
+                yield get_tokens(infile.readline().decode('utf-8'),
+                        self.templates)
+
+    def __len__(self):
+
+        return self.stop - self.start
+
+    def __getitem__(self, position):
+
+        return get_tokens(self.index.read_line(position), self.templates)
+
+class TrecCorpus:
+    """
+    An iterator over bags of words representing the documents in a term file.
+    This uses the gensim BOW model and thus requires a gensim dictionary. The
+    corpus's `index` maps document positions to document IDs. Only templates
+    in the dictionary are generated (see `TemplatePolicy.bind`).
+    """
+
+    def __init__(self, dictionary, filename, templates=None, start=0,
+            stop=None):
+
+        self.dictionary = dictionary
+        self.filename = filename
+        self.templates = get_policy(templates).bind(dictionary.token2id)
+        self.reader = TrecReader(filename, self.templates, start, stop)
+        self.index = self.reader.index
+
+    def __iter__(self):
+
+        for doc in self.reader:
+            yield self.dictionary.doc2bow(doc[1])
+
+    def __len__(self):
+
+        return len(self.reader)
+
+    def __getitem__(self, position):
+
+        return self.dictionary.doc2bow(self.reader[position][1])
+
+def get_tokens(line, templates=None):
+    """
+    Splits a line of a term file into the document ID and the document's
+    tokens, expanding each term into its templates under a template policy.
+    """
+
+    policy = get_policy(templates)
+    words = line.split()
+    expanded = []
+    for word in words[1:]:
+        expanded.extend(policy.get_templates(word))
+    words += expanded
+
+    return (words[0], words[1:])
+
+class TermTree:
+    """
+    A binary tree representation of a syntactic term. Leaves are words; each
+    internal node records the height at which its two subterms were joined.
+    """
+
+    def __init__(self, node, left=None, right=None):
+
+        self.node = node
+        self.left = left
+        self.right = right
+        self.next_node = None
+
+    def __str__(self):
+
+        return self.to_term()
+
+    def get_height(self):
+
+        return self.node if isinstance(self.node, int) else -1
+
+    def to_term(self):
+
+        if isinstance(self.node, int):
+            return "%s:%d:%s" % (self.left, self.node, self.right)
+        else:
+            return self.node
+
+    @classmethod
+    def from_term(cls, term):
+
+        queue = TERM_HEIGHT.split(term)
+        for i in range(len(queue)):
+            if i % 2 == 0:
+                queue[i] = TermTree(queue[i])
+            else:
+                queue[i] = int(queue[i])
+        stack = []
+
+        while len(queue) > 0:
+            next_item = queue.pop(0)
+
+            if len(stack) == 0:
+                stack.append(next_item)
+            elif isinstance(next_item, int):
+                stack[-1].next_node = next_item
+            else:
+                current_height = next_item.get_height()
+                next_height = stack[-1].next_node
+                if next_height == current_height + 1:
+                    new_tree = TermTree(next_height, stack.pop(), next_item)
+                    queue.insert(0, new_tree)
+                else:
+                    stack.append(next_item)
+
+        return stack[0]
+
+    def get_templates(self, depth=0, max_depth=3, left=True, right=True,
+            vocabulary=None):
+
+        if max_depth is not None and depth >= max_depth:
+            pass
+        elif isinstance(self.node, int):
+            if left:
+                template = "_:%d:%s" % (self.node, self.right)
+                if vocabulary is None or template in vocabulary:
+                    yield template
+            if right:
+                template = "%s:%d:_" % (self.left, self.node)
+                if vocabulary is None or template in vocabulary:
+                    yield template
+            for template in self.left.get_templates(depth+1, max_depth, left,
+                    right, vocabulary):
+                yield template
+            for template in self.right.get_templates(depth+1, max_depth,
+                    left, right, vocabulary):
+                yield template
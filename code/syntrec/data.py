@@ -0,0 +1,228 @@
+"""
+Provides functions for locating TREC data: the document samples to be
+processed, the files in which they are stored, and the topics against which
+models are evaluated. Topics are returned as Parmenides documents.
+"""
+
+import csv
+import os
+
+from bs4 import BeautifulSoup
+from parmenides.document import Document, Section
+
+class FileDescription:
+    """
+    Describes how an article is represented in CORD-19. Articles without a
+    full-text parse have no `filename`; only their title and abstract are
+    available.
+    """
+
+    def __init__(self, cord_uid, title, abstract=None, filename=None):
+
+        self.cord_uid = cord_uid
+        self.title = title
+        self.abstract = abstract
+        self.filename = filename
+
+def get_samples(filenames):
+    """
+    Gets the set of samples used in any number of TREC qrel files.
+    """
+
+    samples = set()
+
+    for filename in filenames:
+        with open(filename, newline='') as infile:
+            reader = csv.reader(infile, delimiter=' ')
+
+            for row in reader:
+                samples.add(row[2])
+
+    return samples
+
+def get_cord_samples(filenames):
+    """
+    Gets the set of samples listed, one per line, in any number of CORD-19
+    document ID files.
+    """
+
+    samples = set()
+
+    for filename in filenames:
+        with open(filename, 'r') as infile:
+            for line in infile:
+                samples.add(line.strip())
+
+    return samples
+
+def get_nxml_files(samples, directory='data/pmc2016'):
+    """
+    Gets the paths of the NXML files for the given samples.
+    """
+
+    return (os.path.join(directory, str(sample) + '.nxml') \
+            for sample in samples)
+
+def get_metadata(metafile):
+    """
+    Reads the CORD-19 metadata file into a dictionary keyed by CORD UID.
+    """
+
+    docs = {}
+
+    with open(metafile, newline='') as infile:
+        reader = csv.DictReader(infile)
+
+        for line in reader:
+            docs[line['cord_uid']] = line
+
+    return docs
+
+def get_sample_files(metadata, docids, directory='data/2020-07-16'):
+    """
+    Gets a file description for each of the given CORD-19 samples, preferring
+    PDF parses to PMC parses and falling back to the abstract alone.
+    """
+
+    for docid in docids:
+        meta = metadata[docid]
+
+        pdf_json_files = [doc.strip() for doc in \
+            meta['pdf_json_files'].split(';') if doc.strip()]
+        pmc_json_files = [doc.strip() for doc in \
+            meta['pmc_json_files'].split(';') if doc.strip()]
+
+        if len(pdf_json_files) >= 1:
+            yield FileDescription(
+                docid,
+                meta['title'],
+                meta['abstract'],
+                filename=os.path.join(directory, pdf_json_files[0]),
+            )
+        elif len(pmc_json_files) >= 1:
+            yield FileDescription(
+                docid,
+                meta['title'],
+                meta['abstract'],
+                filename=os.path.join(directory, pmc_json_files[0]),
+            )
+        else:
+            yield FileDescription(
+                docid,
+                meta['title'],
+                meta['abstract'],
+            )
+
+TOPIC_FIELDS = {
+    'cds': ['note', 'description', 'summary'],
+    'covid': ['query', 'question', 'narrative'],
+}
+DEFAULT_FIELDS = {'cds': 'summary', 'covid': 'narrative'}
+
+def get_topics(topfile, topic_type, section=None):
+    """
+    Gets TREC topics from an XML file. Since the nature of topics varies from
+    one TREC corpus to another, the topic type must be provided, naming a
+    supported topic format. The section names the topic field used as the
+    content of each topic; if omitted, the track's default field is used.
+    """
+
+    if topic_type == 'cds':
+        return get_cds_topics(topfile, section or DEFAULT_FIELDS['cds'])
+    elif topic_type == 'covid':
+        return get_covid_topics(topfile,
+                section or DEFAULT_FIELDS['covid'])
+    else:
+        raise TypeError("Unsupported topic type: %s" % topic_type)
+
+def get_cds_topics(topfile, section='summary'):
+    """
+    Gets the topics from the TREC CDS track.
+    """
+
+    with open(topfile, 'r') as infile:
+        soup = BeautifulSoup(infile.read(), 'xml')
+
+        for topic in soup.find_all('topic'):
+            number = topic['number']
+            topic_type = topic['type']
+
+            note = topic.note.string
+            description = topic.description.string
+            summary = topic.summary.string
+
+            if section == 'note':
+                section_content = note
+            elif section == 'description':
+                section_content = description
+            else:
+                section_content = summary
+
+            yield Document(
+                identifier=number,
+                title=topic_type,
+                sections=[Section(name=section, content=section_content)],
+                collection='topics',
+            )
+
+def get_covid_topics(topfile, section='narrative'):
+    """
+    Gets the topics from the TREC-COVID dataset.
+    """
+
+    with open(topfile, 'r') as infile:
+        soup = BeautifulSoup(infile.read(), 'xml')
+
+        for topic in soup.find_all('topic'):
+            number = topic['number']
+
+            query = topic.query.string
+            question = topic.question.string
+            narrative = topic.narrative.string
+
+            if section == 'query':
+                section_content = query
+            elif section == 'question':
+                section_content = question
+            else:
+                section_content = narrative
+
+            yield Document(
+                identifier=number,
+                title=query,
+                sections=[Section(name=section, content=section_content)],
+                collection='topics',
+            )
+
+def get_topic_fields(topfile, topic_type):
+    """
+    Gets TREC topics from an XML file once for every field of the topic type.
+    Returns a dictionary mapping each field name to a list of topics with that
+    field as content, in the order of the file.
+    """
+
+    if topic_type not in TOPIC_FIELDS:
+        raise TypeError("Unsupported topic type: %s" % topic_type)
+
+    fields = {field: [] for field in TOPIC_FIELDS[topic_type]}
+
+    with open(topfile, 'r') as infile:
+        soup = BeautifulSoup(infile.read(), 'xml')
+
+        for topic in soup.find_all('topic'):
+            number = topic['number']
+            if topic_type == 'cds':
+                title = topic['type']
+            else:
+                title = topic.query.string
+
+            for field, field_topics in fields.items():
+                field_topics.append(Document(
+                    identifier=number,
+                    title=title,
+                    sections=[Section(name=field,
+                        content=topic.find(field).string)],
+                    collection='topics',
+                ))
+
+    return fields
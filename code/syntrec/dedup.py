@@ -0,0 +1,231 @@
+"""
+Provides near-duplicate detection for document collections. CORD-19 contains
+many copies of the same paper (under several sources, as a preprint and as a
+published version, or sharing an abstract), and parsing each copy separately
+wastes most of the time spent on them.
+
+Each document's text (title, abstract and body) is reduced to a MinHash
+signature over its word shingles. Signatures are split into bands for
+locality-sensitive hashing; documents sharing a band are candidates, and a
+candidate is accepted as a duplicate if its estimated Jaccard similarity
+reaches the threshold. Each group of duplicates has one canonical copy, the
+longest; only the canonical copy needs to be parsed, and its terms are then
+written under the IDs of every copy.
+"""
+
+import json
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+from syntrec.source.stream import iter_sections
+
+NUM_PERMUTATIONS = 128
+NUM_BANDS = 32
+SHINGLE_SIZE = 5
+THRESHOLD = 0.8
+SEED = 1
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+WORD = re.compile(r'\w+')
+
+class MinHasher:
+    """
+    Computes MinHash signatures of `num_permutations` values, using random
+    universal hash functions drawn from a fixed seed.
+    """
+
+    def __init__(self, num_permutations=NUM_PERMUTATIONS, seed=SEED):
+
+        generator = np.random.RandomState(seed)
+        self.a = generator.randint(1, 1 << 32, num_permutations,
+                dtype=np.uint64)
+        self.b = generator.randint(0, 1 << 32, num_permutations,
+                dtype=np.uint64)
+
+    def get_signature(self, hashes):
+        """
+        Gets the signature of a set of 32-bit shingle hashes. Each value is
+        `(a * x + b) % p` for the prime `p = 2**61 - 1`, truncated to 32
+        bits. Since `a`, `b` and `x` are below `2**32`, `a * x` and
+        `a * x % p + b` fit in 64 bits, so the values are computed exactly.
+        """
+
+        hashes = np.asarray(hashes, dtype=np.uint64) & MAX_HASH
+        values = (np.outer(self.a, hashes) % MERSENNE_PRIME + \
+                self.b[:, None]) % MERSENNE_PRIME & MAX_HASH
+
+        return values.min(axis=1).astype(np.uint32)
+
+class Duplicates:
+    """
+    The duplicate groups of a collection, as a mapping from the ID of each
+    duplicate to the ID of its canonical copy. Also records how long canonical
+    copies take to parse, in order to estimate the time saved by skipping the
+    duplicates, and which duplicates were dropped because their canonical
+    copy was.
+    """
+
+    def __init__(self, canonical, lengths=None):
+
+        self.canonical = canonical
+        self.lengths = lengths or {}
+        self.copies = defaultdict(list)
+        for doc_id, canonical_id in canonical.items():
+            self.copies[canonical_id].append(doc_id)
+
+        self.parse_seconds = 0.0
+        self.parse_chars = 0
+        self.dropped = []
+
+    @classmethod
+    def load(cls, filename):
+
+        with open(filename, 'r') as infile:
+            data = json.load(infile)
+
+        return cls(data['canonical'], data['lengths'])
+
+    def save(self, filename):
+
+        with open(filename, 'w') as outfile:
+            json.dump({'canonical': self.canonical, 'lengths': self.lengths},
+                    outfile)
+
+    def is_duplicate(self, doc_id):
+
+        return doc_id in self.canonical
+
+    def get_copies(self, doc_id):
+
+        return self.copies.get(doc_id, [])
+
+    def record_parse(self, document, seconds):
+
+        self.parse_seconds += seconds
+        self.parse_chars += get_length(document)
+
+    def record_dropped(self, doc_id, reason):
+        """
+        Records that the copies of a canonical document were left out of the
+        term file along with it, for the given reason.
+        """
+
+        for copy_id in self.get_copies(doc_id):
+            self.dropped.append((copy_id, "dropped with canonical %s: %s" % (
+                doc_id, reason)))
+
+    def write_log(self, filename):
+
+        with open(filename, 'w') as outfile:
+            for doc_id, action in self.dropped:
+                outfile.write("%s\t%s\n" % (doc_id, action))
+
+    def get_report(self):
+        """
+        Summarizes the duplicates found and estimates the parse time saved,
+        assuming that parse time is proportional to document length.
+        """
+
+        skipped_chars = sum(self.lengths.get(doc_id, 0) for doc_id in \
+                self.canonical)
+        rate = self.parse_seconds / self.parse_chars \
+                if self.parse_chars else 0.0
+
+        return {
+            'duplicates': len(self.canonical),
+            'dropped': len(self.dropped),
+            'groups': len(self.copies),
+            'parse_seconds': self.parse_seconds,
+            'skipped_chars': skipped_chars,
+            'estimated_seconds_saved': rate * skipped_chars,
+        }
+
+def find_duplicates(documents, threshold=THRESHOLD,
+        num_permutations=NUM_PERMUTATIONS, num_bands=NUM_BANDS,
+        shingle_size=SHINGLE_SIZE):
+    """
+    Finds the near-duplicate groups among a collection of Parmenides
+    documents. Only signatures and lengths are kept in memory.
+    """
+
+    hasher = MinHasher(num_permutations)
+    rows = num_permutations // num_bands
+
+    doc_ids = []
+    lengths = {}
+    signatures = []
+    buckets = defaultdict(list)
+
+    for document in documents:
+        text = get_text(document)
+        lengths[document.identifier] = len(text)
+        hashes = get_shingle_hashes(text, shingle_size)
+        if len(hashes) == 0:
+            continue
+
+        signature = hasher.get_signature(hashes)
+        position = len(doc_ids)
+        doc_ids.append(document.identifier)
+        signatures.append(signature)
+
+        for band in range(num_bands):
+            key = (band, signature[band * rows:(band + 1) * rows].tobytes())
+            buckets[key].append(position)
+
+    # Join candidates whose signatures agree closely enough.
+    parents = list(range(len(doc_ids)))
+
+    def find(position):
+        while parents[position] != position:
+            parents[position] = parents[parents[position]]
+            position = parents[position]
+        return position
+
+    for members in buckets.values():
+        first = members[0]
+        for other in members[1:]:
+            if find(first) != find(other) and np.mean(signatures[first] == \
+                    signatures[other]) >= threshold:
+                parents[find(other)] = find(first)
+
+    groups = defaultdict(list)
+    for position in range(len(doc_ids)):
+        groups[find(position)].append(doc_ids[position])
+
+    canonical = {}
+    for members in groups.values():
+        if len(members) > 1:
+            best = min(members, key=lambda doc_id: (-lengths[doc_id], doc_id))
+            for doc_id in members:
+                if doc_id != best:
+                    canonical[doc_id] = best
+
+    return Duplicates(canonical, {doc_id: lengths[doc_id] for doc_id in \
+            canonical})
+
+def get_text(document):
+
+    return ' '.join([document.title or ''] + [section.content or '' for \
+            section in iter_sections(document)])
+
+def get_length(document):
+
+    return len(document.title or '') + sum(len(section.content or '') for \
+            section in iter_sections(document))
+
+def get_shingle_hashes(text, size=SHINGLE_SIZE):
+    """
+    Gets the distinct CRC32 hashes of the word shingles of a text.
+    """
+
+    words = WORD.findall(text.lower())
+    shingles = {' '.join(words[i:i + size]) for i in \
+            range(max(len(words) - size + 1, 0))}
+
+    return np.array([zlib.crc32(shingle.encode('utf-8')) for shingle in \
+            shingles], dtype=np.uint64)
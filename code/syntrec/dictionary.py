@@ -0,0 +1,163 @@
+"""
+Provides a parallel dictionary builder for term files. Building a gensim
+dictionary means reading the whole term file and expanding every term into its
+templates, which in a single process is one of the slowest stages of an
+experiment. Here the file is split into byte ranges (see
+`syntrec.offsets.TermFileIndex.get_shards`), each counted by a worker, and the
+counts are merged into a gensim `Dictionary`.
+
+The result is the same as building the dictionary serially: gensim gives each
+new token of a document the next ID, in sorted order within the document, so
+tokens are numbered by the position of the first document they appear in and
+then by the tokens themselves. Unlike gensim, the builder never prunes the
+vocabulary; a serial build prunes once the vocabulary exceeds `PRUNE_AT`
+tokens, so a warning is given if the vocabulary is larger than that.
+
+Templates outside the document frequency bounds of the template policy (see
+`syntrec.corpus.TemplatePolicy`) are removed once the counts are merged, so
+the frequencies are learned in the same single pass.
+"""
+
+import multiprocessing
+import os
+import time
+import warnings
+from collections import Counter
+
+from gensim import corpora
+
+from syntrec.corpus import TrecReader, get_policy, is_template
+from syntrec.offsets import TermFileIndex
+
+PRUNE_AT = 2000000
+SHARDS_PER_WORKER = 4
+
+def build_dictionary(filename, templates=None, num_workers=None):
+    """
+    Builds a gensim dictionary over the tokens of a term file, including
+    templates generated under a template policy, with `num_workers` processes
+    (by default, one per CPU).
+    """
+
+    templates = get_policy(templates)
+    num_workers = num_workers or os.cpu_count() or 1
+    shards = TermFileIndex.load(filename).get_shards(num_workers * \
+            SHARDS_PER_WORKER)
+    tasks = [(filename, templates, start, stop) for start, stop in shards]
+
+    if num_workers == 1:
+        counts = [count_tokens(*task) for task in tasks]
+    else:
+        with multiprocessing.Pool(num_workers) as pool:
+            counts = pool.starmap(count_tokens, tasks)
+
+    dictionary = merge_counts(counts)
+    templates.filter_dictionary(dictionary)
+
+    return dictionary
+
+def count_tokens(filename, templates, start, stop):
+    """
+    Counts the tokens of the documents at positions `start` to `stop` of a
+    term file. Returns a dictionary mapping each token to the position of the
+    first document it appears in, its document frequency and its collection
+    frequency, along with the numbers of documents, positions and nonzeros.
+    """
+
+    stats = {}
+    num_pos = 0
+    num_nnz = 0
+
+    for position, (_, tokens) in enumerate(TrecReader(filename, templates,
+            start, stop), start):
+        counter = Counter(tokens)
+        for token, count in counter.items():
+            token_stats = stats.get(token)
+            if token_stats is None:
+                stats[token] = [position, 1, count]
+            else:
+                token_stats[1] += 1
+                token_stats[2] += count
+        num_pos += len(tokens)
+        num_nnz += len(counter)
+
+    return stats, stop - start, num_pos, num_nnz
+
+def merge_counts(counts):
+    """
+    Merges the token counts of several ranges of a term file into a gensim
+    dictionary.
+    """
+
+    merged = {}
+    dictionary = corpora.Dictionary()
+
+    for stats, num_docs, num_pos, num_nnz in counts:
+        for token, (first, dfs, cfs) in stats.items():
+            token_stats = merged.get(token)
+            if token_stats is None:
+                merged[token] = [first, dfs, cfs]
+            else:
+                token_stats[0] = min(token_stats[0], first)
+                token_stats[1] += dfs
+                token_stats[2] += cfs
+        dictionary.num_docs += num_docs
+        dictionary.num_pos += num_pos
+        dictionary.num_nnz += num_nnz
+
+    ordered = sorted(merged.items(), key=lambda item: (item[1][0], item[0]))
+    for token_id, (token, (_, dfs, cfs)) in enumerate(ordered):
+        dictionary.token2id[token] = token_id
+        dictionary.dfs[token_id] = dfs
+        dictionary.cfs[token_id] = cfs
+
+    if len(dictionary) > PRUNE_AT:
+        warnings.warn("The vocabulary has %d tokens; a serial build would" \
+                " have pruned it to %d" % (len(dictionary), PRUNE_AT))
+
+    return dictionary
+
+def compare_policies(filename, policies, stop=None):
+    """
+    Measures the cost of several template policies over the first `stop`
+    documents of a term file (or all of them): the seconds taken to read and
+    expand the documents, and the mean number of tokens per document, the
+    size of the vocabulary and the number of templates in it, each before and
+    after the frequency bounds. Returns a list of dictionaries, one for each
+    policy.
+    """
+
+    stop = len(TermFileIndex.load(filename)) if stop is None else stop
+    results = []
+
+    for policy in policies:
+        policy = get_policy(policy)
+        started = time.perf_counter()
+        stats, num_docs, num_pos, _ = count_tokens(filename, policy, 0, stop)
+        seconds = time.perf_counter() - started
+
+        kept_pos = 0
+        templates = []
+        kept = []
+        for token, (_, dfs, cfs) in stats.items():
+            if not is_template(token):
+                kept_pos += cfs
+                continue
+            templates.append(token)
+            if (policy.min_df is None or dfs >= policy.min_df) and \
+                    (policy.max_df is None or dfs <= policy.max_df * \
+                    num_docs):
+                kept.append(token)
+                kept_pos += cfs
+        results.append({
+            'policy': policy.to_dict(),
+            'seconds': seconds,
+            'tokens_per_doc': num_pos / max(num_docs, 1),
+            'kept_tokens_per_doc': kept_pos / max(num_docs, 1),
+            'vocabulary': len(stats),
+            'templates': len(templates),
+            'kept_vocabulary': len(stats) - len(templates) + len(kept),
+            'kept_templates': len(kept),
+        })
+
+    return results
@@ -0,0 +1,145 @@
+"""
+Provides functions for evaluating a topic model against a set of TREC topics.
+Each topic is converted into the model's vector space, compared against every
+document in an index, and the best-scoring documents are written to a run file
+in the format expected by `trec_eval`.
+"""
+
+import numpy as np
+
+from syntrec.ranking import fuse, top_k
+
+RUN_DEPTH = 1000
+FUSION_METHODS = ['rrf', 'combsum']
+
+def evaluate(doc_ids, topics, get_tokens, dictionary, index, model, filename,
+        run_name):
+    """
+    Evaluates a topic model, producing a file that contains the collected
+    relevance judgment predictions for each TREC topic. `get_tokens` converts
+    a topic into the list of tokens used to query the model, and `doc_ids` maps
+    index positions to document IDs.
+
+    Indexes which select their own best documents (see `get_rankings`) are
+    given every topic as one batch, since a `StreamingIndex` reads the whole
+    index from disk for each batch; any other index is queried one topic at
+    a time, so that only one row of similarities is held at once.
+    """
+
+    if hasattr(index, 'get_top'):
+        queries = [model[dictionary.doc2bow(get_tokens(topic))] for topic in \
+                topics]
+        write_run(filename, [topic.identifier for topic in topics],
+                zip(*get_top(index, queries)), doc_ids, run_name)
+        return
+
+    with open(filename, 'w') as outfile:
+        for topic in topics:
+            topic_doc = dictionary.doc2bow(get_tokens(topic))
+            ranking = get_ranking(index, model[topic_doc])
+            write_rankings(outfile, topic.identifier, ranking, doc_ids,
+                    run_name)
+
+def evaluate_fields(doc_ids, topics, get_tokens, dictionary, index, model,
+        prefix, run_name, default=None, depth=RUN_DEPTH):
+    """
+    Evaluates a topic model against every field of a set of topics in a
+    single pass. `topics` maps each field name to the topics with that field
+    as content, in the same order for every field (see
+    `syntrec.data.get_topic_fields`). Each field of each topic is processed
+    once and all fields are scored against the index as one batch.
+
+    A run file is written for each field as `<prefix>-<field>.txt`, and the
+    fields are fused into `<prefix>-<method>.txt` with each of the fusion
+    methods. The run of the `default` field, if given, is also written to
+    `<prefix>.txt` under the plain run name. Returns a dictionary mapping field
+    and method names to the files written.
+    """
+
+    fields = list(topics)
+    topic_ids = [topic.identifier for topic in topics[fields[0]]]
+    queries = [model[dictionary.doc2bow(get_tokens(topic))] for field in \
+            fields for topic in topics[field]]
+
+    positions, scores = get_top(index, queries, depth)
+    positions = positions.reshape(len(fields), len(topic_ids), -1)
+    scores = scores.reshape(len(fields), len(topic_ids), -1)
+
+    filenames = {}
+    for number, field in enumerate(fields):
+        filenames[field] = '%s-%s.txt' % (prefix, field)
+        write_run(filenames[field], topic_ids,
+                zip(positions[number], scores[number]), doc_ids,
+                '%s-%s' % (run_name, field.upper()))
+        if field == default:
+            write_run('%s.txt' % prefix, topic_ids,
+                    zip(positions[number], scores[number]), doc_ids, run_name)
+
+    for method in FUSION_METHODS:
+        filenames[method] = '%s-%s.txt' % (prefix, method)
+        write_run(filenames[method], topic_ids,
+                fuse(positions, scores, len(doc_ids), depth, method),
+                doc_ids, '%s-%s' % (run_name, method.upper()))
+
+    return filenames
+
+def get_ranking(index, query, depth=RUN_DEPTH):
+    """
+    Gets the positions and scores of the `depth` best documents for a query,
+    in descending order of score.
+    """
+
+    return get_rankings(index, [query], depth)[0]
+
+def get_rankings(index, queries, depth=RUN_DEPTH):
+    """
+    Gets the rankings of several queries at once. Indexes which can select
+    their own best documents (such as a `ShardedIndex`) provide a `get_top`
+    method; any other index is asked for every similarity of the batch, from
+    which the best documents are selected.
+    """
+
+    positions, scores = get_top(index, queries, depth)
+
+    return [list(zip(row_positions, row_scores)) for row_positions, \
+            row_scores in zip(positions, scores)]
+
+def get_top(index, queries, depth=RUN_DEPTH):
+    """
+    Gets the positions and scores of the best documents for several queries
+    as two matrices with one row per query.
+    """
+
+    if hasattr(index, 'get_top'):
+        return index.get_top(queries, depth)
+
+    sims = np.atleast_2d(index[queries])
+
+    return top_k(sims, min(depth, sims.shape[1]))
+
+def write_run(filename, topic_ids, rankings, doc_ids, run_name):
+    """
+    Writes a run file from the rankings of several topics, each given as a
+    pair of position and score sequences.
+    """
+
+    with open(filename, 'w') as outfile:
+        for topic_id, (positions, scores) in zip(topic_ids, rankings):
+            write_rankings(outfile, topic_id, zip(positions, scores), doc_ids,
+                    run_name)
+
+def write_rankings(outfile, topic_id, ranking, doc_ids, run_name):
+    """
+    Writes the ranked documents for a single topic to a run file.
+    """
+
+    rank = 1
+    for doc_position, doc_score in ranking:
+        outfile.write("%s\tQ0\t%s\t%d\t%f\t%s\n" % (
+            topic_id,
+            doc_ids[doc_position],
+            rank,
+            doc_score,
+            run_name,
+        ))
+        rank += 1
@@ -0,0 +1,495 @@
+"""
+Defines the stages of a TREC experiment for the pipeline runner (see
+`syntrec.pipeline`). An experiment reads a set of samples from a document
+source and converts them into term files. Over each term file, it builds a
+dictionary, trains the topic model of every run in one pass and indexes the
+documents for every run in another, and each run then ranks the documents for
+a set of TREC topics. Because each stage is cached under a hash of its inputs,
+and each run's model and index are stages of their own, changing (for
+instance) the number of topics of a run only retrains its model and rebuilds
+what depends on it.
+"""
+
+import json
+import os
+
+CORD_SOURCE = 'syntrec.source.cord.CordSource'
+NXML_SOURCE = 'syntrec.source.nxml.NXMLSource'
+
+SAMPLES = 'samples.txt'
+QRELS = 'qrels.txt'
+SUBSAMPLE = 'subsample.json'
+DUPLICATES = 'duplicates.json'
+TERMS = 'terms.txt'
+DICTIONARY = 'dictionary'
+FROZEN_DICTIONARY = 'dictionary.frozen'
+MODEL = 'model'
+INDEX = 'index'
+RUN = 'run.txt'
+CHECKPOINTS = '.checkpoints'
+
+def add_samples(pipeline, source, sample_files, name='samples'):
+    """
+    Adds a stage listing the samples to process: CORD-19 document ID files for
+    the 'cord' source, or qrels files for the 'nxml' source.
+    """
+
+    return pipeline.add(name, make_samples,
+            params={'source': source, 'sample_files': list(sample_files)},
+            files=sample_files)
+
+def add_subsample(pipeline, source, sample_files, qrel_files, rate,
+        num_topics=None, topics=None, seed=0, name='samples'):
+    """
+    Adds a stage listing a stratified subsample of the samples for a
+    development run (see `syntrec.subsample`), in place of a samples stage.
+    The subsample is drawn for the given topics, or for `num_topics` topics
+    selected from the qrels, and its qrels are written beside it.
+    """
+
+    return pipeline.add(name, make_subsample,
+            params={
+                'source': source,
+                'sample_files': list(sample_files),
+                'qrel_files': list(qrel_files),
+                'rate': rate,
+                'num_topics': num_topics,
+                'topics': topics,
+                'seed': seed,
+            },
+            files=list(sample_files) + list(qrel_files))
+
+def add_duplicates(pipeline, source, data_dir, metadata=None,
+        samples='samples', name='duplicates'):
+    """
+    Adds a stage finding the near-duplicate samples, so that term files need
+    only process one copy of each.
+    """
+
+    return pipeline.add(name, make_duplicates, inputs=[samples],
+            params={
+                'source': source,
+                'data_dir': data_dir,
+                'metadata': metadata,
+            },
+            files=[metadata] if metadata else [])
+
+def add_terms(pipeline, name, source, processor, data_dir, metadata=None,
+        samples='samples', duplicates=None, budget=None, sections=None,
+        triage=None):
+    """
+    Adds a stage converting the samples into a term file with the named
+    processor. If the name of a duplicates stage is given, only canonical
+    copies are processed. A budget, given as the keyword arguments of
+    `syntrec.budget.get_budgeted_processor`, limits the size and processing
+    time of each document, and a section policy, given as the keyword
+    arguments of `syntrec.sections.SectionPolicy`, selects the sections to be
+    processed. A triage, given as the keyword arguments of
+    `syntrec.triage.Triage` (an empty dictionary for the defaults), skips
+    documents with no usable text before they are parsed.
+
+    The processor's settings (see `syntrec.preprocess.get_processor_settings`)
+    are part of the stage's key, so that changing them rebuilds the term file;
+    Parmenides must be initialized before the stage is added.
+    """
+
+    from syntrec.preprocess import get_processor_settings
+
+    inputs = [samples] + ([duplicates] if duplicates else [])
+
+    return pipeline.add(name, make_terms, inputs=inputs,
+            params={
+                'source': source,
+                'processor': processor,
+                'settings': get_processor_settings(processor),
+                'data_dir': data_dir,
+                'metadata': metadata,
+                'budget': budget,
+                'sections': sections,
+                'triage': triage,
+            },
+            files=[metadata] if metadata else [])
+
+def add_run(pipeline, name, terms, model_type, num_topics, topic_file,
+        topic_type, processor, max_depth=3, section=None, all_fields=False,
+        templates=None, variant=None, reuse_vectors=False):
+    """
+    Adds the stages producing a single run: a dictionary over the term file,
+    a model, an index and the run file itself. The dictionary over a term
+    file is shared by every run over it. The models and indexes are grouped
+    (see `syntrec.pipeline.Stage`), so that the models needing training are
+    trained in a single pass over the file and the indexes needing building
+    built in another (see `syntrec.fanout`). The run is named after its final
+    stage. With `all_fields`, the run stage also ranks every topic
+    field and their fusions (see `syntrec.evaluation.evaluate_fields`).
+
+    Templates are generated to `max_depth` levels under a template policy,
+    given as the other keyword arguments of `syntrec.corpus.TemplatePolicy`.
+    Runs over the same term file with different policies need different
+    shared stages, so each policy but one must be given a `variant` name.
+
+    With `reuse_vectors`, an LDA model records the document vectors computed
+    while it is trained, and its index is built from them rather than by
+    inference over the corpus if they pass the check of
+    `syntrec.vectors.check_vectors`.
+
+    As with `add_terms`, the settings of the topic processor are part of the
+    run stage's key.
+    """
+
+    from syntrec.preprocess import get_processor_settings
+
+    if reuse_vectors and model_type != 'lda':
+        raise ValueError("Document vectors can only be reused for LDA models")
+
+    templates = dict(templates or {}, max_depth=max_depth)
+    shared = terms if variant is None else '%s-%s' % (terms, variant)
+
+    dictionary = '%s-dictionary' % shared
+    if dictionary not in pipeline.stages:
+        pipeline.add(dictionary, make_dictionary, inputs=[terms],
+                params={'templates': templates})
+    elif pipeline.stages[dictionary].params['templates'] != templates:
+        raise ValueError("Runs over %s with different template policies" \
+                " need different variants" % terms)
+
+    model = '%s-model' % name
+    pipeline.add(model, make_models, inputs=[terms, dictionary],
+            params={
+                'model': [name, model_type, num_topics],
+                'templates': templates,
+                'reuse_vectors': reuse_vectors,
+            },
+            group='%s-models' % shared)
+
+    index = '%s-index' % name
+    pipeline.add(index, make_indexes, inputs=[terms, dictionary, model],
+            params={
+                'model': [name, model_type],
+                'templates': templates,
+            },
+            group='%s-indexes' % shared)
+
+    return pipeline.add(name, make_run, inputs=[dictionary, model, index],
+            params={
+                'model_type': model_type,
+                'topic_file': topic_file,
+                'topic_type': topic_type,
+                'section': section,
+                'processor': processor,
+                'settings': get_processor_settings(processor),
+                'run_name': name,
+                'all_fields': all_fields,
+            },
+            files=[topic_file])
+
+def get_run_files(topic_type):
+    """
+    Gets the names of the extra run files written by a run stage with
+    `all_fields`, keyed by topic field or fusion method.
+    """
+
+    from syntrec.data import TOPIC_FIELDS
+    from syntrec.evaluation import FUSION_METHODS
+
+    prefix = os.path.splitext(RUN)[0]
+
+    return {variant: '%s-%s.txt' % (prefix, variant) for variant in \
+            TOPIC_FIELDS[topic_type] + FUSION_METHODS}
+
+def report_subsample(artifacts, run_names, qrel_files, full_runs=None,
+        samples='samples'):
+    """
+    Prints the measures of runs over a subsample against its qrels. If run
+    files over the full collection are given, as a dictionary mapping run
+    names to filenames, they are used to estimate how well measures on the
+    subsample track those on the full collection.
+    """
+
+    from syntrec.metrics import get_measures, read_qrels, read_run
+    from syntrec.subsample import get_tracking, print_measures, \
+            print_tracking
+
+    subsample = artifacts[samples]
+    qrels = read_qrels([subsample.get_path(QRELS)])
+    print_measures({name: get_measures(read_run(artifacts[name].get_path(
+        RUN)), qrels) for name in run_names})
+
+    if full_runs:
+        with open(subsample.get_path(SUBSAMPLE), 'r') as infile:
+            topics = json.load(infile)['topics']
+        with open(subsample.get_path(SAMPLES), 'r') as infile:
+            docids = [line.strip() for line in infile]
+
+        runs = {name: read_run(filename) for name, filename in \
+                full_runs.items()}
+        print_tracking(get_tracking(runs, read_qrels(qrel_files), topics,
+            docids))
+
+def make_samples(output, source, sample_files):
+
+    from syntrec.data import get_cord_samples, get_samples
+
+    if source == 'cord':
+        samples = get_cord_samples(sample_files)
+    else:
+        samples = get_samples(sample_files)
+
+    with open(os.path.join(output, SAMPLES), 'w') as outfile:
+        for sample in sorted(samples):
+            outfile.write("%s\n" % sample)
+
+def make_subsample(output, source, sample_files, qrel_files, rate,
+        num_topics=None, topics=None, seed=0):
+
+    from syntrec.data import get_cord_samples, get_samples
+    from syntrec.metrics import read_qrels
+    from syntrec.subsample import get_subsample, restrict_qrels, \
+            select_topics, write_info, write_qrels
+
+    if source == 'cord':
+        samples = get_cord_samples(sample_files)
+    else:
+        samples = get_samples(sample_files)
+
+    qrels = read_qrels(qrel_files)
+    topics = topics or select_topics(qrels, num_topics, seed)
+    subsample, info = get_subsample(samples, qrels, topics, rate, seed)
+
+    with open(os.path.join(output, SAMPLES), 'w') as outfile:
+        for sample in subsample:
+            outfile.write("%s\n" % sample)
+    write_qrels(restrict_qrels(qrels, topics, subsample),
+            os.path.join(output, QRELS))
+    write_info({'topics': topics, 'strata': info},
+            os.path.join(output, SUBSAMPLE))
+
+    print("Subsampled %d of %d documents for %d topics." % (len(subsample),
+        len(samples), len(topics)))
+
+def make_duplicates(output, samples, source, data_dir, metadata=None):
+
+    from parmenides.utils import get_documents
+    from syntrec.dedup import find_duplicates
+
+    sample_files = get_sample_files(samples, source, data_dir, metadata)
+    duplicates = find_duplicates(get_documents(sample_files))
+    duplicates.save(os.path.join(output, DUPLICATES))
+
+    print("Found %d duplicates in %d groups." % (len(duplicates.canonical),
+        len(duplicates.copies)))
+
+def make_terms(output, samples, duplicates=None, source=None, processor=None,
+        settings=None, data_dir=None, metadata=None, budget=None,
+        sections=None, triage=None):
+
+    from parmenides.utils import get_documents
+    from syntrec.budget import get_budgeted_processor
+    from syntrec.dedup import Duplicates
+    from syntrec.preprocess import get_tokenizer, write_terms
+    from syntrec.sections import SectionPolicy
+    from syntrec.triage import Triage
+
+    sample_files = get_sample_files(samples, source, data_dir, metadata)
+    if duplicates is not None:
+        duplicates = Duplicates.load(duplicates.get_path(DUPLICATES))
+
+    if budget is None:
+        get_tokens = get_tokenizer(processor)
+    else:
+        get_tokens = get_budgeted_processor(processor, **budget)
+
+    documents = get_documents(sample_files)
+    metadata = {'processor': processor, 'settings': settings}
+    if triage is not None:
+        triage = Triage.from_dict(triage)
+        documents = triage.apply_all(documents)
+        metadata['triage'] = triage.to_dict()
+
+    policy = SectionPolicy.from_dict(sections or {})
+    metadata['sections'] = policy.to_dict()
+    write_terms(policy.apply_all(documents), os.path.join(output, TERMS),
+            get_tokens, duplicates, metadata)
+
+    if triage is not None:
+        triage.write_log(os.path.join(output, 'triage.log'))
+        print("Triage: %s" % triage.stats)
+
+    if budget is not None:
+        get_tokens.close()
+        get_tokens.write_log(os.path.join(output, 'budget.log'))
+        print("Budget: %s" % get_tokens.stats)
+
+    if duplicates is not None:
+        report = duplicates.get_report()
+        print("Skipped %d duplicates, saving an estimated %.0f seconds." % (
+            report['duplicates'], report['estimated_seconds_saved']))
+        if duplicates.dropped:
+            duplicates.write_log(os.path.join(output, 'dedup.log'))
+            print("Dropped %d duplicates with their canonical copies." % \
+                    len(duplicates.dropped))
+        with open(os.path.join(output, 'dedup.json'), 'w') as outfile:
+            json.dump(report, outfile, indent=2)
+
+def get_sample_files(samples, source, data_dir, metadata=None):
+    """
+    Gets the files to read for the samples listed by a samples stage, and
+    selects the matching Parmenides document source.
+    """
+
+    from parmenides.conf import settings
+    from syntrec import data
+
+    with open(samples.get_path(SAMPLES), 'r') as infile:
+        docids = [line.strip() for line in infile]
+
+    if source == 'cord':
+        settings.DOCUMENT_SOURCE = CORD_SOURCE
+        return list(data.get_sample_files(data.get_metadata(metadata),
+                docids, data_dir))
+    else:
+        settings.DOCUMENT_SOURCE = NXML_SOURCE
+        return list(data.get_nxml_files(docids, data_dir))
+
+def make_dictionary(output, terms, templates=None):
+
+    from syntrec.dictionary import build_dictionary
+    from syntrec.frozendict import freeze
+
+    print("Loading dictionary.")
+    dictionary = build_dictionary(terms.get_path(TERMS), templates)
+    dictionary.save(os.path.join(output, DICTIONARY))
+    freeze(dictionary, os.path.join(output, FROZEN_DICTIONARY))
+
+def make_models(jobs):
+    """
+    Trains the models of a group of model stages in a single pass over their
+    term file. Each job is the artifact directory, inputs (the term file and
+    dictionary) and params of a stage, as passed by `syntrec.pipeline`.
+    """
+
+    import hashlib
+    import shutil
+
+    from gensim import corpora
+    from syntrec.training import train_models
+    from syntrec.vectors import get_filename
+
+    _, (terms, dictionary), params = jobs[0]
+    templates = params['templates']
+    dictionary = corpora.Dictionary.load(dictionary.get_path(DICTIONARY))
+    models = [job_params['model'] for _, _, job_params in jobs]
+    outputs = {job_params['model'][0]: output for output, _, job_params in \
+            jobs}
+
+    # Checkpoints are kept beside the first artifact, which is cleared before
+    # every build, so that an interrupted build resumes where it stopped.
+    # They are named after the whole group, whose models they hold. Recorded
+    # vectors are kept with them until training is finished.
+    group = hashlib.sha256('\n'.join(sorted(outputs.values())).encode(
+        'utf-8')).hexdigest()[:16]
+    checkpoints = '%s%s-%s' % (jobs[0][0], CHECKPOINTS, group)
+    os.makedirs(checkpoints, exist_ok=True)
+    vectors = {}
+    for _, _, job_params in jobs:
+        if job_params['reuse_vectors']:
+            name = job_params['model'][0]
+            vectors[name] = get_filename(os.path.join(checkpoints, name))
+    trained = train_models(dictionary, terms.get_path(TERMS), models,
+            checkpoints, templates=templates, vectors=vectors)
+    for name, model in trained.items():
+        model.save(os.path.join(outputs[name], get_model_filename(name)))
+    for name, filename in vectors.items():
+        os.replace(filename, get_filename(os.path.join(outputs[name],
+            get_model_filename(name))))
+    shutil.rmtree(checkpoints)
+
+def make_indexes(jobs):
+    """
+    Builds the indexes of a group of index stages, inferring the document
+    vectors of every model that needs it in a single pass over their term
+    file. Each job is the artifact directory, inputs (the term file,
+    dictionary and model) and params of a stage.
+    """
+
+    import warnings
+
+    from gensim import corpora
+    from syntrec.corpus import TrecCorpus
+    from syntrec.fanout import IndexBuilder, fan_out
+    from syntrec.modeling import load_model
+    from syntrec.vectors import MIN_OVERLAP, build_index, check_vectors, \
+            get_filename, load_vectors
+
+    _, (terms, dictionary, _), params = jobs[0]
+    dictionary = corpora.Dictionary.load(dictionary.get_path(DICTIONARY))
+    corpus = TrecCorpus(dictionary, terms.get_path(TERMS),
+            params['templates'])
+
+    builders = []
+    for output, (_, _, model), job_params in jobs:
+        name, model_type = job_params['model']
+        filename = model.get_path(get_model_filename(name))
+        prefix = os.path.join(output, get_index_prefix(name))
+        topic_model = load_model(model_type, filename)
+
+        if os.path.exists(get_filename(filename)):
+            vectors = load_vectors(get_filename(filename))
+            check = check_vectors(topic_model, corpus, vectors)
+            print("Recorded vectors of %s: cosine %.3f, score error %.3f," \
+                    " overlap %.3f." % (name, check['cosine'], check['error'],
+                        check['overlap']))
+            if check['overlap'] >= MIN_OVERLAP:
+                print("Building index of %s from recorded vectors." % name)
+                build_index(prefix, topic_model, vectors, corpus.index)
+                continue
+            warnings.warn("Recorded vectors of %s do not match inference;" \
+                    " inferring them again" % name)
+
+        builders.append(IndexBuilder(prefix, topic_model, corpus.index))
+
+    if builders:
+        print("Building indexes.")
+        fan_out(corpus, builders)
+
+def get_model_filename(name):
+
+    return '%s-%s' % (name, MODEL)
+
+def get_index_prefix(name):
+
+    return '%s-%s' % (name, INDEX)
+
+def make_run(output, dictionary, model, index, model_type, topic_file,
+        topic_type, processor, run_name, section=None, all_fields=False,
+        settings=None):
+
+    from syntrec.data import DEFAULT_FIELDS, get_topic_fields, get_topics
+    from syntrec.evaluation import evaluate, evaluate_fields
+    from syntrec.frozendict import load_dictionary
+    from syntrec.indexing import load_index
+    from syntrec.modeling import load_model
+    from syntrec.preprocess import get_tokenizer
+
+    # Queries only look tokens up, so the frozen copy is mapped rather than
+    # the full dictionary loaded (artifacts from before it existed have
+    # only the full one).
+    filename = dictionary.get_path(FROZEN_DICTIONARY)
+    if not os.path.exists(filename):
+        filename = dictionary.get_path(DICTIONARY)
+    dictionary = load_dictionary(filename)
+    model = load_model(model_type, model.get_path(
+        get_model_filename(run_name)))
+    index, doc_ids = load_index(index.get_path(get_index_prefix(run_name)))
+
+    print("Evaluating %s." % run_name)
+    if all_fields:
+        topics = get_topic_fields(topic_file, topic_type)
+        prefix = os.path.join(output, os.path.splitext(RUN)[0])
+        evaluate_fields(doc_ids, topics, get_tokenizer(processor), dictionary,
+                index, model, prefix, run_name,
+                section or DEFAULT_FIELDS[topic_type])
+    else:
+        topics = list(get_topics(topic_file, topic_type, section))
+        evaluate(doc_ids, topics, get_tokenizer(processor), dictionary, index,
+                model, os.path.join(output, RUN), run_name)
@@ -0,0 +1,242 @@
+"""
+Provides a corpus pass that feeds several consumers at once. Training an LSI
+and an LDA model over the same term file, or indexing its documents for both,
+would otherwise read the file, expand its templates and convert its documents
+into bags of words once per model. Instead, `fan_out` reads the corpus once, a
+chunk of documents at a time, and hands every chunk to each consumer.
+
+A consumer has a `consume` method, called with each chunk (a list of bags of
+words) in corpus order, and a `finish` method, called once at the end of the
+pass, which returns its result. Models are trained online, exactly as gensim
+trains them over a whole corpus: LSI merges a projection for every
+`LSI_CHUNK_SIZE` documents and LDA performs an E-step and M-step for every
+`LDA_CHUNK_SIZE` documents, keeping gensim's learning rate and update count
+over further passes. An LDA trainer can also record the topic
+distribution of each document from its E-step (see `syntrec.vectors`).
+
+The dictionary cannot share a pass with these consumers, since documents can
+only be converted into bags of words once it is complete; it is built in its
+own pass (see `syntrec.dictionary`).
+"""
+
+from gensim import models, similarities
+
+from syntrec.indexing import write_doc_ids
+from syntrec.vectors import get_distributions
+
+LDA_CHUNK_SIZE = 2000
+LSI_CHUNK_SIZE = 20000
+EVAL_EVERY = 10
+
+def fan_out(corpus, consumers, chunksize=LDA_CHUNK_SIZE, callback=None):
+    """
+    Makes a single pass over a corpus, handing each chunk of `chunksize`
+    documents to every consumer. If given, `callback` is called with the
+    number of documents in each chunk once every consumer has consumed it.
+    Returns the results of the consumers.
+    """
+
+    chunk = []
+    for document in corpus:
+        chunk.append(document)
+        if len(chunk) == chunksize:
+            for consumer in consumers:
+                consumer.consume(chunk)
+            if callback is not None:
+                callback(len(chunk))
+            chunk = []
+
+    if chunk:
+        for consumer in consumers:
+            consumer.consume(chunk)
+        if callback is not None:
+            callback(len(chunk))
+
+    return [consumer.finish() for consumer in consumers]
+
+class LsiTrainer:
+    """
+    Trains an LSI model online. Documents are buffered until a full LSI chunk
+    is available, so that the model is the same as one trained in a single
+    call to gensim. An existing model may be given to continue training it.
+    """
+
+    def __init__(self, dictionary, num_topics, chunksize=LSI_CHUNK_SIZE,
+            model=None):
+
+        if model is None:
+            print("Generating LSI model.")
+            model = models.LsiModel(id2word=dictionary,
+                    num_topics=num_topics, chunksize=chunksize)
+        self.model = model
+        self.chunksize = chunksize
+        self.buffer = []
+
+    def consume(self, chunk):
+
+        self.buffer.extend(chunk)
+        while len(self.buffer) >= self.chunksize:
+            self.model.add_documents(self.buffer[:self.chunksize])
+            self.buffer = self.buffer[self.chunksize:]
+
+    def finish(self):
+
+        if self.buffer:
+            self.model.add_documents(self.buffer)
+            self.buffer = []
+
+        return self.model
+
+class LdaTrainer:
+    """
+    Trains an LDA model online, updating the model with each chunk. When the
+    number of documents in the corpus is known, the updates are scaled to it
+    and the model's perplexity is estimated every `EVAL_EVERY` chunks and on
+    the last chunk of each pass, as gensim does when training over a whole
+    corpus (the estimate draws random numbers, so skipping it would change the
+    model). Further passes over the corpus continue the online updates as
+    gensim's passes do, so the model is the same as one trained with as many
+    `passes`. An existing model may be given to continue training it, like a
+    further call to gensim's `update`. If an array of `num_docs` rows is
+    given as `vectors`, the topic distribution of each document is recorded
+    in its row.
+    """
+
+    def __init__(self, dictionary, num_topics, num_docs=None,
+            chunksize=LDA_CHUNK_SIZE, model=None, vectors=None):
+
+        if model is None:
+            print("Generating LDA model.")
+            model = models.LdaModel(id2word=dictionary,
+                    num_topics=num_topics, chunksize=chunksize)
+        self.model = model
+        self.num_docs = num_docs
+        self.chunksize = chunksize
+        self.buffer = []
+        self.num_chunks = 0
+        self.num_seen = 0
+        self.bound = None
+        self.vectors = vectors
+        self.recorded = 0
+        self.pass_ = 0
+
+    def consume(self, chunk):
+
+        self.buffer.extend(chunk)
+        while len(self.buffer) >= self.chunksize:
+            self.update(self.buffer[:self.chunksize])
+            self.buffer = self.buffer[self.chunksize:]
+
+    def update(self, chunk):
+
+        self.num_chunks += 1
+        self.num_seen += len(chunk)
+        if self.num_chunks % EVAL_EVERY == 0 or \
+                self.num_seen == self.num_docs:
+            self.bound = self.model.log_perplexity(chunk,
+                    total_docs=self.num_docs)
+
+        if self.num_docs is not None:
+            # gensim scales every update to the size of the whole corpus,
+            # which it counts up front; each update counts its own chunk.
+            self.model.state.numdocs = self.num_docs - len(chunk)
+
+        # Each update is a separate call to gensim, which takes it for the
+        # first pass, so the steps of later passes are intercepted to do as
+        # gensim does over several passes: the pass number is added to the
+        # offset of the learning rate, and updates are no longer counted.
+        # The E-step is intercepted to record its results.
+        intercepted = {}
+        if self.pass_:
+            intercepted['do_mstep'] = self.do_mstep
+            intercepted['update_alpha'] = self.update_alpha
+        if self.vectors is not None:
+            self.recorded = self.num_seen - len(chunk)
+            intercepted['do_estep'] = self.record
+
+        for name, method in intercepted.items():
+            setattr(self.model, name, method)
+        try:
+            self.model.update(chunk, chunksize=self.chunksize, eval_every=0)
+        finally:
+            for name in intercepted:
+                delattr(self.model, name)
+
+    def get_rho(self):
+
+        return pow(self.model.offset + self.pass_ + self.model.num_updates / \
+                self.chunksize, -self.model.decay)
+
+    def do_mstep(self, rho, other, extra_pass=False):
+
+        return type(self.model).do_mstep(self.model, self.get_rho(), other,
+                True)
+
+    def update_alpha(self, gammat, rho):
+
+        return type(self.model).update_alpha(self.model, gammat,
+                self.get_rho())
+
+    def record(self, chunk, state=None):
+
+        gamma = type(self.model).do_estep(self.model, chunk, state)
+        self.vectors[self.recorded:self.recorded + len(gamma)] = \
+                get_distributions(gamma)
+        self.recorded += len(gamma)
+
+        return gamma
+
+    def finish(self):
+
+        if self.buffer:
+            self.update(self.buffer)
+            self.buffer = []
+        self.num_chunks = 0
+        self.num_seen = 0
+        self.pass_ += 1
+
+        return self.model
+
+class IndexBuilder:
+    """
+    Builds the similarity index of a corpus in the vector space of a topic
+    model, saved under a prefix as by `syntrec.indexing.build_index`.
+    """
+
+    def __init__(self, prefix, model, doc_ids):
+
+        self.prefix = prefix
+        self.model = model
+        self.doc_ids = doc_ids
+        self.index = similarities.Similarity(prefix, None,
+                num_features=model.num_topics)
+
+    def consume(self, chunk):
+
+        self.index.add_documents(self.model[chunk])
+
+    def finish(self):
+
+        self.index.save(self.prefix)
+        write_doc_ids(self.doc_ids, self.prefix)
+
+        return self.index
+
+def get_trainer(model_type, dictionary, num_topics, num_docs=None,
+        model=None, vectors=None):
+    """
+    Gets the consumer training a model of the given type over a corpus of
+    `num_docs` documents, continuing to train `model` if it is given and
+    recording document vectors in `vectors` (LDA only) if it is given.
+    """
+
+    if model_type == 'lsi':
+        if vectors is not None:
+            raise ValueError("Document vectors can only be recorded for" \
+                    " LDA models")
+        return LsiTrainer(dictionary, num_topics, model=model)
+    elif model_type == 'lda':
+        return LdaTrainer(dictionary, num_topics, num_docs, model=model,
+                vectors=vectors)
+    else:
+        raise TypeError("Unsupported model type: %s" % model_type)
@@ -0,0 +1,308 @@
+"""
+Provides frozen dictionaries: read-only dictionaries stored in a single file
+that is memory-mapped rather than loaded. A gensim dictionary over syntactic
+terms and their templates holds millions of Python strings in dicts, which
+take a long time to unpickle and a lot of memory in every process that loads
+them, even though evaluation, query serving and indexing only ever look
+tokens up.
+
+A frozen dictionary stores the tokens as one table of UTF-8 bytes in ID order
+with their offsets, an open-addressing hash table mapping tokens to IDs, and
+the document and collection frequencies of each ID, all as flat arrays. Looking
+a token up hashes it and compares a few table entries; nothing is
+deserialized, so opening the file is immediate, and processes mapping the same
+file share its pages. Frozen dictionaries support the parts of the interface
+of a gensim dictionary used for lookups: `doc2bow`, `token2id`, `id2token`,
+indexing by ID, `dfs` and `cfs`, and the corpus statistics. Each lookup is
+somewhat slower than in a dict, so a single process making a pass over a
+whole corpus is still better served by the full dictionary.
+
+The file starts with `MAGIC`, the length of a JSON header and the header,
+which records the statistics and the offset of each array.
+"""
+
+import json
+import mmap
+import struct
+import zlib
+from collections import Counter
+
+import numpy as np
+
+MAGIC = b'SYNDICT1'
+SUFFIX = '.frozen'
+LOAD_FACTOR = 0.5
+ALIGNMENT = 8
+EMPTY = -1
+
+class FrozenDictionary:
+    """
+    A read-only dictionary memory-mapped from a file written by `freeze`.
+    """
+
+    def __init__(self, filename):
+
+        self.filename = filename
+        with open(filename, 'rb') as infile:
+            self.mmap = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a frozen dictionary: %s" % filename)
+        start = len(MAGIC) + 8
+        header_size, = struct.unpack('<Q', self.mmap[len(MAGIC):start])
+        header = json.loads(self.mmap[start:start + header_size])
+
+        self.num_docs = header['num_docs']
+        self.num_pos = header['num_pos']
+        self.num_nnz = header['num_nnz']
+        self.num_tokens = header['num_tokens']
+        self.arrays = header['arrays']
+
+        self.base = self.arrays['strings'][0]
+        view = memoryview(self.mmap)
+        self.offsets = self.get_view(view, 'offsets', 'Q')
+        self.table = self.get_view(view, 'table', 'i')
+        self.mask = len(self.table) - 1
+        self.dfs = self.get_array('dfs', np.int64)
+        self.cfs = self.get_array('cfs', np.int64)
+
+        self.token2id = TokenIds(self)
+        self.id2token = IdTokens(self)
+
+    @classmethod
+    def load(cls, filename):
+
+        return cls(filename)
+
+    def get_view(self, view, name, code):
+
+        offset, size = self.arrays[name]
+
+        return view[offset:offset + size].cast(code)
+
+    def get_array(self, name, dtype):
+
+        offset, size = self.arrays[name]
+
+        return np.frombuffer(self.mmap, dtype=dtype,
+                count=size // np.dtype(dtype).itemsize, offset=offset)
+
+    def __getstate__(self):
+
+        # Other processes map the file themselves rather than copying it.
+        return {'filename': self.filename}
+
+    def __setstate__(self, state):
+
+        self.__init__(state['filename'])
+
+    def __len__(self):
+
+        return self.num_tokens
+
+    def __getitem__(self, token_id):
+
+        return self.get_token_bytes(token_id).decode('utf-8')
+
+    def __iter__(self):
+
+        return iter(range(self.num_tokens))
+
+    def keys(self):
+
+        return list(range(self.num_tokens))
+
+    def get_token_bytes(self, token_id):
+
+        if not 0 <= token_id < self.num_tokens:
+            raise KeyError(token_id)
+
+        return self.mmap[self.base + self.offsets[token_id]:self.base + \
+                self.offsets[token_id + 1]]
+
+    def get_id(self, token):
+        """
+        Gets the ID of a token, or None if it is not in the dictionary.
+        """
+
+        data = token.encode('utf-8')
+        slot = zlib.crc32(data) & self.mask
+        base = self.base
+        while True:
+            token_id = self.table[slot]
+            if token_id == EMPTY:
+                return None
+            if self.mmap[base + self.offsets[token_id]:base + \
+                    self.offsets[token_id + 1]] == data:
+                return token_id
+            slot = (slot + 1) & self.mask
+
+    def doc2bow(self, document):
+        """
+        Converts a document, given as a list of tokens, into a bag of words:
+        a list of (ID, count) pairs sorted by ID, leaving out unknown tokens.
+        """
+
+        if isinstance(document, str):
+            raise TypeError("doc2bow expects a list of tokens, not a string")
+
+        bow = []
+        for token, count in Counter(document).items():
+            token_id = self.get_id(token)
+            if token_id is not None:
+                bow.append((token_id, count))
+        bow.sort()
+
+        return bow
+
+    def close(self):
+
+        self.offsets.release()
+        self.table.release()
+        self.dfs = self.cfs = None
+        self.mmap.close()
+
+class TokenIds:
+    """
+    A read-only mapping from tokens to IDs, like the `token2id` dict of a
+    gensim dictionary.
+    """
+
+    def __init__(self, dictionary):
+
+        self.dictionary = dictionary
+
+    def __len__(self):
+
+        return len(self.dictionary)
+
+    def __getitem__(self, token):
+
+        token_id = self.dictionary.get_id(token)
+        if token_id is None:
+            raise KeyError(token)
+
+        return token_id
+
+    def __contains__(self, token):
+
+        return self.dictionary.get_id(token) is not None
+
+    def get(self, token, default=None):
+
+        token_id = self.dictionary.get_id(token)
+
+        return default if token_id is None else token_id
+
+class IdTokens:
+    """
+    A read-only mapping from IDs to tokens, like the `id2token` dict of a
+    gensim dictionary.
+    """
+
+    def __init__(self, dictionary):
+
+        self.dictionary = dictionary
+
+    def __len__(self):
+
+        return len(self.dictionary)
+
+    def __getitem__(self, token_id):
+
+        return self.dictionary[token_id]
+
+    def __contains__(self, token_id):
+
+        return 0 <= token_id < len(self.dictionary)
+
+    def get(self, token_id, default=None):
+
+        return self.dictionary[token_id] if token_id in self else default
+
+def freeze(dictionary, filename):
+    """
+    Writes a gensim dictionary, whose IDs must run from 0 without gaps, to a
+    frozen dictionary file.
+    """
+
+    num_tokens = len(dictionary.token2id)
+    tokens = [None] * num_tokens
+    for token, token_id in dictionary.token2id.items():
+        if not 0 <= token_id < num_tokens:
+            raise ValueError("The dictionary's IDs have gaps; compactify it" \
+                    " before freezing it")
+        tokens[token_id] = token.encode('utf-8')
+
+    offsets = np.zeros(num_tokens + 1, dtype=np.uint64)
+    np.cumsum([len(data) for data in tokens], out=offsets[1:])
+
+    size = 1
+    while size * LOAD_FACTOR < max(num_tokens, 1):
+        size *= 2
+    table = np.full(size, EMPTY, dtype=np.int32)
+    for token_id, data in enumerate(tokens):
+        slot = zlib.crc32(data) & (size - 1)
+        while table[slot] != EMPTY:
+            slot = (slot + 1) & (size - 1)
+        table[slot] = token_id
+
+    arrays = [
+        ('strings', b''.join(tokens)),
+        ('offsets', offsets.tobytes()),
+        ('table', table.tobytes()),
+        ('dfs', np.array([dictionary.dfs.get(token_id, 0) for token_id in \
+                range(num_tokens)], dtype=np.int64).tobytes()),
+        ('cfs', np.array([dictionary.cfs.get(token_id, 0) for token_id in \
+                range(num_tokens)], dtype=np.int64).tobytes()),
+    ]
+
+    # The offsets in the header depend on its own length, so they are found
+    # by laying the arrays out until the header fits, padded with spaces.
+    header_size = 0
+    while True:
+        position = align(len(MAGIC) + 8 + header_size)
+        layout = {}
+        for name, data in arrays:
+            layout[name] = [position, len(data)]
+            position = align(position + len(data))
+        header = json.dumps({
+            'num_docs': dictionary.num_docs,
+            'num_pos': dictionary.num_pos,
+            'num_nnz': dictionary.num_nnz,
+            'num_tokens': num_tokens,
+            'arrays': layout,
+        }).encode('utf-8')
+        if len(header) <= header_size:
+            header = header.ljust(header_size)
+            break
+        header_size = len(header)
+
+    with open(filename, 'wb') as outfile:
+        outfile.write(MAGIC)
+        outfile.write(struct.pack('<Q', len(header)))
+        outfile.write(header)
+        for name, data in arrays:
+            outfile.write(b'\0' * (layout[name][0] - outfile.tell()))
+            outfile.write(data)
+
+def align(position):
+
+    return -(-position // ALIGNMENT) * ALIGNMENT
+
+def is_frozen(filename):
+
+    with open(filename, 'rb') as infile:
+        return infile.read(len(MAGIC)) == MAGIC
+
+def load_dictionary(filename):
+    """
+    Loads a dictionary for lookups, either frozen or saved by gensim.
+    """
+
+    if is_frozen(filename):
+        return FrozenDictionary(filename)
+
+    from gensim import corpora
+
+    return corpora.Dictionary.load(filename)
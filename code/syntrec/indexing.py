@@ -0,0 +1,39 @@
+"""
+Provides functions for building and loading similarity indexes. An index is
+stored under a prefix: gensim writes the index and its shards to files
+starting with the prefix, and the document IDs of the indexed documents are
+written, in index order, to `<prefix>.ids`.
+"""
+
+from gensim import similarities
+
+def build_index(prefix, model, corpus):
+    """
+    Builds and saves an index over the documents of a corpus, as represented in
+    the vector space of a topic model.
+    """
+
+    index = similarities.Similarity(prefix, model[corpus],
+            num_features=model.num_topics)
+    index.save(prefix)
+    write_doc_ids(corpus.index, prefix)
+
+    return index
+
+def load_index(prefix):
+    """
+    Loads an index and the document IDs of its documents.
+    """
+
+    return similarities.Similarity.load(prefix), read_doc_ids(prefix)
+
+def write_doc_ids(doc_ids, prefix):
+
+    with open('%s.ids' % prefix, 'w') as outfile:
+        for doc_id in doc_ids:
+            outfile.write("%s\n" % doc_id)
+
+def read_doc_ids(prefix):
+
+    with open('%s.ids' % prefix, 'r') as infile:
+        return [line.rstrip('\n') for line in infile]
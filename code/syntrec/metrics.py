@@ -0,0 +1,116 @@
+"""
+Provides the standard TREC measures of ranking quality, so that runs can be
+compared without leaving Python. Relevance judgments are read from qrels files
+and rankings from run files, both in the formats used by `trec_eval`; the
+measures follow `trec_eval`, averaging over the topics that are both judged
+and ranked.
+"""
+
+import math
+from collections import defaultdict
+
+CUTOFF = 10
+
+def read_qrels(filenames):
+    """
+    Reads the relevance judgments in any number of qrels files into a
+    dictionary mapping each topic to a dictionary of document relevances.
+    Both the four-column format and the five-column format of sampled qrels
+    are supported.
+    """
+
+    qrels = defaultdict(dict)
+
+    for filename in filenames:
+        with open(filename, 'r') as infile:
+            for line in infile:
+                fields = line.split()
+                if len(fields) < 4:
+                    continue
+                # The relevance is last, after an optional stratum.
+                qrels[fields[0]][fields[2]] = int(fields[-1])
+
+    return dict(qrels)
+
+def read_run(filename):
+    """
+    Reads a run file into a dictionary mapping each topic to its ranked list
+    of document IDs.
+    """
+
+    ranked = defaultdict(list)
+
+    with open(filename, 'r') as infile:
+        for line in infile:
+            fields = line.split()
+            ranked[fields[0]].append((int(fields[3]), fields[2]))
+
+    return {topic: [doc_id for _, doc_id in sorted(docs)] for topic, docs in \
+            ranked.items()}
+
+def average_precision(ranking, judgments):
+    """
+    Gets the average precision of a ranked list of document IDs.
+    """
+
+    num_relevant = sum(1 for relevance in judgments.values() if relevance > 0)
+    if num_relevant == 0:
+        return 0.0
+
+    found = 0
+    total = 0.0
+    for rank, doc_id in enumerate(ranking, 1):
+        if judgments.get(doc_id, 0) > 0:
+            found += 1
+            total += found / rank
+
+    return total / num_relevant
+
+def precision(ranking, judgments, k=CUTOFF):
+    """
+    Gets the precision of the first `k` documents of a ranking.
+    """
+
+    return sum(1 for doc_id in ranking[:k] if judgments.get(doc_id, 0) > 0) \
+            / k
+
+def ndcg(ranking, judgments, k=CUTOFF):
+    """
+    Gets the normalized discounted cumulative gain of the first `k` documents
+    of a ranking, using graded relevance as the gain.
+    """
+
+    gains = sorted((relevance for relevance in judgments.values() if \
+            relevance > 0), reverse=True)
+    ideal = sum(gain / math.log2(rank + 1) for rank, gain in \
+            enumerate(gains[:k], 1))
+    if ideal == 0:
+        return 0.0
+
+    actual = sum(max(judgments.get(doc_id, 0), 0) / math.log2(rank + 1) for \
+            rank, doc_id in enumerate(ranking[:k], 1))
+
+    return actual / ideal
+
+def get_measures(rankings, qrels, k=CUTOFF):
+    """
+    Gets the mean of each measure over the judged topics of a set of
+    rankings, given as a dictionary mapping topics to ranked document IDs.
+    Measures are named as in `trec_eval`.
+    """
+
+    topics = [topic for topic in rankings if topic in qrels]
+    if not topics:
+        raise ValueError("No ranked topic has relevance judgments")
+
+    measures = {
+        'map': [average_precision(rankings[topic], qrels[topic]) for topic \
+                in topics],
+        'P_%d' % k: [precision(rankings[topic], qrels[topic], k) for topic \
+                in topics],
+        'ndcg_cut_%d' % k: [ndcg(rankings[topic], qrels[topic], k) for topic \
+                in topics],
+    }
+
+    return {name: sum(values) / len(values) for name, values in \
+            measures.items()}
@@ -0,0 +1,17 @@
+"""
+Provides loading of the topic models compared in the experiments. Models are
+named by type: 'lsi' for latent semantic indexing and 'lda' for latent
+Dirichlet allocation (the types offered by the command line are listed in
+`syntrec.syntrec.MODELS`). Models are trained by `syntrec.training`.
+"""
+
+from gensim import models
+
+def load_model(model_type, filename):
+
+    if model_type == 'lsi':
+        return models.LsiModel.load(filename)
+    elif model_type == 'lda':
+        return models.LdaModel.load(filename)
+    else:
+        raise TypeError("Unsupported model type: %s" % model_type)
@@ -0,0 +1,169 @@
+"""
+Provides a persistent offset index for term files. The index records, for
+every document (line) of a term file, its byte offset and length along with
+its document ID. Everything is kept in NumPy arrays rather than Python objects
+and saved next to the term file as `<term file>.offsets.npz`, so it is cheap to
+load in every process that reads the file.
+
+With the index, any document can be read directly by position, a position can
+be mapped to its document ID (and an ID to its position) without a pass over
+the file, and readers can start at arbitrary shard boundaries.
+"""
+
+import os
+from array import array
+
+import numpy as np
+
+SUFFIX = '.offsets.npz'
+
+class TermFileIndex:
+    """
+    The offset index of a term file. Indexing the object with a position gives
+    the ID of the document at that position, so it can be used wherever a
+    list of document IDs in file order is expected.
+    """
+
+    def __init__(self, filename, offsets, lengths, id_offsets, ids,
+            sorted_positions):
+
+        self.filename = filename
+        self.offsets = offsets
+        self.lengths = lengths
+        self.id_offsets = id_offsets
+        self.ids = ids
+        self.sorted_positions = sorted_positions
+
+    @classmethod
+    def build(cls, filename):
+        """
+        Builds the offset index of a term file in a single pass and saves it
+        next to the file.
+        """
+
+        offsets = array('Q')
+        lengths = array('I')
+        id_offsets = array('Q', [0])
+        ids = bytearray()
+
+        position = 0
+        with open(filename, 'rb') as infile:
+            for line in infile:
+                offsets.append(position)
+                lengths.append(len(line))
+                ids += line.split(b' ', 1)[0].rstrip(b'\n')
+                id_offsets.append(len(ids))
+                position += len(line)
+
+        index = cls(filename,
+                np.frombuffer(offsets, dtype=np.uint64),
+                np.frombuffer(lengths, dtype=np.uint32),
+                np.frombuffer(id_offsets, dtype=np.uint64),
+                np.frombuffer(bytes(ids), dtype=np.uint8),
+                None)
+        index.sorted_positions = np.array(sorted(range(len(index)),
+            key=index.get_id_bytes), dtype=np.uint64)
+        index.save()
+
+        return index
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Loads the offset index of a term file, building it first if it does
+        not exist or is older than the file.
+        """
+
+        index_filename = filename + SUFFIX
+        if not os.path.exists(index_filename) or \
+                os.path.getmtime(index_filename) < os.path.getmtime(filename):
+            return cls.build(filename)
+
+        with np.load(index_filename) as data:
+            if int(data['size']) != os.path.getsize(filename):
+                return cls.build(filename)
+
+            return cls(filename, data['offsets'], data['lengths'],
+                    data['id_offsets'], data['ids'],
+                    data['sorted_positions'])
+
+    def save(self):
+
+        np.savez(self.filename + SUFFIX,
+                size=np.uint64(os.path.getsize(self.filename)),
+                offsets=self.offsets,
+                lengths=self.lengths,
+                id_offsets=self.id_offsets,
+                ids=self.ids,
+                sorted_positions=self.sorted_positions)
+
+    def __len__(self):
+
+        return len(self.offsets)
+
+    def __getitem__(self, position):
+
+        return self.get_id_bytes(position).decode('utf-8')
+
+    def __iter__(self):
+
+        for position in range(len(self)):
+            yield self[position]
+
+    def get_id_bytes(self, position):
+
+        return self.ids[self.id_offsets[position]:\
+                self.id_offsets[position + 1]].tobytes()
+
+    def get_position(self, doc_id):
+        """
+        Gets the position of a document from its ID by binary search over the
+        sorted IDs. Raises a `KeyError` if the document is not in the file.
+        """
+
+        target = doc_id.encode('utf-8')
+        low = 0
+        high = len(self.sorted_positions)
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_id_bytes(int(self.sorted_positions[middle])) < target:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < len(self.sorted_positions):
+            position = int(self.sorted_positions[low])
+            if self.get_id_bytes(position) == target:
+                return position
+
+        raise KeyError(doc_id)
+
+    def read_line(self, position, infile=None):
+        """
+        Reads the line of the document at the given position. An open binary
+        file may be passed to avoid reopening the term file.
+        """
+
+        if infile is None:
+            with open(self.filename, 'rb') as infile:
+                return self.read_line(position, infile)
+
+        infile.seek(int(self.offsets[position]))
+
+        return infile.read(int(self.lengths[position])).decode('utf-8')
+
+    def get_shards(self, num_shards):
+        """
+        Splits the documents into `num_shards` contiguous ranges of positions
+        covering roughly equal numbers of bytes. Returns a list of (start,
+        stop) pairs.
+        """
+
+        ends = self.offsets.astype(np.int64) + self.lengths
+        total = int(ends[-1]) if len(ends) else 0
+        targets = [total * number // num_shards for number in \
+                range(1, num_shards)]
+        bounds = [0] + [int(bound) for bound in np.searchsorted(ends,
+            targets, side='right')] + [len(self)]
+
+        return list(zip(bounds[:-1], bounds[1:]))
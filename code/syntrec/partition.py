@@ -0,0 +1,135 @@
+"""
+Provides deterministic partitions of a collection for preprocessing on several
+machines. Each document is assigned to one of `n` shards by a hash of its ID,
+so that every machine can work out its own share of the samples without any
+coordination: running `preprocess --shard i/n` on machine i, for i from 1 to
+n, processes every sample exactly once.
+
+The term files of the shards are then merged into a single term file, in
+order of document ID. The merge checks that every shard of the partition is
+present exactly once, that no document appears twice and that every document
+belongs to the shard it came from, and reports any samples that are missing
+(as documents skipped for their budget or for missing files will be).
+
+Near-duplicates (see `syntrec.dedup`) are only found within a shard.
+"""
+
+import hashlib
+import heapq
+
+from syntrec.offsets import TermFileIndex
+from syntrec.preprocess import read_metadata, write_metadata
+
+class PartitionError(Exception):
+    """
+    Raised when the term files being merged do not form a complete and
+    consistent partition.
+    """
+
+def parse_shard(spec):
+    """
+    Parses a shard specification of the form 'i/n', returning the pair (i, n).
+    Shards are numbered from 1.
+    """
+
+    try:
+        number, num_shards = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError("Invalid shard: %s (expected i/n)" % spec)
+    if not 1 <= number <= num_shards:
+        raise ValueError("Invalid shard: %s (expected 1 <= i <= n)" % spec)
+
+    return number, num_shards
+
+def get_shard(doc_id, num_shards):
+    """
+    Gets the shard, numbered from 1, to which a document is assigned.
+    """
+
+    digest = hashlib.sha1(doc_id.encode('utf-8')).digest()
+
+    return int.from_bytes(digest[:8], 'big') % num_shards + 1
+
+def select_shard(samples, number, num_shards):
+    """
+    Selects the set of samples assigned to a shard.
+    """
+
+    return {sample for sample in samples if get_shard(str(sample),
+        num_shards) == number}
+
+def iter_sorted(index, shard):
+    """
+    Iterates over the documents of a term file in order of ID, yielding (ID,
+    shard, position) triples.
+    """
+
+    for position in index.sorted_positions:
+        yield index[int(position)], shard, int(position)
+
+def merge_terms(filenames, output, samples=None):
+    """
+    Merges the term files of the shards of a partition into a single term
+    file, ordered by document ID, with metadata combining that of the shards.
+    If the samples of the whole collection are given, those missing from the
+    merged file are reported. Returns the IDs of the missing samples.
+
+    Raises a `PartitionError` if a shard is missing or repeated, if a document
+    appears twice, or if a document is in the wrong shard.
+    """
+
+    metadata = [read_metadata(filename) for filename in filenames]
+    shards = [parse_shard(meta.get('shard', '')) for meta in metadata]
+    num_shards = shards[0][1]
+    numbers = sorted(number for number, _ in shards)
+    if any(total != num_shards for _, total in shards) or \
+            numbers != list(range(1, num_shards + 1)):
+        raise PartitionError("Expected shards 1 to %d of %d, found %s" % (
+            num_shards, num_shards, ', '.join('%d/%d' % shard for shard in \
+                    shards)))
+    for key in ('processor', 'sections', 'triage'):
+        if any(meta.get(key) != metadata[0].get(key) for meta in metadata):
+            raise PartitionError("Shards differ in their %s" % key)
+
+    indexes = [TermFileIndex.load(filename) for filename in filenames]
+    for index, (number, _) in zip(indexes, shards):
+        for doc_id in index:
+            if get_shard(doc_id, num_shards) != number:
+                raise PartitionError("Document %s does not belong to shard" \
+                        " %d/%d" % (doc_id, number, num_shards))
+
+    infiles = [open(filename, 'rb') for filename in filenames]
+    merged = []
+    try:
+        with open(output, 'wb') as outfile:
+            previous = None
+            for doc_id, shard, position in heapq.merge(*[iter_sorted(index,
+                    shard) for shard, index in enumerate(indexes)]):
+                if doc_id == previous:
+                    raise PartitionError("Duplicate document: %s" % doc_id)
+                previous = doc_id
+
+                index = indexes[shard]
+                infiles[shard].seek(int(index.offsets[position]))
+                outfile.write(infiles[shard].read(int(index.lengths[
+                    position])))
+                merged.append(doc_id)
+    finally:
+        for infile in infiles:
+            infile.close()
+
+    write_metadata(output, {
+        'processor': metadata[0].get('processor'),
+        'sections': metadata[0].get('sections'),
+        'triage': metadata[0].get('triage'),
+        'documents': len(merged),
+        'shards': num_shards,
+    })
+
+    missing = []
+    if samples is not None:
+        merged = set(merged)
+        missing = sorted(str(sample) for sample in samples if str(sample) \
+                not in merged)
+
+    return missing
@@ -0,0 +1,281 @@
+"""
+Provides a runner for experiment pipelines. A pipeline is a directed acyclic
+graph of stages, each of which produces an artifact: a directory of files
+written by the stage. Every artifact is keyed by a hash of the stage's build
+function and its source code, its parameters, the keys of the artifacts it
+depends on and the contents of any external files it reads. Artifacts are
+cached under their keys, so rerunning a pipeline only rebuilds the stages
+whose inputs (or build functions) have changed and the stages downstream of
+them. Only the source of the build function itself is hashed, not that of the
+functions it calls.
+
+Stages which are cheaper to build together, such as models trained in a
+shared pass over a term file, can be put in a group. Each keeps its own key,
+so changing one rebuilds only that one, but those needing a rebuild at the
+same time are built in a single call.
+
+Each artifact directory contains a `manifest.json` recording how it was built.
+The manifest is written last, so an artifact without one is incomplete and is
+rebuilt.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import time
+
+CACHE_DIR = 'data/cache'
+MANIFEST = 'manifest.json'
+BLOCK_SIZE = 1 << 20
+
+class Stage:
+    """
+    A step in a pipeline. When the stage is built, `build` is called with the
+    path of the stage's artifact directory, followed by the artifacts of the
+    stages named in `inputs` (in order), and with `params` as keyword
+    arguments. `files` lists external files read by the stage; their contents
+    are part of the stage's key.
+
+    Stages with the same `group` have artifacts and keys of their own, but
+    are built together: the stages of a group which need building at the
+    same time are passed to a single call of `build`, as a list holding the
+    artifact directory, input artifacts and params of each. The stages of a
+    group must share their build function.
+    """
+
+    def __init__(self, name, build, inputs=(), params=None, files=(),
+            group=None):
+
+        self.name = name
+        self.build = build
+        self.inputs = list(inputs)
+        self.params = params or {}
+        self.files = list(files)
+        self.group = group
+
+class Artifact:
+    """
+    The output of a stage: a directory of files identified by a key.
+    """
+
+    def __init__(self, name, key, path):
+
+        self.name = name
+        self.key = key
+        self.path = path
+
+    def get_path(self, filename):
+
+        return os.path.join(self.path, filename)
+
+class Pipeline:
+    """
+    A set of stages and the cache in which their artifacts are stored. Stages
+    must be added after the stages they depend on, which guarantees that the
+    graph is acyclic.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+
+        self.cache_dir = cache_dir
+        self.stages = {}
+        self.file_hashes = {}
+        self.code_hashes = {}
+
+    def add(self, name, build, inputs=(), params=None, files=(), group=None):
+
+        if name in self.stages:
+            raise ValueError("Duplicate stage: %s" % name)
+        for input_name in inputs:
+            if input_name not in self.stages:
+                raise ValueError("Stage %s depends on unknown stage %s" % (
+                    name, input_name))
+        for stage in self.stages.values():
+            if group is not None and stage.group == group and \
+                    stage.build is not build:
+                raise ValueError("Stage %s has a different build from the" \
+                        " other stages of group %s" % (name, group))
+
+        stage = Stage(name, build, inputs, params, files, group)
+        self.stages[name] = stage
+
+        return stage
+
+    def run(self, targets=None):
+        """
+        Builds the named target stages (or every stage) and any stages they
+        depend on, reusing cached artifacts where possible. Returns a
+        dictionary mapping stage names to artifacts.
+        """
+
+        artifacts = {}
+        order = self.get_order(targets)
+
+        for name in order:
+            if name in artifacts:
+                continue
+
+            artifact = self.get_artifact(self.stages[name], artifacts)
+            if is_built(artifact):
+                print("Using cached %s (%s)." % (name, artifact.key[:16]))
+                artifacts[name] = artifact
+                continue
+
+            batch = [artifact] + self.get_peers(name, order, artifacts)
+            for item in batch:
+                print("Building %s (%s)." % (item.name, item.key[:16]))
+            self.build(batch, artifacts)
+            for item in batch:
+                artifacts[item.name] = item
+
+        return artifacts
+
+    def get_artifact(self, stage, artifacts):
+
+        inputs = [artifacts[input_name] for input_name in stage.inputs]
+        key = self.get_key(stage, inputs)
+        path = os.path.join(self.cache_dir, '%s-%s' % (
+            stage.build.__name__, key[:16]))
+
+        return Artifact(stage.name, key, path)
+
+    def get_peers(self, name, order, artifacts):
+        """
+        Gets the artifacts of the other stages in the group of a stage which
+        need building and whose inputs are ready, so that they are built
+        along with it.
+        """
+
+        group = self.stages[name].group
+        if group is None:
+            return []
+
+        peers = []
+        for peer_name in order:
+            stage = self.stages[peer_name]
+            if peer_name == name or peer_name in artifacts or \
+                    stage.group != group or any(input_name not in \
+                    artifacts for input_name in stage.inputs):
+                continue
+
+            artifact = self.get_artifact(stage, artifacts)
+            if not is_built(artifact):
+                peers.append(artifact)
+
+        return peers
+
+    def build(self, batch, artifacts):
+        """
+        Builds the artifacts of a stage, or of several stages of a group,
+        given the artifacts built so far.
+        """
+
+        for artifact in batch:
+            if os.path.exists(artifact.path):
+                shutil.rmtree(artifact.path)
+            os.makedirs(artifact.path)
+
+        stages = [self.stages[artifact.name] for artifact in batch]
+        inputs = [[artifacts[input_name] for input_name in stage.inputs] \
+                for stage in stages]
+
+        start = time.time()
+        if stages[0].group is None:
+            stages[0].build(batch[0].path, *inputs[0], **stages[0].params)
+        else:
+            stages[0].build([(artifact.path, stage_inputs, stage.params) \
+                    for artifact, stage_inputs, stage in zip(batch, inputs,
+                        stages)])
+        seconds = time.time() - start
+
+        for artifact, stage_inputs, stage in zip(batch, inputs, stages):
+            manifest = {
+                'stage': stage.name,
+                'build': get_build_name(stage.build),
+                'code': self.get_code_hash(stage.build),
+                'key': artifact.key,
+                'params': stage.params,
+                'inputs': {input.name: input.key for input in stage_inputs},
+                'files': {filename: self.get_file_hash(filename) \
+                        for filename in stage.files},
+                'built_with': [other.name for other in batch \
+                        if other is not artifact],
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'seconds': seconds,
+            }
+            with open(artifact.get_path(MANIFEST), 'w') as outfile:
+                json.dump(manifest, outfile, indent=2, sort_keys=True)
+
+    def get_order(self, targets=None):
+        """
+        Gets the names of the stages needed to build the targets, in an order
+        in which each stage follows its inputs.
+        """
+
+        if targets is None:
+            targets = list(self.stages)
+
+        needed = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in needed:
+                needed.add(name)
+                pending.extend(self.stages[name].inputs)
+
+        # Stages are added after their inputs, so insertion order is a
+        # topological order.
+        return [name for name in self.stages if name in needed]
+
+    def get_key(self, stage, inputs):
+
+        description = {
+            'build': get_build_name(stage.build),
+            'code': self.get_code_hash(stage.build),
+            'params': stage.params,
+            'inputs': [input.key for input in inputs],
+            'files': [self.get_file_hash(filename) \
+                    for filename in stage.files],
+        }
+        encoded = json.dumps(description, sort_keys=True).encode('utf-8')
+
+        return hashlib.sha256(encoded).hexdigest()
+
+    def get_file_hash(self, filename):
+
+        if filename not in self.file_hashes:
+            digest = hashlib.sha256()
+            with open(filename, 'rb') as infile:
+                for block in iter(lambda: infile.read(BLOCK_SIZE), b''):
+                    digest.update(block)
+            self.file_hashes[filename] = digest.hexdigest()
+
+        return self.file_hashes[filename]
+
+    def get_code_hash(self, build):
+        """
+        Gets a hash of the source code of a build function, or None if its
+        source cannot be found.
+        """
+
+        name = get_build_name(build)
+        if name not in self.code_hashes:
+            try:
+                source = inspect.getsource(build)
+            except (OSError, TypeError):
+                self.code_hashes[name] = None
+            else:
+                self.code_hashes[name] = hashlib.sha256(
+                        source.encode('utf-8')).hexdigest()
+
+        return self.code_hashes[name]
+
+def is_built(artifact):
+
+    return os.path.exists(artifact.get_path(MANIFEST))
+
+def get_build_name(build):
+
+    return '%s.%s' % (build.__module__, build.__qualname__)
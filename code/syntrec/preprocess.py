@@ -0,0 +1,170 @@
+"""
+Provides functions for converting documents into term files. Documents are
+read through a Parmenides document source and converted into tokens either by
+a Parmenides processor (yielding syntactic terms) or by spaCy (yielding the
+baseline words). Each document is written as a single line of the term file.
+"""
+
+import json
+import time
+
+from syntrec.budget import BudgetExceeded
+from syntrec.source.stream import split_sections
+from syntrec.words import iter_doc_words
+
+METADATA_SUFFIX = '.meta.json'
+
+# Settings which syntrec sets itself while reading documents.
+IGNORED_SETTINGS = ['DOCUMENT_SOURCE', 'PREFETCH_FILES', 'PREFETCH_WORKERS']
+
+def write_terms(documents, filename, get_tokens, duplicates=None,
+        metadata=None):
+    """
+    Writes a term file containing the tokens of each document, as given by
+    `get_tokens`. If `duplicates` are given (see `syntrec.dedup`), duplicate
+    documents are not processed; the tokens of their canonical copy are
+    written under their IDs instead. Documents skipped for exceeding their
+    budget (see `syntrec.budget`) are left out of the term file. Duplicates
+    whose canonical copy is skipped, whether here or beforehand (by a
+    triage, say), are left out too, and recorded in `duplicates.dropped`.
+
+    If `metadata` is given, it is written alongside the term file as
+    `<filename>.meta.json`, together with the number of documents written.
+    """
+
+    num_documents = 0
+    processed = set()
+    with open(filename, 'w') as outfile:
+        for document in documents:
+            doc_id = document.identifier
+            if duplicates is not None and duplicates.is_duplicate(doc_id):
+                continue
+
+            print("Processing document: %s" % doc_id)
+            start = time.perf_counter()
+            try:
+                line = ' '.join(get_tokens(document))
+            except BudgetExceeded as error:
+                if duplicates is not None:
+                    duplicates.record_dropped(doc_id, "over budget (%s)" % \
+                            error)
+                processed.add(doc_id)
+                continue
+
+            outfile.write("%s %s\n" % (doc_id, line))
+            num_documents += 1
+            processed.add(doc_id)
+
+            if duplicates is not None:
+                duplicates.record_parse(document,
+                        time.perf_counter() - start)
+                for copy_id in duplicates.get_copies(doc_id):
+                    outfile.write("%s %s\n" % (copy_id, line))
+                    num_documents += 1
+
+    if duplicates is not None:
+        for doc_id in list(duplicates.copies):
+            if doc_id not in processed:
+                duplicates.record_dropped(doc_id, "skipped before processing")
+
+    if metadata is not None:
+        write_metadata(filename, dict(metadata, documents=num_documents))
+
+def write_metadata(filename, metadata):
+    """
+    Writes the metadata of a term file alongside it.
+    """
+
+    with open(filename + METADATA_SUFFIX, 'w') as outfile:
+        json.dump(metadata, outfile, indent=2, sort_keys=True)
+
+def read_metadata(filename):
+
+    with open(filename + METADATA_SUFFIX, 'r') as infile:
+        return json.load(infile)
+
+def get_parmenides_tokens(document, processor):
+    """
+    Gets the syntactic terms of a document using a Parmenides processor. The
+    processor is given one section at a time (see
+    `syntrec.source.stream.split_sections`), so that only the section being
+    parsed is held in memory.
+    """
+
+    return [str(term) for section_document in split_sections(document) \
+            for tree in processor.process(section_document) \
+            for term in tree.terms]
+
+def get_spacy_tokens(document):
+    """
+    Gets the baseline words of a document using spaCy.
+    """
+
+    return list(iter_doc_words(document))
+
+def get_processor_settings(processor):
+    """
+    Gets what determines the output of the named processor besides its
+    input, so that it can be part of the keys of pipeline stages: the
+    Parmenides version and settings, or the spaCy version and the name and
+    version of its model. Parmenides must already have been initialized.
+    Settings which only affect how documents are read (`IGNORED_SETTINGS`),
+    and values which cannot be written as JSON, are left out.
+    """
+
+    if processor == 'parmenides':
+        from parmenides.conf import settings
+
+        values = {}
+        for name in dir(settings):
+            if not name.isupper() or name in IGNORED_SETTINGS:
+                continue
+            value = getattr(settings, name)
+            try:
+                values[name] = json.loads(json.dumps(value))
+            except (TypeError, ValueError):
+                continue
+
+        return {'version': get_version('parmenides'), 'settings': values}
+    elif processor == 'spacy':
+        import spacy
+
+        from syntrec.words import SPACY_MODEL, get_nlp
+
+        meta = get_nlp().meta
+
+        return {
+            'version': spacy.__version__,
+            'model': SPACY_MODEL,
+            'model_name': '%s_%s' % (meta.get('lang'), meta.get('name')),
+            'model_version': meta.get('version'),
+        }
+    else:
+        raise TypeError("Unsupported processor: %s" % processor)
+
+def get_version(package):
+
+    from importlib import metadata
+
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return None
+
+def get_tokenizer(processor):
+    """
+    Gets a function converting a document into tokens with the named processor.
+    Parmenides must already have been initialized to use its processor.
+    """
+
+    if processor == 'parmenides':
+        from parmenides.conf import settings
+        from parmenides.utils import import_class
+
+        parmenides_processor = import_class(settings.PROCESSOR)()
+        return lambda document: get_parmenides_tokens(document,
+                parmenides_processor)
+    elif processor == 'spacy':
+        return get_spacy_tokens
+    else:
+        raise TypeError("Unsupported processor: %s" % processor)
@@ -0,0 +1,141 @@
+"""
+Provides quantized indexes, which hold document vectors at reduced precision
+to save memory and disk space. Each dimension is scaled by the largest
+magnitude it takes in the collection, and the scaled vectors are stored either
+as float16 values or as int8 codes in [-127, 127] (a quarter of the size of the
+float32 vectors of a gensim index). Queries are scored directly against the
+compressed vectors: the query is multiplied by the scales once, and the codes
+are widened to float32 a block at a time, so the full-precision vectors are
+never rebuilt.
+
+A quantized index is built from a full index and stored beside it as
+`<prefix>.<dtype>.npz`; the document IDs are those of the full index.
+"""
+
+import numpy as np
+from gensim import matutils
+from scipy import sparse
+
+from syntrec.ranking import merge_top_k, top_k
+from syntrec.sharding import normalize
+
+DTYPES = {'float16': np.float16, 'int8': np.int8}
+INT8_MAX = 127
+BLOCK_SIZE = 65536
+
+class QuantizedIndex:
+    """
+    An index of quantized document vectors. `codes` holds one row per
+    document and `scales` the scale of each dimension, so that a document
+    vector is approximately `codes[i] * scales`.
+    """
+
+    def __init__(self, codes, scales):
+
+        self.codes = codes
+        self.scales = np.asarray(scales, dtype=np.float32)
+        self.dtype = codes.dtype.name
+
+    @classmethod
+    def from_vectors(cls, vectors, dtype):
+        """
+        Quantizes a matrix of normalized document vectors.
+        """
+
+        if dtype not in DTYPES:
+            raise ValueError("Unsupported quantization type: %s" % dtype)
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scales = np.abs(vectors).max(axis=0)
+        scales[scales == 0] = 1
+
+        if dtype == 'int8':
+            scales /= INT8_MAX
+            codes = np.clip(np.rint(vectors / scales), -INT8_MAX, INT8_MAX)
+        else:
+            codes = vectors / scales
+
+        return cls(codes.astype(DTYPES[dtype]), scales)
+
+    @classmethod
+    def from_index(cls, index, dtype):
+        """
+        Quantizes the vectors of a gensim `Similarity` index.
+        """
+
+        index.close_shard()
+        vectors = []
+        for shard in index.shards:
+            shard_vectors = shard.get_index().index
+            if sparse.issparse(shard_vectors):
+                shard_vectors = shard_vectors.toarray()
+            vectors.append(np.asarray(shard_vectors, dtype=np.float32))
+
+        return cls.from_vectors(np.vstack(vectors), dtype)
+
+    @classmethod
+    def load(cls, prefix, dtype):
+
+        with np.load(get_filename(prefix, dtype)) as data:
+            return cls(data['codes'], data['scales'])
+
+    def save(self, prefix):
+
+        np.savez(get_filename(prefix, self.dtype), codes=self.codes,
+                scales=self.scales)
+
+    @property
+    def num_features(self):
+
+        return self.codes.shape[1]
+
+    @property
+    def nbytes(self):
+
+        return self.codes.nbytes + self.scales.nbytes
+
+    def __len__(self):
+
+        return len(self.codes)
+
+    def get_top(self, queries, depth):
+        """
+        Gets the `depth` best documents for each of a list of queries, given
+        as gensim vectors. Returns matrices of positions and scores with one
+        row per query.
+        """
+
+        queries = normalize(np.vstack([matutils.sparse2full(query,
+            self.num_features) for query in queries])) * self.scales
+
+        positions = []
+        scores = []
+        for start in range(0, len(self.codes), BLOCK_SIZE):
+            block = self.codes[start:start + BLOCK_SIZE].astype(np.float32)
+            block_positions, block_scores = top_k(queries @ block.T,
+                    min(depth, len(block)))
+            positions.append(block_positions + start)
+            scores.append(block_scores)
+
+        return merge_top_k(positions, scores, depth)
+
+def get_filename(prefix, dtype):
+
+    return '%s.%s.npz' % (prefix, dtype)
+
+def get_full_size(index):
+    """
+    Gets the number of bytes taken by the dense float32 vectors of a gensim
+    `Similarity` index.
+    """
+
+    return len(index) * index.num_features * np.dtype(np.float32).itemsize
+
+def get_overlap(first, second, k=10):
+    """
+    Gets the mean fraction of the first `k` documents two sets of rankings
+    have in common, given as matrices of positions with one row per query.
+    """
+
+    return np.mean([len(set(a[:k]) & set(b[:k])) / k for a, b in \
+            zip(first, second)])
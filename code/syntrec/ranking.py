@@ -0,0 +1,89 @@
+"""
+Provides vectorized top-k selection over similarity scores. Scores are given
+as two-dimensional arrays with one row per query; rather than sorting every
+score, the best `k` in each row are selected with a partial sort and only
+those are ordered. Rankings of the same topics can also be fused into one.
+"""
+
+import numpy as np
+
+RRF_K = 60
+
+def top_k(scores, k):
+    """
+    Gets the positions and values of the `k` highest scores in each row of a
+    two-dimensional array, in descending order of score.
+    """
+
+    scores = np.asarray(scores)
+    if k < scores.shape[1]:
+        positions = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        positions = np.broadcast_to(np.arange(scores.shape[1]),
+                scores.shape)
+    values = np.take_along_axis(scores, positions, axis=1)
+
+    order = np.argsort(-values, axis=1, kind='stable')
+
+    return np.take_along_axis(positions, order, axis=1), \
+            np.take_along_axis(values, order, axis=1)
+
+def merge_top_k(positions, scores, k):
+    """
+    Merges several top-k lists into one. `positions` and `scores` are
+    sequences of arrays with one row per query, such as the top-k results of
+    each shard of an index; the positions must already be global.
+    """
+
+    positions = np.concatenate(positions, axis=1)
+    scores = np.concatenate(scores, axis=1)
+    best, values = top_k(scores, k)
+
+    return np.take_along_axis(positions, best, axis=1), values
+
+def fuse(positions, scores, num_docs, depth, method='rrf', k=RRF_K):
+    """
+    Fuses several rankings of the same topics into one. `positions` and
+    `scores` have the shape (rankings, topics, depth). With the 'rrf' method,
+    each document scores the sum of 1 / (k + rank) over the rankings in which
+    it appears (reciprocal rank fusion); with 'combsum', it scores the sum of
+    its min-max normalized scores.
+
+    All topics are fused at once: each (topic, document) pair is given a key,
+    contributions are summed per key, and the keys are sorted by topic and then
+    by descending fused score. Returns a list with a pair of arrays (positions
+    and fused scores, best first) for each topic.
+    """
+
+    positions = np.asarray(positions, dtype=np.int64)
+    scores = np.asarray(scores, dtype=np.float64)
+    num_rankings, num_topics, list_depth = positions.shape
+
+    if method == 'rrf':
+        contributions = np.broadcast_to(1.0 / (k + np.arange(1,
+            list_depth + 1)), positions.shape)
+    elif method == 'combsum':
+        low = scores.min(axis=2, keepdims=True)
+        high = scores.max(axis=2, keepdims=True)
+        contributions = (scores - low) / np.where(high > low, high - low, 1)
+    else:
+        raise ValueError("Unsupported fusion method: %s" % method)
+
+    topics = np.broadcast_to(np.arange(num_topics)[None, :, None],
+            positions.shape)
+    keys = (topics * num_docs + positions).ravel()
+    unique, inverse = np.unique(keys, return_inverse=True)
+    sums = np.bincount(inverse.ravel(), weights=contributions.ravel())
+
+    unique_topics = unique // num_docs
+    order = np.lexsort((-sums, unique_topics))
+    sorted_topics = unique_topics[order]
+    starts = np.searchsorted(sorted_topics, np.arange(num_topics))
+    ends = np.searchsorted(sorted_topics, np.arange(num_topics), side='right')
+
+    fused = []
+    for start, end in zip(starts, ends):
+        best = order[start:min(end, start + depth)]
+        fused.append((unique[best] % num_docs, sums[best]))
+
+    return fused
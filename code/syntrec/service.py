@@ -0,0 +1,289 @@
+"""
+Provides a long-running query service. The service loads a dictionary, a
+topic model, an index and a topic processor once, then answers ad hoc topics
+over HTTP without rerunning an experiment.
+
+Requests arriving at about the same time are grouped into micro-batches: the
+first request of a batch waits at most `max_wait` seconds for others to join
+it, up to `max_batch` requests, and the whole batch is converted into the
+model's vector space and scored against the index together.
+
+The service understands two requests:
+
+    POST /query  with a JSON body {"text": "...", "depth": 1000}, returning
+                 {"results": [{"doc_id": ..., "score": ...}, ...]}
+    GET /stats   returning a latency and throughput report
+
+Malformed requests are answered with status 400 before they join a batch, and
+queries which fail with status 500; a batch which fails is ranked again one
+topic at a time, so that only the failing topics fail.
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+
+from syntrec.evaluation import RUN_DEPTH, get_rankings
+
+MAX_BATCH = 32
+MAX_WAIT = 0.01
+LATENCY_WINDOW = 10000
+
+class QueryService:
+    """
+    Answers topics against a trained model. `get_tokens` converts a topic
+    document into tokens, as in `evaluate`.
+    """
+
+    def __init__(self, dictionary, model, index, doc_ids, get_tokens,
+            max_batch=MAX_BATCH, max_wait=MAX_WAIT):
+
+        self.dictionary = dictionary
+        self.model = model
+        self.index = index
+        self.doc_ids = doc_ids
+        self.get_tokens = get_tokens
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = None
+        self.stats = ServiceStats()
+
+    def rank(self, texts, depth=RUN_DEPTH):
+        """
+        Ranks documents for a batch of topic texts, returning a list of
+        (document ID, score) pairs for each.
+        """
+
+        from parmenides.document import Document, Section
+
+        queries = []
+        for number, text in enumerate(texts):
+            topic = Document(
+                identifier=str(number),
+                title='',
+                sections=[Section(name='query', content=text)],
+                collection='topics',
+            )
+            queries.append(self.model[self.dictionary.doc2bow(
+                self.get_tokens(topic))])
+
+        return [[(self.doc_ids[position], float(score)) for position, score \
+                in ranking] for ranking in get_rankings(self.index, queries,
+                    depth)]
+
+    async def query(self, text, depth=RUN_DEPTH):
+        """
+        Submits a topic to the next micro-batch and waits for its results.
+        """
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, depth, future, time.perf_counter()))
+
+        return await future
+
+    async def run_batches(self):
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(),
+                        timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Whatever goes wrong with one batch, the batcher must carry on,
+            # or every later query would wait forever.
+            try:
+                await self.run_batch(batch)
+            except Exception as error:
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(error)
+
+    async def run_batch(self, batch):
+        """
+        Ranks a micro-batch and settles the futures of its queries. Queries
+        whose clients have gone away (so that their futures are cancelled)
+        are left out.
+        """
+
+        loop = asyncio.get_running_loop()
+        batch = [item for item in batch if not item[2].done()]
+        if not batch:
+            return
+
+        texts = [text for text, _, _, _ in batch]
+        depth = max(depth for _, depth, _, _ in batch)
+        try:
+            results = await loop.run_in_executor(None, self.rank, texts,
+                    depth)
+        except Exception:
+            if len(batch) == 1:
+                raise
+
+            # Rank the topics one by one, so that a topic which fails does
+            # not fail the rest of its batch.
+            results = []
+            for text, item_depth, future, _ in batch:
+                try:
+                    results.extend(await loop.run_in_executor(None,
+                        self.rank, [text], item_depth))
+                except Exception as item_error:
+                    if not future.done():
+                        future.set_exception(item_error)
+                    results.append(None)
+
+        finished = time.perf_counter()
+        self.stats.add_batch(len(batch))
+        for (_, item_depth, future, started), ranking in zip(batch, results):
+            if ranking is None or future.done():
+                continue
+            self.stats.add_latency(finished - started)
+            future.set_result(ranking[:item_depth])
+
+    async def handle(self, reader, writer):
+
+        try:
+            status, response = await self.respond(reader)
+        except (ValueError, KeyError, TypeError,
+                asyncio.IncompleteReadError) as error:
+            status, response = 400, {'error': str(error)}
+        except Exception as error:
+            status, response = 500, {'error': str(error)}
+
+        write_response(writer, status, response)
+        await writer.drain()
+        writer.close()
+
+    async def respond(self, reader):
+        """
+        Reads a request and gets the status and body of the response. Errors
+        in the request are raised; a query which fails once it has been
+        accepted is answered with status 500.
+        """
+
+        request_line = (await reader.readline()).decode('latin-1')
+        method, path, _ = request_line.split(' ', 2)
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+        if method == 'GET' and path == '/stats':
+            return 200, self.stats.report()
+        elif method == 'POST' and path == '/query':
+            text, depth = parse_query(body)
+            try:
+                ranking = await self.query(text, depth)
+            except Exception as error:
+                return 500, {'error': str(error)}
+
+            return 200, {'results': [{'doc_id': doc_id, 'score': score} \
+                    for doc_id, score in ranking]}
+
+        return 404, {'error': 'Not found: %s %s' % (method, path)}
+
+    async def serve(self, host='localhost', port=8000):
+
+        self.queue = asyncio.Queue()
+        batcher = asyncio.create_task(self.run_batches())
+        server = await asyncio.start_server(self.handle, host, port)
+
+        print("Serving queries on http://%s:%d." % (host, port))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+class ServiceStats:
+    """
+    Collects the latencies of recent queries and the sizes of the batches in
+    which they were answered.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+
+        self.started = time.perf_counter()
+        self.latencies = deque(maxlen=window)
+        self.num_queries = 0
+        self.num_batches = 0
+
+    def add_batch(self, size):
+
+        self.num_batches += 1
+        self.num_queries += size
+
+    def add_latency(self, latency):
+
+        self.latencies.append(latency)
+
+    def report(self):
+
+        elapsed = time.perf_counter() - self.started
+        latencies = sorted(self.latencies)
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1,
+                int(fraction * len(latencies)))] * 1000
+
+        return {
+            'queries': self.num_queries,
+            'batches': self.num_batches,
+            'mean_batch_size': self.num_queries / self.num_batches \
+                    if self.num_batches else None,
+            'queries_per_second': self.num_queries / elapsed,
+            'latency_ms': {
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'p99': percentile(0.99),
+                'max': latencies[-1] * 1000 if latencies else None,
+            },
+        }
+
+def parse_query(body):
+    """
+    Parses the JSON body of a query request into its text and depth. Requests
+    are checked before they join a micro-batch, so that a malformed request
+    cannot fail the others in its batch; a `ValueError` is raised for them.
+    """
+
+    request = json.loads(body or b'{}')
+    if not isinstance(request, dict):
+        raise ValueError("The request must be a JSON object")
+
+    text = request.get('text')
+    if not isinstance(text, str):
+        raise ValueError("'text' must be a string")
+
+    depth = request.get('depth', RUN_DEPTH)
+    if isinstance(depth, bool) or not isinstance(depth, int) or depth < 1:
+        raise ValueError("'depth' must be a positive integer")
+
+    return text, depth
+
+def write_response(writer, status, response):
+
+    body = json.dumps(response).encode('utf-8')
+    reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+            500: 'Internal Server Error'}[status]
+    writer.write(("HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n" \
+            "Content-Length: %d\r\nConnection: close\r\n\r\n" % (status,
+                reason, len(body))).encode('latin-1'))
+    writer.write(body)
@@ -0,0 +1,256 @@
+"""
+Provides a sharded index in which the document vectors are split across
+several processes. Each shard is held by a worker, either a local process or a
+server on another node reached over a socket. A query is sent to every shard
+at once; each shard scores its own documents and returns its top k, and the
+coordinator merges these into the global ranking. Since the shards score in
+parallel, query latency falls with the number of shards.
+
+A sharded index is stored under a prefix: `<prefix>.<n>.npy` holds the
+normalized vectors of shard n, `<prefix>.shards.json` records the shard sizes
+and `<prefix>.ids` the document IDs, in index order.
+
+Since connections exchange pickles, anyone who can talk to a shard can run
+code on it, so every connection is authenticated. Shard servers and the
+coordinators connecting to them share a key, read from a key file or the
+`SYNTREC_AUTHKEY` environment variable; neither will start without one. Local
+workers are authenticated with a key generated for each run.
+"""
+
+import json
+import multiprocessing
+import os
+import secrets
+import warnings
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener, answer_challenge, \
+        deliver_challenge
+
+import numpy as np
+from gensim import matutils
+
+from syntrec.indexing import write_doc_ids
+from syntrec.ranking import merge_top_k, top_k
+
+AUTHKEY_VARIABLE = 'SYNTREC_AUTHKEY'
+AUTHKEY_BYTES = 32
+
+def build_shards(prefix, model, corpus, num_shards):
+    """
+    Builds and saves a sharded index over the documents of a corpus, as
+    represented in the vector space of a topic model.
+    """
+
+    vectors = matutils.corpus2dense(model[corpus], model.num_topics).T
+    vectors = normalize(vectors)
+
+    sizes = []
+    for number, shard in enumerate(np.array_split(vectors, num_shards)):
+        np.save(get_shard_filename(prefix, number), shard)
+        sizes.append(len(shard))
+
+    with open('%s.shards.json' % prefix, 'w') as outfile:
+        json.dump({'num_features': model.num_topics, 'sizes': sizes}, outfile)
+    write_doc_ids(corpus.index, prefix)
+
+def load_shard(prefix, number):
+    """
+    Loads a single shard and the position of its first document in the index.
+    """
+
+    sizes = read_shard_info(prefix)['sizes']
+    shard = np.load(get_shard_filename(prefix, number), mmap_mode='r')
+
+    return shard, sum(sizes[:number])
+
+def read_shard_info(prefix):
+
+    with open('%s.shards.json' % prefix, 'r') as infile:
+        return json.load(infile)
+
+def get_shard_filename(prefix, number):
+
+    return '%s.%d.npy' % (prefix, number)
+
+def normalize(vectors):
+    """
+    Scales each row of a matrix to unit length, so that dot products are
+    cosine similarities. Rows of zeros are left as they are.
+    """
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+
+    return vectors / norms
+
+def serve(connection, prefix, number, authkey=None):
+    """
+    Answers queries against a single shard over a connection until the
+    connection is closed or a `None` message is received. Each query message
+    is a pair of a matrix of normalized query vectors and a depth; the reply
+    is a pair of matrices holding the global positions and scores of the best
+    documents in the shard for each query. If an `authkey` is given, the
+    connection is first authenticated with it (see `authenticate`).
+    """
+
+    if authkey is not None:
+        answer_challenge(connection, authkey)
+        deliver_challenge(connection, authkey)
+
+    shard, offset = load_shard(prefix, number)
+    shard = np.ascontiguousarray(shard)
+
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        queries, depth = message
+        positions, scores = top_k(queries @ shard.T, depth)
+        connection.send((positions + offset, scores))
+
+    connection.close()
+
+def get_authkey(key_file=None):
+    """
+    Gets the key shared by shard servers and coordinators from a key file or,
+    failing that, from the `SYNTREC_AUTHKEY` environment variable. Returns
+    None if neither is given.
+    """
+
+    if key_file is not None:
+        with open(key_file, 'rb') as infile:
+            authkey = infile.read().strip()
+        if not authkey:
+            raise ValueError("The key file is empty: %s" % key_file)
+        return authkey
+
+    authkey = os.environ.get(AUTHKEY_VARIABLE)
+
+    return authkey.encode('utf-8') if authkey else None
+
+def check_authkey(address, authkey):
+    """
+    Gets the key to use for a connection to or from an address. Connections
+    unpickle whatever they receive, so anyone who knows the key can run code
+    at either end; even on a loopback address, other users of the node could
+    connect, so there is no default key.
+    """
+
+    if authkey is None:
+        raise ValueError("A key is needed to serve or connect to shards on" \
+                " %s; set %s or give a key file" % (address[0],
+                    AUTHKEY_VARIABLE))
+
+    return authkey
+
+def authenticate(connection, authkey):
+    """
+    Authenticates both ends of a connection to a local worker, which answers
+    and then delivers a challenge (see `serve`).
+    """
+
+    deliver_challenge(connection, authkey)
+    answer_challenge(connection, authkey)
+
+def serve_shard(prefix, number, address, authkey=None):
+    """
+    Serves a single shard over a socket, answering one coordinator at a time.
+    `address` is a (host, port) pair; `authkey` is the key shared with
+    coordinators (see `check_authkey`). Clients which fail to authenticate,
+    or drop their connections, are warned about and the server carries on.
+    """
+
+    authkey = check_authkey(address, authkey)
+    with Listener(address, authkey=authkey) as listener:
+        print("Serving shard %d of %s on %s:%d." % ((number, prefix) + \
+                tuple(address)))
+        while True:
+            try:
+                connection = listener.accept()
+            except (AuthenticationError, EOFError, ConnectionError) as error:
+                warnings.warn("Rejected a client: %s" % error)
+                continue
+            try:
+                serve(connection, prefix, number)
+            except ConnectionError as error:
+                warnings.warn("Lost a coordinator: %s" % error)
+
+class ShardedIndex:
+    """
+    The coordinator of a sharded index. The index holds one connection per
+    shard; `start` creates local worker processes, authenticated with a key
+    of their own, and `connect` reaches shard servers started with
+    `serve_shard`.
+    """
+
+    def __init__(self, connections, num_features, processes=()):
+
+        self.connections = connections
+        self.num_features = num_features
+        self.processes = list(processes)
+
+    @classmethod
+    def start(cls, prefix):
+
+        info = read_shard_info(prefix)
+        authkey = secrets.token_bytes(AUTHKEY_BYTES)
+        connections = []
+        processes = []
+        for number in range(len(info['sizes'])):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=serve,
+                    args=(child, prefix, number, authkey), daemon=True)
+            process.start()
+            child.close()
+            authenticate(parent, authkey)
+            connections.append(parent)
+            processes.append(process)
+
+        return cls(connections, info['num_features'], processes)
+
+    @classmethod
+    def connect(cls, addresses, num_features, authkey=None):
+
+        return cls([Client(address, authkey=check_authkey(address,
+            authkey)) for address in addresses], num_features)
+
+    def get_top(self, queries, depth):
+        """
+        Gets the `depth` best documents for each of a list of queries, given
+        as gensim vectors. Returns matrices of positions and scores with one
+        row per query.
+        """
+
+        queries = normalize(np.vstack([matutils.sparse2full(query,
+            self.num_features) for query in queries]))
+
+        for connection in self.connections:
+            connection.send((queries, depth))
+        results = [connection.recv() for connection in self.connections]
+
+        return merge_top_k([positions for positions, _ in results],
+                [scores for _, scores in results], depth)
+
+    def close(self):
+
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            connection.close()
+        for process in self.processes:
+            process.join()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.close()
@@ -8,8 +8,11 @@ from parmenides.conf import settings
 from parmenides.document import Document, Section
 from parmenides.source import DocumentSource
 
+import functools
 import json
-import os
+
+from syntrec.source.prefetch import read_files
+from syntrec.source.stream import StreamingDocument
 
 class CordSource(DocumentSource):
     """
@@ -18,15 +21,23 @@ class CordSource(DocumentSource):
     (see the `FileDescription` class) which describe how a particular article
     is represented in CORD-19. Some articles have abstracts only, while others
     may be represented by PDF or PMC JSON files; the file description tells
-    Parmenides where to find the articles data. 
+    Parmenides where to find the articles data. Full-text files may be read
+    ahead (see `syntrec.source.prefetch`); an article whose full-text file is
+    missing is read from its metadata (title and abstract) instead, with a
+    warning. Full-text articles are yielded as streaming documents (see
+    `syntrec.source.stream`): the JSON is parsed, its paragraphs kept and the
+    rest freed, and each section string is built only as it is read. (The
+    standard library cannot parse JSON incrementally, so the paragraphs of a
+    document are held while it is processed.)
     """
 
     @classmethod
     def get_documents(cls, file_descriptions):
 
-        for file_description in file_descriptions:
-            if file_description.filename is None:
-                # Abstract-Only Document
+        for file_description, text in read_files(file_descriptions,
+                get_filename, skip_missing=False):
+            if text is None:
+                # Abstract-Only Document (or a missing full-text file)
                 yield Document(
                     identifier=file_description.cord_uid,
                     title=file_description.title,
@@ -35,43 +46,64 @@ class CordSource(DocumentSource):
                     collection=settings.COLLECTION_NAME,
                 )
             else:
-                # Full-text document, loaded from filesystem
-                with open(file_description.filename, 'r',
-                        errors=settings.ENCODING_ERRORS) as infile:
-                    data = json.load(infile)
-
-                    sections = []
-
-                    # Add the abstract
-                    if 'abstract' in data['metadata'].keys():
-
-                        paragraphs = [paragraph['text'] for paragraph in \
-                                data['metadata']['abstract']]
-                        joined_text = ' '.join(paragraphs)
-
-                        section = Section(name='Abstract', content=joined_text)
-                        sections.append(section)
-
-                    current_section = None
-                    current_section_text = ''
-                    # Add sections from the article body
-                    for paragraph in data['body_text']:
-                        if paragraph['section'] != current_section:
-                            if current_section is not None:
-                                sections.append(Section(name=current_section,
-                                    content=current_section_text))
-                            current_section = paragraph['section']
-                            current_section_text = ''
-
-                        current_section_text += ' %s' % paragraph['text']
-
-                    # Add the final section
-                    sections.append(Section(name=current_section,
-                        content=current_section_text))
-
-                    yield Document(
-                        identifier=file_description.cord_uid,
-                        title=file_description.title,
-                        sections=sections,
-                        collection=settings.COLLECTION_NAME,
-                    )
+                # Full-text document, read from the filesystem. Only the
+                # paragraphs are kept; the rest of the parsed JSON is freed.
+                data = json.loads(text)
+                del text
+                abstract, body = get_paragraphs(data)
+                del data
+
+                yield StreamingDocument(
+                    identifier=file_description.cord_uid,
+                    title=file_description.title,
+                    get_sections=functools.partial(get_sections, abstract,
+                        body),
+                    collection=settings.COLLECTION_NAME,
+                )
+
+def get_paragraphs(data):
+    """
+    Gets the paragraphs of a full-text article from its JSON data: those of
+    the abstract (or None if it has none), and a list of (section name,
+    paragraphs) pairs for each run of body paragraphs with the same section
+    name.
+    """
+
+    abstract = None
+    if 'abstract' in data['metadata'].keys():
+        abstract = [paragraph['text'] for paragraph in \
+                data['metadata']['abstract']]
+
+    body = []
+    current_section = None
+    paragraphs = []
+    for paragraph in data['body_text']:
+        if paragraph['section'] != current_section:
+            if current_section is not None:
+                body.append((current_section, paragraphs))
+            current_section = paragraph['section']
+            paragraphs = []
+
+        paragraphs.append(paragraph['text'])
+
+    # Add the final section
+    body.append((current_section, paragraphs))
+
+    return abstract, body
+
+def get_sections(abstract, body):
+    """
+    Yields the sections of a full-text article from its paragraphs (see
+    `get_paragraphs`), joining the paragraphs of each as it is reached.
+    """
+
+    if abstract is not None:
+        yield Section(name='Abstract', content=' '.join(abstract))
+
+    for name, paragraphs in body:
+        yield Section(name=name, content=''.join(' %s' % paragraph for \
+                paragraph in paragraphs))
+
+def get_filename(file_description):
+
+    return file_description.filename
@@ -5,63 +5,117 @@ Setting `DOCUMENT_SOURCE='syntrec.source.nxml.NXMLSource'` will enable
 Parmenides to read documents directly from NXML files.
 """
 
+import functools
 import os
-import warnings
 
 from bs4 import BeautifulSoup
 from parmenides.conf import settings
-from parmenides.document import Document, Section
+from parmenides.document import Section
 from parmenides.source import DocumentSource
 
+from syntrec.source.prefetch import read_files
+from syntrec.source.stream import StreamingDocument
+
 class NXMLSource(DocumentSource):
     """
     A Parmenides document source for reading from NXML files. The input to the
     `get_documents` class method is a list of file paths, each of which is read
-    from disk, parsed as XML, and converted into a Parmenides `Document`. All
-    paragraphs are read from the file, but references and other metadata are
-    ignored.
+    from disk, parsed as XML, and converted into a Parmenides `Document`. The
+    abstract in the article metadata becomes an 'Abstract' section, and all
+    paragraphs of the body are read, but references and other metadata are
+    ignored. Missing files are skipped with a warning, and files may be read
+    ahead (see `syntrec.source.prefetch`). Documents are yielded as streaming
+    documents (see `syntrec.source.stream`): once the XML is parsed, only the
+    text of each paragraph is kept, and each section string is built only as
+    it is read.
     """
 
     @classmethod
     def get_documents(cls, filenames):
 
-        for filename in filenames:
+        for filename, text in read_files(filenames):
             file_id = os.path.splitext(os.path.basename(filename))[0]
 
+            soup = BeautifulSoup(text, 'xml')
+            del text
+
+            # Get article title (if it exists)
             try:
-                with open(filename, 'r', errors=settings.ENCODING_ERRORS) \
-                        as infile:
-
-                    soup = BeautifulSoup(infile.read(), 'xml')
-
-                    # Get article title (if it exists)
-                    try:
-                        article_title = \
-                            ''.join(soup.front.find('article-meta')\
-                                .find('title-group')\
-                                .find('article-title')\
-                                .strings
-                            )
-                    except AttributeError:
-                        article_title = file_id
-
-                    # Get sections
-                    sections = []
-                    try:
-                        for sec in soup.body.find_all('sec', recursive=False):
-                            sec_title = ''.join(sec.title.strings)
-                            paragraphs = sec.find_all('p')
-                            content = ''.join([''.join(paragraph.strings) for
-                                paragraph in paragraphs])
-                            sections.append(Section(name=sec_title,
-                                content=content))
-                    except AttributeError:
-                        pass
-
-                    yield Document(identifier=file_id,
-                        title=article_title,
-                        sections=sections,
-                        collections=settings.COLLECTION_NAME,
+                article_title = \
+                    ''.join(soup.front.find('article-meta')\
+                        .find('title-group')\
+                        .find('article-title')\
+                        .strings
                     )
-            except FileNotFoundError:
-                warnings.warn("Could not find file: %s" % filename)
+            except AttributeError:
+                article_title = file_id
+
+            # Only the paragraph texts are kept; the tree is freed.
+            abstract = get_abstract(soup)
+            paragraphs = get_paragraphs(soup)
+            soup.decompose()
+            del soup
+
+            yield StreamingDocument(identifier=file_id,
+                title=article_title,
+                get_sections=functools.partial(get_sections, abstract,
+                    paragraphs),
+                collection=settings.COLLECTION_NAME,
+            )
+
+def get_abstract(soup):
+    """
+    Gets the text of the abstract of a parsed NXML article, joining its
+    paragraphs with spaces, or None if it has none. Where an article has
+    several abstracts (such as a graphical abstract or a summary), the one
+    without an `abstract-type` is preferred.
+    """
+
+    try:
+        abstracts = soup.front.find('article-meta').find_all('abstract',
+                recursive=False)
+    except AttributeError:
+        return None
+    if not abstracts:
+        return None
+
+    abstract = next((abstract for abstract in abstracts if \
+            not abstract.get('abstract-type')), abstracts[0])
+    paragraphs = [''.join(paragraph.strings) for paragraph in \
+            abstract.find_all('p')]
+    if not paragraphs:
+        paragraphs = [''.join(abstract.strings)]
+    text = ' '.join(paragraph.strip() for paragraph in paragraphs)
+
+    return text if text.strip() else None
+
+def get_paragraphs(soup):
+    """
+    Gets the paragraph texts of each top-level section of the body of a
+    parsed NXML article, as a list of (section title, paragraphs) pairs.
+    Reading stops at the first malformed section.
+    """
+
+    sections = []
+    try:
+        for sec in soup.body.find_all('sec', recursive=False):
+            sec_title = ''.join(sec.title.strings)
+            sections.append((sec_title, [''.join(paragraph.strings) for \
+                    paragraph in sec.find_all('p')]))
+    except AttributeError:
+        pass
+
+    return sections
+
+def get_sections(abstract, paragraphs):
+    """
+    Yields the sections of an article from its abstract (see
+    `get_abstract`) and paragraphs (see `get_paragraphs`), joining the
+    paragraphs of each section as it is reached.
+    """
+
+    if abstract is not None:
+        yield Section(name='Abstract', content=abstract)
+
+    for sec_title, texts in paragraphs:
+        yield Section(name=sec_title, content=''.join(texts))
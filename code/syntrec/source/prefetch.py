@@ -0,0 +1,96 @@
+"""
+Provides read-ahead for document sources. Reading a file and parsing it
+otherwise happen one after the other, so the parser waits on every read; on
+network filesystems and cold page caches this wait can rival the parse
+itself. With read-ahead, the next files are read on a pool of background
+threads while the current one is parsed.
+
+Read-ahead is enabled by the `PREFETCH_FILES` setting, the number of files to
+read ahead (0, the default, reads each file inline), with `PREFETCH_WORKERS`
+threads doing the reading.
+"""
+
+import collections
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+from parmenides.conf import settings
+
+PREFETCH_WORKERS = 4
+
+def read_files(items, get_filename=None, skip_missing=True):
+    """
+    Reads the file of each item, yielding pairs of the item and the file's
+    text in the order of the items. `get_filename` gets the path of an item's
+    file (by default, the item is the path); items without a file are yielded
+    with no text. Missing files are warned about and, if `skip_missing` is
+    set, skipped; otherwise their items are yielded with no text.
+    """
+
+    get_filename = get_filename or (lambda item: item)
+    errors = settings.ENCODING_ERRORS
+    depth = getattr(settings, 'PREFETCH_FILES', 0) or 0
+
+    if depth <= 0:
+        for item in items:
+            filename = get_filename(item)
+            text = read_file(filename, errors)
+            if filename is None or text is not None or not skip_missing:
+                yield item, text
+        return
+
+    workers = getattr(settings, 'PREFETCH_WORKERS', PREFETCH_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from prefetch(items, get_filename, executor, depth, errors,
+                skip_missing)
+
+def prefetch(items, get_filename, executor, depth, errors=None,
+        skip_missing=True):
+    """
+    Reads the files of the items on an executor, keeping at most `depth`
+    reads in flight ahead of the consumer. Missing files are handled as in
+    `read_files`.
+    """
+
+    pending = collections.deque()
+    items = iter(items)
+
+    def submit():
+
+        for item in items:
+            filename = get_filename(item)
+            pending.append((item, filename, executor.submit(read_file,
+                filename, errors, False)))
+            return
+
+    for _ in range(depth):
+        submit()
+
+    while pending:
+        item, filename, future = pending.popleft()
+        submit()
+
+        text = future.result()
+        if filename is not None and text is None:
+            warnings.warn("Could not find file: %s" % filename)
+            if skip_missing:
+                continue
+
+        yield item, text
+
+def read_file(filename, errors=None, warn=True):
+    """
+    Reads the text of a file, or returns None if there is no file or it
+    cannot be found.
+    """
+
+    if filename is None:
+        return None
+
+    try:
+        with open(filename, 'r', errors=errors) as infile:
+            return infile.read()
+    except FileNotFoundError:
+        if warn:
+            warnings.warn("Could not find file: %s" % filename)
+        return None
@@ -0,0 +1,135 @@
+"""
+Provides streaming documents, whose sections are produced one at a time
+rather than all at once. A full-text PMC article can run to megabytes of
+text; building every section string before the document is yielded, and then
+joining the sections into one string for the parser, keeps several copies of
+that text in memory at once.
+
+A `StreamingDocument` is given a function producing its sections, which is
+called afresh each time the sections are iterated, so the document can be
+read more than once (by the triage, say, and then by the processor) while
+holding only one section string at a time. Section policies and triage wrap
+the function rather than building new section lists, and the processors of
+`syntrec.preprocess` consume the document section by section.
+
+Consumers that need the whole document at once (budgets, duplicate detection)
+can still use its `sections` attribute, which builds the full list of
+sections. Pickling a streaming document, as the workers of `syntrec.budget`
+do, builds the list as well.
+"""
+
+import copy
+import functools
+
+class StreamingDocument:
+    """
+    A document whose sections are produced by calling `get_sections`, which
+    must return a new iterable of Parmenides sections on every call. It has
+    the attributes of a Parmenides document used in syntrec.
+    """
+
+    def __init__(self, identifier, title, get_sections, collection=None):
+
+        self.identifier = identifier
+        self.title = title
+        self.get_sections = get_sections
+        self.collection = collection
+
+    def iter_sections(self):
+
+        return iter(self.get_sections())
+
+    @property
+    def sections(self):
+
+        return list(self.iter_sections())
+
+    @sections.setter
+    def sections(self, sections):
+
+        self.get_sections = functools.partial(iter, list(sections))
+
+    def __getstate__(self):
+
+        state = dict(self.__dict__)
+        state['get_sections'] = functools.partial(iter, self.sections)
+
+        return state
+
+def is_streaming(document):
+
+    return isinstance(document, StreamingDocument)
+
+def iter_sections(document):
+    """
+    Iterates over the sections of a document, streaming or not.
+    """
+
+    if is_streaming(document):
+        return document.iter_sections()
+
+    return iter(document.sections)
+
+def map_sections(document, function):
+    """
+    Gets a copy of a document whose sections are those of the document passed
+    through `function`, leaving out those for which it returns None. The
+    sections of a streaming document are mapped as they are produced.
+    """
+
+    mapped = copy.copy(document)
+    if is_streaming(document):
+        mapped.get_sections = functools.partial(apply_to_sections,
+                document.get_sections, function)
+    else:
+        mapped.sections = list(apply_to_sections(lambda: document.sections,
+            function))
+
+    return mapped
+
+def apply_to_sections(get_sections, function):
+
+    for section in get_sections():
+        section = function(section)
+        if section is not None:
+            yield section
+
+def split_sections(document):
+    """
+    Splits a document into documents of a single section each, so that a
+    processor handles one section at a time. The title is kept in the first
+    document only; a document without sections yields a single document
+    holding the title.
+    """
+
+    title = document.title
+    empty = True
+    for section in iter_sections(document):
+        yield get_section_document(document, title, [section])
+        title = ''
+        empty = False
+
+    if empty:
+        yield get_section_document(document, title, [])
+
+def get_section_document(document, title, sections):
+    """
+    Gets a plain Parmenides document with the identifier and collection of a
+    document, but the given title and sections.
+    """
+
+    if not is_streaming(document):
+        section_document = copy.copy(document)
+        section_document.title = title
+        section_document.sections = sections
+
+        return section_document
+
+    from parmenides.document import Document
+
+    return Document(
+        identifier=document.identifier,
+        title=title,
+        sections=sections,
+        collection=document.collection,
+    )
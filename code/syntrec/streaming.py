@@ -0,0 +1,83 @@
+"""
+Provides out-of-core ranking over gensim similarity indexes. Querying a
+`Similarity` index for a batch of topics stacks the similarities of every
+document in the collection into one array before the best are selected, and
+leaves every shard it touched mapped in memory; for a collection whose vectors
+do not fit in RAM, this is the limit.
+
+A `StreamingIndex` instead reads the shards of the index from disk one at a
+time. Each shard is scored against the topics `BATCH_SIZE` at a time, the
+best `depth` documents of each topic are merged into a running top list of
+fixed size, and the shard is released before the next is read. Peak memory
+thus depends on the size of a shard and of a batch, not on the size of the
+collection, and each shard is read once however many topics there are.
+"""
+
+import numpy as np
+from gensim import similarities
+
+from syntrec.indexing import read_doc_ids
+from syntrec.ranking import merge_top_k, top_k
+
+BATCH_SIZE = 64
+
+class StreamingIndex:
+    """
+    A read-only view of a saved gensim `Similarity` index which ranks
+    documents by streaming its shards. It provides the `get_top` method used
+    by `syntrec.evaluation.get_top`.
+    """
+
+    def __init__(self, index, batch_size=BATCH_SIZE):
+
+        self.index = index
+        self.batch_size = batch_size
+
+    @classmethod
+    def load(cls, prefix, batch_size=BATCH_SIZE):
+        """
+        Loads an index saved under a prefix by `syntrec.indexing`, along with
+        its document IDs. Only the list of shards is read; the vectors stay
+        on disk until queried.
+        """
+
+        return cls(similarities.Similarity.load(prefix), batch_size), \
+                read_doc_ids(prefix)
+
+    def __len__(self):
+
+        return len(self.index)
+
+    def get_top(self, queries, depth):
+        """
+        Gets the positions and scores of the best `depth` documents for
+        several queries as two matrices with one row per query.
+        """
+
+        queries = list(queries)
+        depth = min(depth, len(self))
+        positions = np.zeros((len(queries), 0), dtype=np.int64)
+        scores = np.zeros((len(queries), 0), dtype=np.float32)
+        if not queries:
+            return positions, scores
+
+        offset = 0
+        for shard in self.index.shards:
+            shard_index = shard.cls.load(shard.fullname(), mmap='r')
+            shard_index.num_best = None
+            shard_index.normalize = True
+
+            batches = []
+            for start in range(0, len(queries), self.batch_size):
+                stop = start + self.batch_size
+                sims = np.atleast_2d(shard_index[queries[start:stop]])
+                best, values = top_k(sims, min(depth, sims.shape[1]))
+                batches.append(merge_top_k([positions[start:stop],
+                    best + offset], [scores[start:stop], values], depth))
+
+            positions = np.vstack([batch[0] for batch in batches])
+            scores = np.vstack([batch[1] for batch in batches])
+            offset += len(shard)
+            del shard_index
+
+        return positions, scores
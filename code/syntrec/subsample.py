@@ -0,0 +1,186 @@
+"""
+Provides stratified subsamples of a collection for fast development runs. A
+subsample keeps every judged-relevant document of a chosen set of topics,
+together with a pool of the other documents sampled at a fixed rate from each
+of two strata: the documents judged non-relevant to the chosen topics, and the
+rest of the collection. Every choice is made by hashing document and topic IDs
+with a seed, so a subsample is the same from one run to the next, and growing
+the collection only adds documents to it.
+
+Measures computed on a subsample are only useful insofar as they order runs
+the way the full collection would. `get_tracking` estimates this from runs
+over the full collection: each is scored on the full qrels and, restricted to
+the subsample, on the subsample's qrels, and the two sets of scores are
+compared.
+"""
+
+import hashlib
+import json
+
+from syntrec.metrics import get_measures
+
+NON_RELEVANT = 'non-relevant'
+UNJUDGED = 'unjudged'
+
+def get_hash(value, seed=0):
+    """
+    Gets a stable pseudo-random number in [0, 1) for a value.
+    """
+
+    digest = hashlib.sha1(('%s:%s' % (seed, value)).encode('utf-8')).digest()
+
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+def select_topics(qrels, num_topics, seed=0):
+    """
+    Selects a number of the judged topics.
+    """
+
+    return sorted(sorted(qrels, key=lambda topic: get_hash(topic, seed))[
+        :num_topics])
+
+def get_subsample(samples, qrels, topics, rate, seed=0):
+    """
+    Gets a subsample of a collection for the given topics. Returns the
+    sampled document IDs and a description of each stratum: its size in the
+    collection and the number of documents sampled from it.
+    """
+
+    samples = set(samples)
+    relevant = set()
+    judged = set()
+    for topic in topics:
+        for doc_id, relevance in qrels.get(topic, {}).items():
+            if doc_id in samples:
+                judged.add(doc_id)
+                if relevance > 0:
+                    relevant.add(doc_id)
+
+    strata = {
+        NON_RELEVANT: judged - relevant,
+        UNJUDGED: samples - judged,
+    }
+
+    subsample = set(relevant)
+    info = {'relevant': {'size': len(relevant), 'sampled': len(relevant)}}
+    for name, stratum in strata.items():
+        sampled = {doc_id for doc_id in stratum if get_hash(doc_id, seed) < \
+                rate}
+        subsample |= sampled
+        info[name] = {'size': len(stratum), 'sampled': len(sampled)}
+
+    return sorted(subsample), info
+
+def restrict_qrels(qrels, topics, samples):
+    """
+    Restricts relevance judgments to the given topics and documents.
+    """
+
+    samples = set(samples)
+
+    return {topic: {doc_id: relevance for doc_id, relevance in \
+            qrels.get(topic, {}).items() if doc_id in samples} for topic in \
+            topics}
+
+def restrict_rankings(rankings, topics, samples):
+    """
+    Restricts rankings to the given topics and documents, keeping the order
+    of the documents that remain.
+    """
+
+    samples = set(samples)
+
+    return {topic: [doc_id for doc_id in rankings[topic] if doc_id in \
+            samples] for topic in topics if topic in rankings}
+
+def get_tracking(runs, qrels, topics, samples):
+    """
+    Estimates how well measures on a subsample track those on the full
+    collection. `runs` maps run names to rankings over the full collection
+    (see `syntrec.metrics.read_run`). Returns the measures of each run on the
+    full collection and on the subsample, and, for each measure, the mean
+    absolute difference between the two and Kendall's tau between the
+    orderings of the runs that they give.
+    """
+
+    subsample_qrels = restrict_qrels(qrels, topics, samples)
+
+    full = {}
+    subsample = {}
+    for name, rankings in runs.items():
+        full[name] = get_measures(rankings, qrels)
+        subsample[name] = get_measures(restrict_rankings(rankings, topics,
+            samples), subsample_qrels)
+
+    agreement = {}
+    names = list(runs)
+    for measure in next(iter(full.values()), {}):
+        full_values = [full[name][measure] for name in names]
+        subsample_values = [subsample[name][measure] for name in names]
+        agreement[measure] = {
+            'mean_difference': sum(abs(a - b) for a, b in zip(full_values,
+                subsample_values)) / len(names),
+            'kendall_tau': kendall_tau(full_values, subsample_values),
+        }
+
+    return {'full': full, 'subsample': subsample, 'agreement': agreement}
+
+def kendall_tau(first, second):
+    """
+    Gets Kendall's tau (tau-a) between two lists of scores for the same items.
+    Returns None for fewer than two items.
+    """
+
+    if len(first) < 2:
+        return None
+
+    concordant = 0
+    discordant = 0
+    for i in range(len(first)):
+        for j in range(i + 1, len(first)):
+            sign = (first[i] - first[j]) * (second[i] - second[j])
+            if sign > 0:
+                concordant += 1
+            elif sign < 0:
+                discordant += 1
+    pairs = len(first) * (len(first) - 1) / 2
+
+    return (concordant - discordant) / pairs
+
+def write_qrels(qrels, filename):
+
+    with open(filename, 'w') as outfile:
+        for topic in sorted(qrels):
+            for doc_id, relevance in sorted(qrels[topic].items()):
+                outfile.write("%s 0 %s %d\n" % (topic, doc_id, relevance))
+
+def write_info(info, filename):
+
+    with open(filename, 'w') as outfile:
+        json.dump(info, outfile, indent=2)
+
+def print_measures(measures):
+    """
+    Prints the measures of several runs, given as a dictionary mapping run
+    names to measures.
+    """
+
+    for name, values in measures.items():
+        print("%-12s %s" % (name, ' '.join('%s %.4f' % item for item in \
+                values.items())))
+
+def print_tracking(tracking):
+    """
+    Prints a tracking estimate returned by `get_tracking`.
+    """
+
+    print("Subsample measures against the full collection:")
+    for name in tracking['full']:
+        print("%-12s %s" % (name, ' '.join('%s %.4f (full %.4f)' % (
+            measure, value, tracking['full'][name][measure]) for \
+                    measure, value in tracking['subsample'][name].items())))
+    for measure, agreement in tracking['agreement'].items():
+        tau = agreement['kendall_tau']
+        print("%-12s mean difference %.4f, Kendall's tau %s" % (measure,
+            agreement['mean_difference'], 'n/a' if tau is None else \
+                    '%.3f' % tau))
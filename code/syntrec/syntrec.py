@@ -1,267 +1,860 @@
 """
-This script runs a text retrieval experiment on TREC data. The experiment loads
-data from a data source, analyzes it, and trains a topic model. The topic model
-is then evaluated against a set of queries, which are also analyzed and
-converted into the topic model's vector space. 
+This script runs the stages of a text retrieval experiment on TREC data. Each
+stage is a subcommand: documents are preprocessed into term files, a
+dictionary is built from a term file, a topic model is trained, the documents
+are indexed in the model's vector space, and the model is evaluated against a
+set of TREC topics.
+
+Only the standard library is imported at startup; each subcommand imports (and
+loads) only the libraries and models that it needs, so that stages such as
+building a dictionary never pay for loading spaCy or Parmenides.
+
+Run with `python -m syntrec <subcommand> ...` from the `code` directory.
 """
 
 import argparse
+import os
 
-from gensim import corpora, models, similarities
-from gensim.test.utils import get_tmpfile
-from parmenides.conf import settings
-from parmenides.document import Document, Section
-from parmenides.utils import cleanup, import_class, init
-
-parser = argparse.ArgumentParser(description='Run a TREC experiment.')
-parser.add_argument('filenames', metavar='FILE', nargs='+', 
-        help="a file containing preprocessed data to parse")
-parser.add_argument('num_topics', metavar='N', type=int,
-        help="the number of topics to generate")
-parser.add_argument('tmpfile', metavara='FILE', default='index.tmp',
-        help="the name of the temporary index file")
-parser.add_argument('topicfile', metavar='FILE',
-        help="the path to the file containing TREC topics")
-parser.add_argument('topic-type', choices=['cds', 'covid'],
-        help="the type of topics under consideration")
-parser.add_argument('lsi-file', metavar='FILE', 
-        help="the path to the output file for the LSI judgments.")
-parser.add_argument('lsi-run', metavar='NAME',
-        help="a name for the LSI run.")
-parser.add_argument('lda-file', metavar='FILE',
-        help="the path to the output file for the LDA judgments.")
-parser.add_argument('lsi-run', metavar='NAME',
-        help="a name for the LDA run")
-parser.add_argument('processor', choices=['parmenides', 'spacy'],
-        help="how to process TREC topics into documents")
-parser.add_argument('settings-file', metavar='FILE', 
-        help="the path to the Parmenides settings file," \
-            " for the Parmenides processor.")
-
-nlp = None
-parmenides_processor = None
-
-def main():
-
-    print("Building dictionary...")
-    dictionary = corpora.Dictionary(doc[1] for doc in
-            TrecReader(config.filenames))
-    print("Generating LSI model...")
-    corpus = TrecCorpus(config.filenames, dictionary)
-    lsi = models.LsiModel(corpus, id2word=dictionary,
-            num_topics=config.num_topics)
-    print("Building index...")
-    index_tempfile = get_tmpfile(config.tmpfile)
-    index = similarities.Similarity(index_tempfile, lsi[corpus],
-            num_features=lsi.num_topics)
-    topics = list(get_topics(config.topicfile, config.topic_type))
-    print("Evaluating LSI model...")
-    evaluate(corpus, topics, dictionary, index, lsi, config.lsi_file,
-            config.lsi_run, config.processor, config.settings_file)
-    print("Generating LDA model...")
-    lda = models.LdaModel(corpus, id2word=dictionary,
-            num_topics=config.num_topics)
-    print("Building index...")
-    index_tempfile = get_tmpfile(config.tmpfile)
-    index = similarities.Similarity(index_tempfile, lda[corpus],
-            num_features=lda.num_topics)
-    print("Evaluating LDA model...")
-    evaluate(corpus, topics, dictionary, index, lda, config.lda_file,
-            config.lda_run, config.processor, config.settings_file)
-
-    if parmenides_processor:
-        cleanup()
-
-class TrecCorpus:
-    """
-    An iterator over documents in a simple text corpus. The corpus consists of
-    space-separated files wherein each line represents a document. The first
-    word of each line assigns a unique identifier to a document; the remaining
-    words represent tokens in the corpus. Each returned document is a tuple
-    containing the document ID and the list of tokens.
-    """
+MODELS = ['lsi', 'lda']
+PROCESSORS = ['parmenides', 'spacy']
+QUANTIZED_TYPES = ['float16', 'int8']
+
+def main(argv=None):
 
-    def __init__(self, filenames):
+    parser = get_parser()
+    config = parser.parse_args(argv)
 
-        self.index = []
-        self.filenames = filenames
+    if config.command is None:
+        parser.print_help()
+        return 2
 
-    def __iter__(self):
+    return config.func(config)
 
-        self.index.clear()
-        for filename in self.filenames:
-            with open(filename, 'r') as infile:
-                for line in infile:
-                    words = line.split(' ')
-                    self.index.append(words[0])
-                    yield (words[0], words[1:])
+def get_parser():
+    """
+    Builds the argument parser for all subcommands.
+    """
 
-class TrecBOW:
+    parser = argparse.ArgumentParser(prog='syntrec',
+            description='Run the stages of a TREC experiment.')
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND')
+
+    preprocess_parser = subparsers.add_parser('preprocess',
+            help="convert source documents into a term file")
+    preprocess_parser.add_argument('source', choices=['cord', 'nxml'],
+            help="the document source to read from")
+    preprocess_parser.add_argument('samples', metavar='FILE', nargs='+',
+            help="files listing the samples to process (CORD-19 document ID" \
+                " files for 'cord', qrels files for 'nxml')")
+    preprocess_parser.add_argument('-o', '--output', metavar='FILE',
+            required=True, help="the path to the output term file")
+    preprocess_parser.add_argument('--id-list', action='store_true',
+            help="the sample files list document IDs, one per line, as" \
+                " written by 'subsample'")
+    preprocess_parser.add_argument('--processor', choices=PROCESSORS,
+            default='parmenides', help="how to convert documents into terms")
+    preprocess_parser.add_argument('--settings', metavar='FILE',
+            help="the path to the Parmenides settings file")
+    preprocess_parser.add_argument('--data-dir', metavar='DIR',
+            help="the directory containing the source documents")
+    preprocess_parser.add_argument('--metadata', metavar='FILE',
+            help="the CORD-19 metadata file (default: DIR/metadata.csv)")
+    preprocess_parser.add_argument('--shard', metavar='I/N',
+            help="process only shard I of N, chosen by a hash of the" \
+                " document IDs (see 'merge')")
+    preprocess_parser.add_argument('--prefetch', metavar='N', type=int,
+            help="read the next N files ahead on background threads")
+    preprocess_parser.add_argument('--dedup', action='store_true',
+            help="process only one copy of each group of near-duplicates")
+    preprocess_parser.add_argument('--triage', action='store_true',
+            help="skip documents with no usable text and cut those with only"\
+                " a usable abstract down to it")
+    preprocess_parser.add_argument('--include', metavar='PATTERN',
+            nargs='+', help="process only sections whose names match")
+    preprocess_parser.add_argument('--exclude', metavar='PATTERN',
+            nargs='+', help="skip sections whose names match")
+    preprocess_parser.add_argument('--abstract-only', action='store_true',
+            help="process only the title and abstract")
+    preprocess_parser.add_argument('--max-section-tokens', metavar='N',
+            type=int, help="process only the first N tokens of each section")
+    preprocess_parser.add_argument('--max-chars', metavar='N', type=int,
+            help="the largest number of characters in a document")
+    preprocess_parser.add_argument('--max-sections', metavar='N', type=int,
+            help="the largest number of sections in a document")
+    preprocess_parser.add_argument('--over-budget', choices=['truncate',
+            'skip'], default='truncate',
+            help="what to do with documents over the size limits")
+    preprocess_parser.add_argument('--max-seconds', metavar='S', type=float,
+            help="skip documents taking longer than S seconds to process")
+    preprocess_parser.add_argument('--recycle-after', metavar='N', type=int,
+            help="replace the worker process after N documents")
+    preprocess_parser.add_argument('--recycle-rss', metavar='MB', type=float,
+            help="replace the worker process once its memory has grown by" \
+                " MB megabytes")
+    preprocess_parser.set_defaults(func=run_preprocess)
+
+    merge_parser = subparsers.add_parser('merge',
+            help="merge the term files of preprocessing shards")
+    merge_parser.add_argument('shards', metavar='SHARD', nargs='+',
+            help="the term files of the shards, one for each of 1/N to N/N")
+    merge_parser.add_argument('-o', '--output', metavar='FILE',
+            required=True, help="the path to the merged term file")
+    merge_parser.add_argument('--source', choices=['cord', 'nxml'],
+            default='cord', help="the document source of the samples")
+    merge_parser.add_argument('--samples', metavar='FILE', nargs='+',
+            help="files listing the samples that were processed, to report" \
+                " any that are missing (as for 'preprocess')")
+    merge_parser.add_argument('--strict', action='store_true',
+            help="fail if any of the samples is missing")
+    merge_parser.set_defaults(func=run_merge)
+
+    subsample_parser = subparsers.add_parser('subsample',
+            help="draw a stratified subsample for development runs")
+    subsample_parser.add_argument('source', choices=['cord', 'nxml'],
+            help="the document source to read from")
+    subsample_parser.add_argument('samples', metavar='FILE', nargs='+',
+            help="files listing the samples to draw from, as for" \
+                " 'preprocess'")
+    subsample_parser.add_argument('--qrels', metavar='FILE', nargs='+',
+            required=True, help="the relevance judgments to stratify by")
+    subsample_parser.add_argument('-o', '--output', metavar='FILE',
+            required=True, help="the path to the output document ID list;" \
+                " its qrels are written to FILE.qrels")
+    subsample_parser.add_argument('--rate', type=float, default=0.02,
+            help="the fraction of the other documents to sample")
+    topics_group = subsample_parser.add_mutually_exclusive_group(
+            required=True)
+    topics_group.add_argument('--topics', metavar='TOPIC', nargs='+',
+            help="the topics to keep the relevant documents of")
+    topics_group.add_argument('--num-topics', metavar='N', type=int,
+            help="keep the relevant documents of N topics chosen at random")
+    subsample_parser.add_argument('--seed', type=int, default=0,
+            help="the seed for choosing topics and documents")
+    subsample_parser.set_defaults(func=run_subsample)
+
+    build_parser = subparsers.add_parser('build',
+            help="build a dictionary from a term file")
+    build_parser.add_argument('termfile', metavar='TERMS',
+            help="the term file to build the dictionary from")
+    build_parser.add_argument('-o', '--output', metavar='FILE',
+            required=True, help="the path to the output dictionary")
+    add_template_arguments(build_parser, frequencies=True)
+    build_parser.add_argument('--workers', metavar='N', type=int,
+            help="the number of worker processes (default: one per CPU)")
+    build_parser.set_defaults(func=run_build)
+
+    freeze_parser = subparsers.add_parser('freeze',
+            help="write a dictionary as a memory-mapped frozen dictionary")
+    freeze_parser.add_argument('dictionary', metavar='DICT',
+            help="the dictionary to freeze")
+    freeze_parser.add_argument('-o', '--output', metavar='FILE',
+            required=True, help="the path to the frozen dictionary")
+    freeze_parser.set_defaults(func=run_freeze)
+
+    templates_parser = subparsers.add_parser('templates',
+            help="compare the cost of template policies on a term file")
+    templates_parser.add_argument('termfile', metavar='TERMS',
+            help="the term file to expand")
+    templates_parser.add_argument('--depths', metavar='DEPTH', nargs='+',
+            type=parse_depth, default=[0, 1, 2, 3, None],
+            help="the maximum template depths to compare")
+    templates_parser.add_argument('--min-df', metavar='N', type=int,
+            help="keep only templates in at least N documents")
+    templates_parser.add_argument('--max-df', metavar='F', type=float,
+            help="keep only templates in at most the fraction F of documents")
+    templates_parser.add_argument('--limit', metavar='N', type=int,
+            help="expand only the first N documents")
+    templates_parser.set_defaults(func=run_templates)
+
+    train_parser = subparsers.add_parser('train',
+            help="train a topic model on a term file")
+    train_parser.add_argument('termfile', metavar='TERMS',
+            help="the term file to train on")
+    train_parser.add_argument('dictionary', metavar='DICT',
+            help="the dictionary built from the term file")
+    train_parser.add_argument('-o', '--output', metavar='FILE',
+            required=True, help="the path to the output model")
+    add_model_arguments(train_parser)
+    train_parser.add_argument('-n', '--num-topics', type=int, default=100,
+            help="the number of topics to generate")
+    add_template_arguments(train_parser)
+    train_parser.add_argument('--passes', metavar='N', type=int, default=1,
+            help="the number of passes over the term file (LDA only)")
+    train_parser.add_argument('--checkpoint-dir', metavar='DIR',
+            help="save checkpoints to DIR, resuming from the latest one")
+    train_parser.add_argument('--checkpoint-every', metavar='N', type=int,
+            default=50, help="save a checkpoint every N chunks of documents")
+    train_parser.add_argument('--continue-from', metavar='MODEL',
+            help="train an existing LDA model for further passes")
+    train_parser.add_argument('--vectors', action='store_true',
+            help="record the document vectors computed in training in" \
+                " FILE.vectors.npy, for 'index --vectors' (LDA only)")
+    train_parser.set_defaults(func=run_train)
+
+    index_parser = subparsers.add_parser('index',
+            help="index a term file in a topic model's vector space")
+    index_parser.add_argument('termfile', metavar='TERMS',
+            help="the term file to index")
+    index_parser.add_argument('dictionary', metavar='DICT',
+            help="the dictionary built from the term file, frozen or not")
+    index_parser.add_argument('model', metavar='MODEL',
+            help="the trained topic model")
+    index_parser.add_argument('-o', '--output', metavar='PREFIX',
+            required=True, help="the prefix for the index files")
+    add_model_arguments(index_parser)
+    add_template_arguments(index_parser)
+    index_parser.add_argument('--shards', metavar='N', type=int,
+            help="split the index into N shards for parallel querying")
+    index_parser.add_argument('--vectors', action='store_true',
+            help="build the index from the document vectors recorded in" \
+                " training if they match inference closely enough")
+    index_parser.add_argument('--min-overlap', metavar='F', type=float,
+            help="the least mean overlap of the rankings of a sample with" \
+                " recorded and inferred vectors (default: 0.8)")
+    index_parser.set_defaults(func=run_index)
+
+    evaluate_parser = subparsers.add_parser('evaluate',
+            help="rank documents for a set of TREC topics")
+    evaluate_parser.add_argument('index', metavar='INDEX',
+            help="the prefix of the index files")
+    evaluate_parser.add_argument('dictionary', metavar='DICT',
+            help="the dictionary used to build the index, frozen or not")
+    evaluate_parser.add_argument('model', metavar='MODEL',
+            help="the topic model used to build the index")
+    evaluate_parser.add_argument('topicfile', metavar='TOPICS',
+            help="the path to the file containing TREC topics")
+    evaluate_parser.add_argument('-o', '--output', metavar='FILE',
+            required=True, help="the path to the output run file")
+    add_model_arguments(evaluate_parser)
+    evaluate_parser.add_argument('--topic-type', choices=['cds', 'covid'],
+            default='covid', help="the format of the TREC topics")
+    evaluate_parser.add_argument('--section', metavar='NAME',
+            help="the topic field to query with (default depends on the" \
+                " topic type)")
+    evaluate_parser.add_argument('--processor', choices=PROCESSORS,
+            default='parmenides', help="how to convert topics into terms")
+    evaluate_parser.add_argument('--settings', metavar='FILE',
+            help="the path to the Parmenides settings file")
+    evaluate_parser.add_argument('--run-name', metavar='NAME',
+            default='SYNTREC', help="a name for the run")
+    evaluate_parser.add_argument('--all-fields', action='store_true',
+            help="also rank every topic field and their fusions, writing" \
+                " OUTPUT-FIELD.txt and OUTPUT-METHOD.txt beside the run")
+    add_index_arguments(evaluate_parser)
+    evaluate_parser.set_defaults(func=run_evaluate)
+
+    quantize_parser = subparsers.add_parser('quantize',
+            help="quantize an index and compare its rankings with the" \
+                " original")
+    quantize_parser.add_argument('index', metavar='INDEX',
+            help="the prefix of the index files")
+    quantize_parser.add_argument('dictionary', metavar='DICT',
+            help="the dictionary used to build the index, frozen or not")
+    quantize_parser.add_argument('model', metavar='MODEL',
+            help="the topic model used to build the index")
+    quantize_parser.add_argument('topicfile', metavar='TOPICS',
+            help="the path to the file containing TREC topics")
+    quantize_parser.add_argument('--qrels', metavar='FILE', nargs='+',
+            required=True, help="the relevance judgments for the topics")
+    quantize_parser.add_argument('--types', choices=QUANTIZED_TYPES,
+            nargs='+', default=QUANTIZED_TYPES,
+            help="the types to quantize the vectors to")
+    add_model_arguments(quantize_parser)
+    quantize_parser.add_argument('--topic-type', choices=['cds', 'covid'],
+            default='covid', help="the format of the TREC topics")
+    quantize_parser.add_argument('--section', metavar='NAME',
+            help="the topic field to query with (default depends on the" \
+                " topic type)")
+    quantize_parser.add_argument('--processor', choices=PROCESSORS,
+            default='parmenides', help="how to convert topics into terms")
+    quantize_parser.add_argument('--settings', metavar='FILE',
+            help="the path to the Parmenides settings file")
+    quantize_parser.set_defaults(func=run_quantize)
+
+    compare_parser = subparsers.add_parser('compare',
+            help="compare runs with paired significance tests")
+    compare_parser.add_argument('runs', metavar='RUN', nargs='+',
+            help="the run files to compare")
+    compare_parser.add_argument('--qrels', metavar='FILE', nargs='+',
+            required=True, help="the relevance judgments")
+    compare_parser.add_argument('--measure', default='map',
+            help="the measure to test (map, P_10 or ndcg_cut_10)")
+    compare_parser.add_argument('--baseline', metavar='RUN',
+            help="compare every run with this one rather than all pairs")
+    compare_parser.add_argument('--samples', metavar='N', type=int,
+            default=10000, help="the number of resamples for each test")
+    compare_parser.add_argument('--seed', type=int, default=0,
+            help="the seed for drawing resamples")
+    compare_parser.set_defaults(func=run_compare)
+
+    serve_parser = subparsers.add_parser('serve',
+            help="answer ad hoc topics over HTTP")
+    serve_parser.add_argument('index', metavar='INDEX',
+            help="the prefix of the index files")
+    serve_parser.add_argument('dictionary', metavar='DICT',
+            help="the dictionary used to build the index, frozen or not")
+    serve_parser.add_argument('model', metavar='MODEL',
+            help="the topic model used to build the index")
+    add_model_arguments(serve_parser)
+    serve_parser.add_argument('--processor', choices=PROCESSORS,
+            default='parmenides', help="how to convert topics into terms")
+    serve_parser.add_argument('--settings', metavar='FILE',
+            help="the path to the Parmenides settings file")
+    serve_parser.add_argument('--address', metavar='HOST:PORT',
+            type=parse_address, default=('localhost', 8000),
+            help="the address to listen on")
+    serve_parser.add_argument('--max-batch', metavar='N', type=int,
+            default=32, help="the largest number of topics in a batch")
+    serve_parser.add_argument('--max-wait', metavar='MS', type=float,
+            default=10, help="how long a topic may wait for its batch to fill")
+    add_index_arguments(serve_parser)
+    serve_parser.set_defaults(func=run_serve)
+
+    shard_parser = subparsers.add_parser('serve-shard',
+            help="serve one shard of a sharded index over a socket")
+    shard_parser.add_argument('index', metavar='INDEX',
+            help="the prefix of the sharded index files")
+    shard_parser.add_argument('number', metavar='N', type=int,
+            help="the number of the shard to serve")
+    shard_parser.add_argument('--address', metavar='HOST:PORT',
+            type=parse_address, default=('localhost', 6000),
+            help="the address to listen on")
+    shard_parser.add_argument('--key-file', metavar='FILE',
+            help="the file holding the key shared with coordinators" \
+                " (default: $SYNTREC_AUTHKEY)")
+    shard_parser.set_defaults(func=run_serve_shard)
+
+    return parser
+
+def add_model_arguments(parser):
+
+    parser.add_argument('-m', '--model-type', choices=MODELS, default='lsi',
+            help="the type of topic model")
+
+def add_index_arguments(parser):
+
+    parser.add_argument('--shards', action='store_true',
+            help="query a sharded index with one local worker per shard")
+    parser.add_argument('--connect', metavar='HOST:PORT',
+            type=parse_address, nargs='+',
+            help="query a sharded index through the given shard servers")
+    parser.add_argument('--key-file', metavar='FILE',
+            help="the file holding the key shared with the shard servers" \
+                " (default: $SYNTREC_AUTHKEY)")
+    parser.add_argument('--quantized', choices=QUANTIZED_TYPES,
+            help="query the index's vectors quantized to the given type")
+    parser.add_argument('--stream', action='store_true',
+            help="rank by reading the index's shards from disk one at a time")
+    parser.add_argument('--batch-size', type=int, default=64,
+            help="the number of topics scored together against each shard" \
+                " when streaming")
+
+def add_template_arguments(parser, frequencies=False):
+
+    parser.add_argument('--max-depth', type=parse_depth, default=3,
+            help="the maximum template depth ('none' for no limit)")
+    parser.add_argument('--shapes', choices=['left', 'right'], nargs='+',
+            help="generate only templates blanking the given subterms")
+    if frequencies:
+        parser.add_argument('--min-df', metavar='N', type=int,
+                help="keep only templates in at least N documents")
+        parser.add_argument('--max-df', metavar='F', type=float,
+                help="keep only templates in at most the fraction F of" \
+                    " documents")
+
+def get_template_policy(config):
     """
-    An iterator over bags of words representing documents in a corpus. This
-    uses the gensim BOW model and thus requires a gensim dictionary to be
-    initialized.
+    Gets the template policy given by the template arguments.
     """
 
-    def __init__(self, dictionary, reader):
+    from syntrec.corpus import TemplatePolicy
 
-        self.dictionary = dictionary
-        self.reader = reader
+    return TemplatePolicy(config.max_depth, config.shapes,
+            getattr(config, 'min_df', None), getattr(config, 'max_df', None))
 
-    def __iter__(self):
+def parse_address(value):
 
-        for doc in reader:
-            yield self.dictionary.doc2bow(doc[1])
+    host, port = value.rsplit(':', 1)
 
-def get_topics(topfile, topic_type, topic_selector):
-    """
-    Gets TREC topics from an XML file. Since the nature of topics varies from
-    one TREC corpus to another, the topic type must be provided, naming a
-    supported topic format. Topics are returned as Parmenides documents.
-    """
+    return (host, int(port))
+
+def parse_depth(value):
 
-    if topic_type == 'cds':
-        get_cds_topics(topfile, topic_selector)
-    elif topic_type == 'covid':
-        get_covid_topics(topfile, topic_selector)
+    if value.lower() == 'none':
+        return None
+
+    return int(value)
+
+def run_preprocess(config):
+
+    from parmenides.conf import settings
+    from parmenides.utils import cleanup, get_documents
+    from syntrec import data
+    from syntrec.preprocess import get_tokenizer, write_terms
+    from syntrec.sections import SectionPolicy
+
+    init_parmenides(config.settings)
+    if config.prefetch is not None:
+        settings.PREFETCH_FILES = config.prefetch
+
+    shard = None
+    if config.shard is not None:
+        from syntrec.partition import parse_shard, select_shard
+
+        shard = parse_shard(config.shard)
+
+    if config.source == 'cord':
+        settings.DOCUMENT_SOURCE = 'syntrec.source.cord.CordSource'
+        data_dir = config.data_dir or 'data/2020-07-16'
+        metadata = data.get_metadata(config.metadata or \
+                '%s/metadata.csv' % data_dir)
+        docids = data.get_cord_samples(config.samples)
+        if shard is not None:
+            docids = select_shard(docids, *shard)
+        sample_files = list(data.get_sample_files(metadata, docids,
+            data_dir))
+    else:
+        settings.DOCUMENT_SOURCE = 'syntrec.source.nxml.NXMLSource'
+        if config.id_list:
+            samples = data.get_cord_samples(config.samples)
+        else:
+            samples = data.get_samples(config.samples)
+        if shard is not None:
+            samples = select_shard(samples, *shard)
+        sample_files = list(data.get_nxml_files(samples,
+                config.data_dir or 'data/pmc2016'))
+
+    duplicates = None
+    if config.dedup:
+        from syntrec.dedup import find_duplicates
+
+        print("Finding duplicates.")
+        duplicates = find_duplicates(get_documents(sample_files))
+
+    budgeted = any(limit is not None for limit in [config.max_chars,
+        config.max_sections, config.max_seconds, config.recycle_after,
+        config.recycle_rss])
+    if budgeted:
+        from syntrec.budget import get_budgeted_processor
+
+        get_tokens = get_budgeted_processor(config.processor,
+                config.max_chars, config.max_sections, config.over_budget,
+                config.max_seconds, config.recycle_after, config.recycle_rss)
+    else:
+        get_tokens = get_tokenizer(config.processor)
+
+    policy = SectionPolicy(config.include, config.exclude,
+            config.abstract_only, config.max_section_tokens)
+    documents = get_documents(sample_files)
+    metadata = {'processor': config.processor, 'sections': policy.to_dict()}
+    if config.triage:
+        from syntrec.triage import Triage
+
+        triage = Triage()
+        documents = triage.apply_all(documents)
+        metadata['triage'] = triage.to_dict()
+    if shard is not None:
+        metadata['shard'] = '%d/%d' % shard
+    write_terms(policy.apply_all(documents), config.output, get_tokens,
+            duplicates, metadata)
+
+    if config.triage:
+        triage.write_log('%s.triage.log' % config.output)
+        print("Triage: %s" % triage.stats)
+
+    if budgeted:
+        get_tokens.close()
+        get_tokens.write_log('%s.budget.log' % config.output)
+        print("Budget: %s" % get_tokens.stats)
+
+    if duplicates is not None:
+        report = duplicates.get_report()
+        print("Skipped %d duplicates, saving an estimated %.0f seconds." % (
+            report['duplicates'], report['estimated_seconds_saved']))
+        if duplicates.dropped:
+            duplicates.write_log('%s.dedup.log' % config.output)
+            print("Dropped %d duplicates with their canonical copies." % \
+                    len(duplicates.dropped))
+
+    cleanup()
+
+def run_merge(config):
+
+    from syntrec import data
+    from syntrec.partition import merge_terms
+
+    samples = None
+    if config.samples:
+        if config.source == 'cord':
+            samples = data.get_cord_samples(config.samples)
+        else:
+            samples = data.get_samples(config.samples)
+
+    print("Merging %d shards." % len(config.shards))
+    missing = merge_terms(config.shards, config.output, samples)
+
+    if missing:
+        with open('%s.missing' % config.output, 'w') as outfile:
+            for doc_id in missing:
+                outfile.write("%s\n" % doc_id)
+        print("%d of %d samples are missing (listed in %s.missing)." % (
+            len(missing), len(samples), config.output))
+        if config.strict:
+            return 1
+
+def run_subsample(config):
+
+    from syntrec import data
+    from syntrec.metrics import read_qrels
+    from syntrec.subsample import get_subsample, restrict_qrels, \
+            select_topics, write_info, write_qrels
+
+    if config.source == 'cord':
+        samples = data.get_cord_samples(config.samples)
+    else:
+        samples = data.get_samples(config.samples)
+
+    qrels = read_qrels(config.qrels)
+    topics = config.topics or select_topics(qrels, config.num_topics,
+            config.seed)
+    subsample, info = get_subsample(samples, qrels, topics, config.rate,
+            config.seed)
+
+    with open(config.output, 'w') as outfile:
+        for sample in subsample:
+            outfile.write("%s\n" % sample)
+    write_qrels(restrict_qrels(qrels, topics, subsample),
+            '%s.qrels' % config.output)
+    write_info({'topics': topics, 'strata': info}, '%s.json' % config.output)
+
+    print("Subsampled %d of %d documents for %d topics." % (len(subsample),
+        len(samples), len(topics)))
+
+def run_build(config):
+
+    from syntrec.dictionary import build_dictionary
+
+    print("Building dictionary.")
+    dictionary = build_dictionary(config.termfile,
+            get_template_policy(config), config.workers)
+    dictionary.save(config.output)
+
+def run_freeze(config):
+
+    from gensim import corpora
+    from syntrec.frozendict import freeze
+
+    freeze(corpora.Dictionary.load(config.dictionary), config.output)
+
+def run_templates(config):
+
+    from syntrec.corpus import SHAPES, TemplatePolicy
+    from syntrec.dictionary import compare_policies
+
+    policies = [TemplatePolicy(depth, shapes, config.min_df, config.max_df) \
+            for depth in config.depths for shapes in [SHAPES] + \
+            [[shape] for shape in SHAPES]]
+    results = compare_policies(config.termfile, policies, config.limit)
+
+    print("%-6s %-11s %8s %11s %11s %11s %11s" % ('depth', 'shapes',
+        'seconds', 'tokens/doc', 'kept', 'templates', 'kept'))
+    for result in results:
+        policy = result['policy']
+        print("%-6s %-11s %8.2f %11.1f %11.1f %11d %11d" % (
+            policy['max_depth'], '+'.join(policy['shapes']),
+            result['seconds'], result['tokens_per_doc'],
+            result['kept_tokens_per_doc'], result['templates'],
+            result['kept_templates']))
+
+def run_train(config):
+
+    from gensim import corpora
+    from syntrec.modeling import load_model
+    from syntrec.training import train_models
+    from syntrec.vectors import get_filename
+
+    dictionary = corpora.Dictionary.load(config.dictionary)
+
+    name = os.path.basename(config.output)
+    initial = {}
+    if config.continue_from:
+        initial[name] = load_model(config.model_type, config.continue_from)
+    vectors = {}
+    if config.vectors:
+        vectors[name] = get_filename(config.output)
+
+    models = train_models(dictionary, config.termfile,
+            [(name, config.model_type, config.num_topics)],
+            config.checkpoint_dir, config.passes, config.checkpoint_every,
+            get_template_policy(config), initial, vectors)
+    models[name].save(config.output)
+
+def run_index(config):
+
+    from syntrec.frozendict import load_dictionary
+    from syntrec.corpus import TrecCorpus
+    from syntrec.indexing import build_index
+    from syntrec.modeling import load_model
+
+    dictionary = load_dictionary(config.dictionary)
+    model = load_model(config.model_type, config.model)
+    corpus = TrecCorpus(dictionary, config.termfile,
+            get_template_policy(config))
+
+    if config.vectors:
+        from syntrec import vectors
+
+        if config.shards:
+            print("Sharded indexes are built by inference only.")
+            return 1
+
+        recorded = vectors.load_vectors(vectors.get_filename(config.model))
+        check = vectors.check_vectors(model, corpus, recorded)
+        print("Recorded vectors: cosine %.3f, score error %.3f," \
+                " overlap %.3f." % (check['cosine'], check['error'],
+                    check['overlap']))
+        if check['overlap'] < (config.min_overlap or vectors.MIN_OVERLAP):
+            print("The recorded vectors do not match inference.")
+            return 1
+
+        print("Building index from recorded vectors.")
+        vectors.build_index(config.output, model, recorded, corpus.index)
+        return
+
+    print("Building index.")
+    if config.shards:
+        from syntrec.sharding import build_shards
+        build_shards(config.output, model, corpus, config.shards)
     else:
-        raise TypeError("Unsupported topic type: %s" % topic_type)
+        build_index(config.output, model, corpus)
 
-def get_cds_topics(topfile, topic_selector):
-    """
-    Gets the topics from the TREC CDS track.
-    """
+def run_evaluate(config):
 
-    with open(topfile, 'r') as infile:
-        soup = BeautifulSoup(infile.read(), 'xml')
-
-        for topic in soup.find_all('topic'):
-            number = topic['number']
-            topic_type = topic['type']
-
-            note = topic.note.string
-            description = topic.description.string
-            summary = topic.summary.string
-
-            if topic_selector == 'note':
-                section_content = note
-            elif topic_selector == 'description':
-                section_content = description
-            elif topic_selector == 'summary':
-                section_content = summary
-            else:
-                raise TypeError("Unsupported topic selector: %s" \
-                        % topic_selector)
-
-            yield Document(
-                identifier=number,
-                title=topic_type,
-                sections=[Section(name=section, content=section_content)]<
-                collection='topics',
-            )
-
-def get_covid_topics(topfile, topic_selector):
-    """
-    Gets the topics from the TREC-COVID dataset.
-    """
+    from syntrec.frozendict import load_dictionary
+    from syntrec.data import DEFAULT_FIELDS, get_topic_fields, get_topics
+    from syntrec.evaluation import evaluate, evaluate_fields
+    from syntrec.modeling import load_model
+    from syntrec.preprocess import get_tokenizer
+
+    if not check_connect_key(config):
+        return 1
 
-    with open(topfile, 'r') as infile:
-        soup = BeautifulSoup(infile.read(), 'xml')
-
-        for topic in soup.find_all('topic'):
-            number = topic['number']
-
-            query = topic.query.string
-            question = topic.question.string
-            narrative = topic.narrative.string
-
-            if topic_selector == 'query':
-                section_content = query
-            elif topic_selector == 'question':
-                section_content = question
-            elif topic_selector == 'narrative':
-                section_content = narrative
-            else:
-                raise TypeError("Unsupported topic selector: %s" \
-                        % topic_selector)
-
-            yield Document(
-                identifier=number,
-                title=topic_type,
-                sections=[Section(name=section, content=section_content)],
-                collection='topics',
-            )
-
-def evaluate(corpus, topics, dictionary, index, filename, run_name, processor,
-        settings_file):
+    dictionary = load_dictionary(config.dictionary)
+    model = load_model(config.model_type, config.model)
+    index, doc_ids = open_index(config, model.num_topics)
+
+    if config.processor == 'parmenides':
+        init_parmenides(config.settings)
+    get_tokens = get_tokenizer(config.processor)
+
+    print("Evaluating model.")
+    if config.all_fields:
+        topics = get_topic_fields(config.topicfile, config.topic_type)
+        evaluate_fields(doc_ids, topics, get_tokens, dictionary, index, model,
+                os.path.splitext(config.output)[0], config.run_name,
+                config.section or DEFAULT_FIELDS[config.topic_type])
+    else:
+        topics = list(get_topics(config.topicfile, config.topic_type,
+            config.section))
+        evaluate(doc_ids, topics, get_tokens, dictionary, index, model,
+                config.output, config.run_name)
+
+    if config.shards or config.connect:
+        index.close()
+    if config.processor == 'parmenides':
+        cleanup_parmenides()
+
+def run_quantize(config):
+
+    from syntrec.frozendict import load_dictionary
+    from syntrec.data import get_topics
+    from syntrec.evaluation import RUN_DEPTH, get_top
+    from syntrec.indexing import load_index
+    from syntrec.metrics import get_measures, read_qrels
+    from syntrec.modeling import load_model
+    from syntrec.preprocess import get_tokenizer
+    from syntrec.quantize import QuantizedIndex, get_full_size, get_overlap
+
+    dictionary = load_dictionary(config.dictionary)
+    model = load_model(config.model_type, config.model)
+    index, doc_ids = load_index(config.index)
+    qrels = read_qrels(config.qrels)
+
+    if config.processor == 'parmenides':
+        init_parmenides(config.settings)
+    get_tokens = get_tokenizer(config.processor)
+
+    topics = list(get_topics(config.topicfile, config.topic_type,
+        config.section))
+    topic_ids = [topic.identifier for topic in topics]
+    queries = [model[dictionary.doc2bow(get_tokens(topic))] for topic in \
+            topics]
+
+    def get_rankings(positions):
+
+        return {topic_id: [doc_ids[position] for position in row] for \
+                topic_id, row in zip(topic_ids, positions)}
+
+    print("Quantized measures are given as changes from float32.")
+    full_positions, _ = get_top(index, queries, RUN_DEPTH)
+    full = get_measures(get_rankings(full_positions), qrels)
+    print("%-8s %10s %8s %s" % ('type', 'bytes', 'overlap',
+        ' '.join('%12s' % name for name in full)))
+    print("%-8s %10d %8s %s" % ('float32', get_full_size(index), '-',
+        ' '.join('%12.4f' % value for value in full.values())))
+
+    for dtype in config.types:
+        quantized = QuantizedIndex.from_index(index, dtype)
+        quantized.save(config.index)
+
+        positions, _ = quantized.get_top(queries, RUN_DEPTH)
+        measures = get_measures(get_rankings(positions), qrels)
+        print("%-8s %10d %8.3f %s" % (dtype, quantized.nbytes,
+            get_overlap(full_positions, positions),
+            ' '.join('%+12.4f' % (measures[name] - full[name]) for name in \
+                    full)))
+
+    if config.processor == 'parmenides':
+        cleanup_parmenides()
+
+def run_compare(config):
+
+    from syntrec.compare import RunSet, compare, print_comparisons, \
+            print_means
+    from syntrec.metrics import read_qrels
+
+    runs = RunSet.load(config.runs, read_qrels(config.qrels))
+    scores = runs.get_scores()
+    if config.measure not in scores:
+        print("Unsupported measure: %s" % config.measure)
+        return 2
+
+    pairs = None
+    if config.baseline is not None:
+        name = os.path.splitext(os.path.basename(config.baseline))[0]
+        if name not in runs.names:
+            print("The baseline is not one of the runs: %s" % \
+                    config.baseline)
+            return 2
+        baseline = runs.names.index(name)
+        pairs = [(baseline, run) for run in range(len(runs.names)) if \
+                run != baseline]
+
+    print("%d runs over %d topics." % (len(runs.names), len(runs.topics)))
+    print_means(runs.names, scores)
+    print()
+    print_comparisons(runs.names, compare(scores[config.measure], pairs,
+        config.samples, config.seed))
+
+def run_serve(config):
+
+    import asyncio
+
+    from syntrec.frozendict import load_dictionary
+    from syntrec.modeling import load_model
+    from syntrec.preprocess import get_tokenizer
+    from syntrec.service import QueryService
+
+    if not check_connect_key(config):
+        return 1
+
+    dictionary = load_dictionary(config.dictionary)
+    model = load_model(config.model_type, config.model)
+    index, doc_ids = open_index(config, model.num_topics)
+
+    if config.processor == 'parmenides':
+        init_parmenides(config.settings)
+    get_tokens = get_tokenizer(config.processor)
+
+    service = QueryService(dictionary, model, index, doc_ids, get_tokens,
+            config.max_batch, config.max_wait / 1000)
+    try:
+        asyncio.run(service.serve(*config.address))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if config.shards or config.connect:
+            index.close()
+        if config.processor == 'parmenides':
+            cleanup_parmenides()
+
+def run_serve_shard(config):
+
+    from syntrec.sharding import check_authkey, get_authkey, serve_shard
+
+    try:
+        authkey = check_authkey(config.address, get_authkey(config.key_file))
+    except ValueError as error:
+        print(error)
+        return 1
+
+    serve_shard(config.index, config.number, config.address, authkey)
+
+def check_connect_key(config):
     """
-    Evaluates a topic model, producing a file that contains the collected
-    relevance judgment predictions for each TREC topic.
+    Checks that a key is given for the shard servers the configuration
+    connects to, if any, printing an error if not.
     """
 
-    with open(filename, 'w') as outfile:
-        for topic in topics:
-            topic_tokens = get_topic_tokens(topic, processor, settings_file)
-            topic_doc = dictionary.doc2bow(topic_tokens)
-            sims = index[model[topic_doc]]
-            sorted_sims = sorted(enumerate(sims), key=lambda item: -item[1])
-            rank = 1
-            for doc_position, doc_score in sorted_sims[:1000]:
-                outfile.write("%s\tQ0\t%s\t%d\t%f\t%s\n" % (
-                    topic.identifier,
-                    corpus.index[doc_position],
-                    rank,
-                    doc_score,
-                    run_name,
-                ))
-                rank += 1
-
-def get_topic_tokens(topic, processor, settings_file):
+    if not config.connect:
+        return True
+
+    from syntrec.sharding import check_authkey, get_authkey
+
+    try:
+        check_authkey(config.connect[0], get_authkey(config.key_file))
+    except ValueError as error:
+        print(error)
+        return False
+
+    return True
+
+def open_index(config, num_features):
     """
-    Gets a list of tokens from a topic by processing it with the given
-    processor. Currently, two processors are supported: one for using
-    Parmenides and one for a simpler tokenizer/preprocessor using spaCy.
+    Opens the index named in the configuration, starting or connecting to
+    shard workers for a sharded index, loading the quantized vectors of a
+    quantized one or streaming the shards of an index from disk. Returns
+    the index and its document IDs.
     """
 
-    if processor == 'parmenides':
-        get_parmenides_tokens(topic, settings_file)
-    elif processor == 'spacy':
-        get_spacy_tokens(topic)
-    else:
-        raise TypeError("Unsupported topic processor: %s" % processor)
+    from syntrec.indexing import load_index, read_doc_ids
 
-def get_parmenides_tokens(topic, settings_file):
+    if config.quantized:
+        from syntrec.quantize import QuantizedIndex
 
-    if parmenides_processor is None:
-        global parmenides_processor
-        init(settings_file)
-        parmenides_processor = import_class(settings.PROCESSOR)()
+        return QuantizedIndex.load(config.index, config.quantized), \
+                read_doc_ids(config.index)
+
+    if config.shards or config.connect:
+        from syntrec.sharding import ShardedIndex, get_authkey
 
-    return [str(term) for tree in parmenides_processor.process(topic) \
-            for term in tree.terms]
+        doc_ids = read_doc_ids(config.index)
+        if config.connect:
+            index = ShardedIndex.connect(config.connect, num_features,
+                    get_authkey(config.key_file))
+        else:
+            index = ShardedIndex.start(config.index)
 
-def get_spacy_tokens(topic):
+        return index, doc_ids
 
-    if nlp is None:
-        global nlp
-        nlp = spacy.load('en')
+    if config.stream:
+        from syntrec.streaming import StreamingIndex
 
-    docstring = document.title
-    for section in document.sections:
-        docstring += " %s %s" % (section.name, section.content)
-    doc = nlp(docstring[:900000])
-    words = []
-    for word in doc:
-        if word.is_stop or word.like_url or not word.text.isalnum() \
-                or word.text.strip() == '' or \
-                word.pos in ['PRON', 'PRP', 'PRP$'] or \
-                word.tag in ['PRON', 'PRP', 'PRP$']:
-            continue
+        return StreamingIndex.load(config.index, config.batch_size)
 
-        words.append(word.lemma_.strip().lower())
+    return load_index(config.index)
+
+def init_parmenides(settings_file):
+
+    from parmenides.utils import init
+
+    if settings_file:
+        init(settings_file)
+    else:
+        init()
 
-    return words
+def cleanup_parmenides():
 
-if __name__ == "__main__":
+    from parmenides.utils import cleanup
 
-    main()
+    cleanup()
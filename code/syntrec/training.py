@@ -0,0 +1,273 @@
+"""
+Provides checkpointed, resumable training of topic models. Training runs over
+a term file in passes (see `syntrec.fanout`), and every `CHECKPOINT_EVERY`
+chunks the models are saved to a checkpoint directory together with the pass
+and corpus position reached. A killed job started again with the same
+directory resumes from the latest checkpoint, seeking straight to its position
+in the term file, and a finished job given more passes carries on where it
+stopped. An existing model can also be trained for further passes. A resumed
+job picks up the pass number with the models, so an LDA model ends up the
+same as one trained by gensim with as many passes.
+
+Each checkpoint logs the wall time so far and, for each model, how much it
+changed since the previous checkpoint: the mean absolute change in the topics
+and the perplexity estimate for LDA, and the relative change in the singular
+values for LSI. A resumed job compares against the models it resumed from,
+which are those of the previous checkpoint, and restores the last estimate.
+
+A checkpoint directory holds `checkpoint.json` and a directory of saved models.
+The models are saved to a new directory before the JSON file is replaced, so a
+job killed while checkpointing resumes from the previous checkpoint.
+
+The document vectors of LDA models may be recorded as they are trained (see
+`syntrec.vectors`); their arrays are flushed at every checkpoint, and a
+resumed job reopens them.
+"""
+
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from syntrec.corpus import TrecCorpus
+from syntrec.fanout import LdaTrainer, fan_out, get_trainer
+from syntrec.modeling import load_model
+from syntrec.vectors import open_vectors
+
+CHECKPOINT = 'checkpoint.json'
+CHECKPOINT_EVERY = 50
+
+class Training:
+    """
+    The state of a training job: the models being trained, given as a list of
+    (name, model type, number of topics) triples, their trainers, and the
+    pass and corpus position reached.
+    """
+
+    def __init__(self, directory, models, trainers, num_docs, pass_=0,
+            position=0, history=None):
+
+        self.directory = directory
+        self.models = models
+        self.trainers = trainers
+        self.num_docs = num_docs
+        self.pass_ = pass_
+        self.position = position
+        self.history = list(history or [])
+
+        self.every = CHECKPOINT_EVERY
+        self.num_chunks = 0
+        self.started = time.time()
+        self.elapsed = self.history[-1]['seconds'] if self.history else 0.0
+        self.previous = {}
+
+    @classmethod
+    def start(cls, directory, dictionary, num_docs, models, initial=None,
+            vectors=None):
+        """
+        Starts a training job, resuming from the latest checkpoint in the
+        directory if there is one. Otherwise, models named in `initial` are
+        trained further and the others are trained from scratch. The vectors
+        of models named in `vectors` are recorded in the files it maps them
+        to.
+        """
+
+        initial = initial or {}
+        vectors = vectors or {}
+        arrays = {name: open_vectors(vectors[name], num_docs, num_topics) \
+                for name, _, num_topics in models if name in vectors}
+        state = read_checkpoint(directory) if directory else None
+        if state is not None:
+            models_dir = os.path.join(directory, state['models_dir'])
+            initial = {name: load_model(model_type, os.path.join(models_dir,
+                name)) for name, model_type, _ in models}
+
+        trainers = [get_trainer(model_type, dictionary, num_topics, num_docs,
+            initial.get(name), arrays.get(name)) for name, model_type,
+            num_topics in models]
+        if state is None:
+            return cls(directory, models, trainers, num_docs)
+
+        print("Resuming from pass %d, document %d." % (state['pass'] + 1,
+            state['position']))
+        for trainer, counters in zip(trainers, state['trainers']):
+            if isinstance(trainer, LdaTrainer):
+                trainer.num_chunks = counters['num_chunks']
+                trainer.num_seen = counters['num_seen']
+                trainer.bound = counters.get('bound')
+                trainer.pass_ = state['pass']
+
+        training = cls(directory, models, trainers, num_docs, state['pass'],
+                state['position'], state['history'])
+        for (name, _, _), trainer in zip(models, trainers):
+            current = get_current(trainer)
+            if current is not None:
+                training.previous[name] = np.array(current, copy=True)
+
+        return training
+
+    def run(self, dictionary, filename, passes=1, every=CHECKPOINT_EVERY,
+            templates=None):
+        """
+        Trains the models until `passes` passes over the term file have been
+        made in all, checkpointing every `every` chunks and after each pass.
+        Returns a dictionary mapping names to models.
+        """
+
+        self.every = every
+        while self.pass_ < passes:
+            corpus = TrecCorpus(dictionary, filename, templates,
+                    start=self.position)
+            fan_out(corpus, self.trainers, callback=self.on_chunk)
+
+            self.pass_ += 1
+            self.position = 0
+            self.checkpoint()
+
+        return {name: trainer.model for (name, _, _), trainer in \
+                zip(self.models, self.trainers)}
+
+    def on_chunk(self, size):
+
+        self.position += size
+        self.num_chunks += 1
+
+        # Checkpoints wait until no trainer holds a partial chunk, and the
+        # end of a pass is checkpointed once the pass is finished.
+        if self.num_chunks >= self.every and self.position < self.num_docs \
+                and not any(trainer.buffer for trainer in self.trainers):
+            self.checkpoint()
+
+    def checkpoint(self):
+
+        self.num_chunks = 0
+        entry = {
+            'pass': self.pass_,
+            'position': self.position,
+            'seconds': self.elapsed + time.time() - self.started,
+            'models': {name: self.get_stats(name, trainer) for \
+                    (name, _, _), trainer in zip(self.models, self.trainers)},
+        }
+        self.history.append(entry)
+
+        if self.position:
+            reached = "pass %d, document %d" % (self.pass_ + 1, self.position)
+        else:
+            reached = "end of pass %d" % self.pass_
+        print("Checkpoint after %.0f seconds: %s." % (entry['seconds'],
+            reached))
+        for name, stats in entry['models'].items():
+            print("    %s: %s" % (name, ', '.join('%s %.6g' % item for \
+                    item in stats.items())))
+
+        for trainer in self.trainers:
+            if getattr(trainer, 'vectors', None) is not None:
+                trainer.vectors.flush()
+
+        if self.directory:
+            self.save()
+
+    def save(self):
+
+        os.makedirs(self.directory, exist_ok=True)
+        previous = read_checkpoint(self.directory)
+
+        models_dir = 'models-%d' % len(self.history)
+        os.makedirs(os.path.join(self.directory, models_dir), exist_ok=True)
+        for (name, _, _), trainer in zip(self.models, self.trainers):
+            trainer.model.save(os.path.join(self.directory, models_dir, name))
+
+        state = {
+            'pass': self.pass_,
+            'position': self.position,
+            'models_dir': models_dir,
+            'trainers': [{'num_chunks': getattr(trainer, 'num_chunks', 0),
+                'num_seen': getattr(trainer, 'num_seen', 0),
+                'bound': getattr(trainer, 'bound', None)} for trainer in \
+                        self.trainers],
+            'history': self.history,
+        }
+        filename = os.path.join(self.directory, CHECKPOINT)
+        with open(filename + '.tmp', 'w') as outfile:
+            json.dump(state, outfile, indent=2)
+        os.replace(filename + '.tmp', filename)
+
+        if previous is not None and previous['models_dir'] != models_dir:
+            shutil.rmtree(os.path.join(self.directory,
+                previous['models_dir']), ignore_errors=True)
+
+    def get_stats(self, name, trainer):
+        """
+        Gets the convergence statistics of a model since the previous
+        checkpoint.
+        """
+
+        stats = {}
+        if isinstance(trainer, LdaTrainer) and trainer.bound is not None:
+            stats['perplexity'] = 2 ** -trainer.bound
+        current = get_current(trainer)
+        if current is None:
+            return stats
+
+        previous = self.previous.get(name)
+        if previous is not None and previous.shape == current.shape:
+            if isinstance(trainer, LdaTrainer):
+                stats['topic_change'] = float(np.mean(np.abs(current - \
+                        previous)))
+            else:
+                stats['singular_value_change'] = float(np.linalg.norm(
+                    current - previous) / (np.linalg.norm(previous) or 1))
+        self.previous[name] = np.array(current, copy=True)
+
+        return stats
+
+def get_current(trainer):
+    """
+    Gets the array whose change between checkpoints is logged for a model:
+    the topics of an LDA model or the singular values of an LSI model.
+    """
+
+    if isinstance(trainer, LdaTrainer):
+        return trainer.model.get_topics()
+
+    return trainer.model.projection.s
+
+def train_models(dictionary, filename, models, directory=None, passes=1,
+        every=CHECKPOINT_EVERY, templates=None, initial=None, vectors=None):
+    """
+    Trains topic models over a term file with checkpoints in `directory` (if
+    given), resuming from the latest one. `models` lists (name, model type,
+    number of topics) triples and `initial` optionally maps names to existing
+    models to train further. Templates are generated under the given template
+    policy (see `syntrec.corpus.TemplatePolicy`). `vectors` optionally maps
+    the names of LDA models to files in which to record their document
+    vectors. Returns a dictionary mapping names to models.
+
+    LSI models are built in a single pass; further passes would count every
+    document again, so they are only supported for LDA.
+    """
+
+    for name, model_type, _ in models:
+        if model_type == 'lsi' and (passes > 1 or name in (initial or {})):
+            raise ValueError("LSI models cannot be trained for more than" \
+                    " one pass")
+        if model_type == 'lsi' and name in (vectors or {}):
+            raise ValueError("Document vectors can only be recorded for" \
+                    " LDA models")
+
+    corpus = TrecCorpus(dictionary, filename, templates)
+    training = Training.start(directory, dictionary, len(corpus), models,
+            initial, vectors)
+
+    return training.run(dictionary, filename, passes, every, templates)
+
+def read_checkpoint(directory):
+
+    filename = os.path.join(directory, CHECKPOINT)
+    if not os.path.exists(filename):
+        return None
+
+    with open(filename, 'r') as infile:
+        return json.load(infile)
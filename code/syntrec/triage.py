@@ -0,0 +1,222 @@
+"""
+Provides a cheap triage of documents ahead of the parse. Many documents carry
+almost no usable text: empty abstracts, parses of papers in other languages,
+PDF extractions holding only a reference list, or garbled OCR. Parsing them
+with Parmenides or spaCy costs as much as parsing real text and adds only
+noise to the term file.
+
+Triage scores the text of each document with heuristics linear in its
+length: the number of characters, the proportions of letters and digits, the
+mean word length, and the proportion of common English function words (a
+rough language check), counted a section at a time. Documents whose body
+passes are processed in full, those with only a usable title and abstract are
+cut down to those, and the rest are skipped. Sections named like reference
+lists never count towards the body.
+"""
+
+import re
+
+from syntrec.sections import ABSTRACT
+from syntrec.source.stream import iter_sections, map_sections
+
+FULL = 'full'
+ABSTRACT_ONLY = 'abstract'
+SKIP = 'skip'
+
+MIN_CHARS = 500
+MIN_ABSTRACT_CHARS = 50
+MIN_ALPHA_RATIO = 0.7
+MAX_DIGIT_RATIO = 0.1
+MIN_STOPWORD_RATIO = 0.15
+MIN_WORD_LENGTH = 3.0
+MAX_WORD_LENGTH = 12.0
+
+REFERENCES = r'^\s*(references|bibliography|literature cited)\s*$'
+
+STOPWORDS = frozenset("""
+a about after all also an and are as at be been but by can could for from
+had has have in into is it its may more not of on or other our than that the
+their these they this those to was were which while with would
+""".split())
+
+class Triage:
+    """
+    Routes each document to full processing, an abstract-only fallback or to
+    be skipped. The thresholds apply to the body (every section other than the
+    abstract and the references) for full processing, and to the title and
+    abstract for the fallback.
+    """
+
+    def __init__(self, min_chars=MIN_CHARS,
+            min_abstract_chars=MIN_ABSTRACT_CHARS,
+            min_alpha_ratio=MIN_ALPHA_RATIO, max_digit_ratio=MAX_DIGIT_RATIO,
+            min_stopword_ratio=MIN_STOPWORD_RATIO):
+
+        self.min_chars = min_chars
+        self.min_abstract_chars = min_abstract_chars
+        self.min_alpha_ratio = min_alpha_ratio
+        self.max_digit_ratio = max_digit_ratio
+        self.min_stopword_ratio = min_stopword_ratio
+
+        self.abstract_pattern = re.compile(ABSTRACT, re.IGNORECASE)
+        self.references_pattern = re.compile(REFERENCES, re.IGNORECASE)
+
+        self.log = []
+        self.stats = {FULL: 0, ABSTRACT_ONLY: 0, SKIP: 0}
+
+    @classmethod
+    def from_dict(cls, data):
+
+        return cls(**data)
+
+    def to_dict(self):
+
+        return {
+            'min_chars': self.min_chars,
+            'min_abstract_chars': self.min_abstract_chars,
+            'min_alpha_ratio': self.min_alpha_ratio,
+            'max_digit_ratio': self.max_digit_ratio,
+            'min_stopword_ratio': self.min_stopword_ratio,
+        }
+
+    def route(self, document):
+        """
+        Gets the route of a document, along with the reason for a fallback or
+        a skip (None for full processing).
+        """
+
+        body = count_text('')
+        abstract = count_text(document.title or '')
+        for section in iter_sections(document):
+            name = section.name or ''
+            if self.abstract_pattern.search(name):
+                count_text(section.content or '', abstract)
+            elif not self.references_pattern.search(name):
+                count_text(section.content or '', body)
+
+        reason = self.check_stats(get_ratios(body), self.min_chars)
+        if reason is None:
+            return FULL, None
+
+        fallback = self.check_stats(get_ratios(abstract),
+                self.min_abstract_chars)
+        if fallback is None:
+            return ABSTRACT_ONLY, 'body %s' % reason
+
+        return SKIP, 'body %s, abstract %s' % (reason, fallback)
+
+    def check(self, text, min_chars):
+        """
+        Checks whether a text looks like usable English prose, returning None
+        if it does or the reason it does not.
+        """
+
+        return self.check_stats(get_stats(text), min_chars)
+
+    def check_stats(self, stats, min_chars):
+        """
+        Checks the statistics of a text (see `get_stats`).
+        """
+
+        if stats['chars'] < min_chars:
+            return "too short (%d characters)" % stats['chars']
+        if stats['alpha_ratio'] < self.min_alpha_ratio:
+            return "too few letters (%.2f)" % stats['alpha_ratio']
+        if stats['digit_ratio'] > self.max_digit_ratio:
+            return "too many digits (%.2f)" % stats['digit_ratio']
+        if not MIN_WORD_LENGTH <= stats['word_length'] <= MAX_WORD_LENGTH:
+            return "garbled words (mean length %.1f)" % stats['word_length']
+        if stats['stopword_ratio'] < self.min_stopword_ratio:
+            return "not English (%.2f function words)" % \
+                    stats['stopword_ratio']
+
+        return None
+
+    def apply(self, document):
+        """
+        Triages a document, returning the document itself for full
+        processing, a copy holding only its abstract for the fallback, or
+        None if it is to be skipped.
+        """
+
+        route, reason = self.route(document)
+        self.stats[route] += 1
+        if reason is not None:
+            self.log.append((document.identifier, '%s: %s' % (route,
+                reason)))
+
+        if route == FULL:
+            return document
+        elif route == SKIP:
+            return None
+
+        return map_sections(document, self.get_abstract)
+
+    def get_abstract(self, section):
+
+        if self.abstract_pattern.search(section.name or ''):
+            return section
+
+        return None
+
+    def apply_all(self, documents):
+
+        for document in documents:
+            triaged = self.apply(document)
+            if triaged is not None:
+                yield triaged
+
+    def write_log(self, filename):
+
+        with open(filename, 'w') as outfile:
+            for doc_id, action in self.log:
+                outfile.write("%s\t%s\n" % (doc_id, action))
+
+def get_stats(text):
+    """
+    Gets the number of non-space characters of a text, the proportions of
+    them that are letters and digits, the mean length of its words and the
+    proportion of its words that are common English function words.
+    """
+
+    return get_ratios(count_text(text))
+
+def count_text(text, counts=None):
+    """
+    Counts the characters, letters, digits, words and function words of a
+    text, adding them to `counts` if given. Texts counted together have the
+    counts of the texts joined with spaces, so a document can be counted one
+    section at a time.
+    """
+
+    if counts is None:
+        counts = {'chars': 0, 'alpha': 0, 'digits': 0, 'words': 0,
+                'stopwords': 0}
+
+    words = text.split()
+    counts['chars'] += sum(len(word) for word in words)
+    counts['alpha'] += sum(1 for char in text if char.isalpha())
+    counts['digits'] += sum(1 for char in text if char.isdigit())
+    counts['words'] += len(words)
+    counts['stopwords'] += sum(1 for word in words if word.lower().strip(
+        '.,;:()[]"\'') in STOPWORDS)
+
+    return counts
+
+def get_ratios(counts):
+    """
+    Gets the statistics of a text (see `get_stats`) from its counts.
+    """
+
+    num_chars = counts['chars']
+    if not num_chars:
+        return {'chars': 0, 'alpha_ratio': 0.0, 'digit_ratio': 0.0,
+                'word_length': 0.0, 'stopword_ratio': 0.0}
+
+    return {
+        'chars': num_chars,
+        'alpha_ratio': counts['alpha'] / num_chars,
+        'digit_ratio': counts['digits'] / num_chars,
+        'word_length': num_chars / counts['words'],
+        'stopword_ratio': counts['stopwords'] / counts['words'],
+    }
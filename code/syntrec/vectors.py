@@ -0,0 +1,157 @@
+"""
+Provides reuse of the document vectors computed while training LDA models.
+Every update of an LDA model runs variational inference on its chunk of
+documents, and indexing the corpus afterwards (`model[corpus]`) runs it again
+on every document. Instead, the trainer can record the topic distribution of
+each document from its E-step in a memory-mapped array, `<model>.vectors.npy`,
+one row per document in term file order. Over several passes, each row is
+overwritten until it holds the distribution from the final pass.
+
+The recorded distributions were inferred with the model as it stood when
+their chunk was reached, not with the final model, so before an index is
+built from them they are checked against re-inference on a random sample of
+documents: the sample is ranked against itself, once with the recorded
+vectors and once with re-inferred ones, and the first `CUTOFF` documents of
+the rankings must overlap by at least `MIN_OVERLAP` on average. The rows are
+scaled to unit length before they are indexed, as gensim scales inferred
+documents, so that scores are cosine similarities either way.
+
+LSI models are not covered. gensim keeps only the left singular vectors and
+singular values of an LSI model, not the document vectors, and the
+projections of early chunks are in a basis that later chunks change.
+Projecting a document onto the final basis is a single sparse product in any
+case, without any iterative inference to save.
+"""
+
+import os
+
+import numpy as np
+from gensim import similarities
+
+from syntrec.indexing import write_doc_ids
+from syntrec.quantize import get_overlap
+from syntrec.ranking import top_k
+from syntrec.sharding import normalize
+
+SUFFIX = '.vectors.npy'
+SAMPLE_SIZE = 500
+CUTOFF = 10
+MIN_OVERLAP = 0.8
+BLOCK_SIZE = 10000
+
+def get_filename(prefix):
+
+    return prefix + SUFFIX
+
+def open_vectors(filename, num_docs, num_topics):
+    """
+    Opens a memory-mapped array to record the vectors of `num_docs` documents
+    in, reopening an existing one of the same shape so that an interrupted
+    training job keeps the vectors it has already recorded.
+    """
+
+    shape = (num_docs, num_topics)
+    if os.path.exists(filename):
+        vectors = np.load(filename, mmap_mode='r+')
+        if vectors.shape == shape and vectors.dtype == np.float32:
+            return vectors
+        del vectors
+
+    return np.lib.format.open_memmap(filename, mode='w+', dtype=np.float32,
+            shape=shape)
+
+def load_vectors(filename):
+
+    return np.load(filename, mmap_mode='r')
+
+def get_distributions(gamma):
+    """
+    Normalizes the variational parameters of a chunk of documents into topic
+    distributions, as `LdaModel.get_document_topics` does.
+    """
+
+    gamma = np.asarray(gamma, dtype=np.float32)
+
+    return gamma / gamma.sum(axis=1, keepdims=True)
+
+def get_model_vectors(model, vectors):
+    """
+    Gets the rows of recorded vectors as the model would represent the
+    documents, dropping topics below its minimum probability.
+    """
+
+    vectors = np.array(vectors, dtype=np.float32)
+    vectors[vectors < max(model.minimum_probability, 1e-8)] = 0
+
+    return vectors
+
+def get_index_vectors(model, vectors):
+    """
+    Gets the rows of recorded vectors as they are stored in an index: as the
+    model would represent the documents, scaled to unit length as gensim
+    scales the sparse vectors of inferred documents. gensim does not scale
+    dense vectors itself.
+    """
+
+    return normalize(get_model_vectors(model, vectors))
+
+def check_vectors(model, corpus, vectors, sample_size=SAMPLE_SIZE, k=CUTOFF,
+        seed=0):
+    """
+    Compares recorded vectors with re-inference on a random sample of the
+    documents of a corpus, which must allow access to documents by position.
+    An index is built over the sample from each, as `build_index` and
+    `syntrec.indexing.build_index` would build them, and both are queried with
+    the inferred vectors of the sample. Returns the mean cosine similarity of
+    the two vectors of each document (its score against its own recorded
+    vector), the mean absolute difference between the scores of the two
+    indexes, and the mean overlap of the first `k` documents of their
+    rankings, with self-matches left out.
+    """
+
+    num_docs = len(vectors)
+    sample = np.sort(np.random.RandomState(seed).choice(num_docs,
+        min(sample_size, num_docs), replace=False))
+
+    queries = [model[corpus[int(position)]] for position in sample]
+    indexes = [
+        similarities.MatrixSimilarity(get_index_vectors(model,
+            vectors[sample]), num_features=model.num_topics),
+        similarities.MatrixSimilarity(queries,
+            num_features=model.num_topics),
+    ]
+    recorded, inferred = [np.atleast_2d(index[queries]) for index in indexes]
+    cosine = float(np.mean(np.diag(recorded)))
+    error = float(np.mean(np.abs(recorded - inferred)))
+
+    k = min(k, len(sample) - 1)
+    if k < 1:
+        return {'cosine': cosine, 'error': error, 'overlap': 1.0}
+
+    rankings = []
+    for scores in (recorded, inferred):
+        scores = np.array(scores)
+        np.fill_diagonal(scores, -np.inf)
+        rankings.append(top_k(scores, k)[0])
+
+    return {
+        'cosine': cosine,
+        'error': error,
+        'overlap': float(get_overlap(rankings[0], rankings[1], k)),
+    }
+
+def build_index(prefix, model, vectors, doc_ids):
+    """
+    Builds and saves an index over recorded vectors, as
+    `syntrec.indexing.build_index` does over a corpus.
+    """
+
+    index = similarities.Similarity(prefix, None,
+            num_features=model.num_topics)
+    for start in range(0, len(vectors), BLOCK_SIZE):
+        index.add_documents(get_index_vectors(model,
+            vectors[start:start + BLOCK_SIZE]))
+    index.save(prefix)
+    write_doc_ids(doc_ids, prefix)
+
+    return index
@@ -0,0 +1,124 @@
+"""
+Provides bounded-memory word extraction for the spaCy baseline. Rather than
+joining every section of a document into one string and truncating it to fit
+within spaCy's length limit, documents are split into chunks at section
+boundaries, and overlong sections are further split at sentence boundaries.
+Chunks are parsed in batches and each parse is released as soon as its words
+have been emitted, so no text is lost and memory use does not grow with the
+length of the document. The sections of streaming documents (see
+`syntrec.source.stream`) are read only as the chunks are packed.
+"""
+
+import re
+
+from syntrec.source.stream import iter_sections
+
+SPACY_MODEL = 'en'
+MAX_CHUNK_CHARS = 100000
+BATCH_SIZE = 4
+EXCLUDED_TAGS = ['PRON', 'PRP', 'PRP$']
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+nlp = None
+
+def get_nlp():
+    """
+    Gets the shared spaCy pipeline, loading it on first use. spaCy is imported
+    here rather than at module level so that code which never parses text does
+    not pay for loading the model.
+    """
+
+    global nlp
+    if nlp is None:
+        import spacy
+        nlp = spacy.load(SPACY_MODEL)
+
+    return nlp
+
+def get_chunks(document, max_chars=MAX_CHUNK_CHARS):
+    """
+    Splits a Parmenides document into strings of at most `max_chars`
+    characters, reading its sections as they are needed. Sections are packed
+    into chunks whole where possible; a section which does not fit into a
+    chunk by itself is split with `split_text`.
+    """
+
+    chunk = []
+    size = 0
+
+    for text in get_texts(document):
+        for piece in split_text(text, max_chars):
+            if chunk and size + len(piece) + 1 > max_chars:
+                yield ' '.join(chunk)
+                chunk = []
+                size = 0
+            chunk.append(piece)
+            size += len(piece) + 1
+
+    if chunk:
+        yield ' '.join(chunk)
+
+def get_texts(document):
+    """
+    Yields the title of a document and then the text of each of its sections,
+    reading the sections of a streaming document one at a time.
+    """
+
+    if document.title:
+        yield document.title
+    for section in iter_sections(document):
+        yield "%s %s" % (section.name, section.content)
+
+def split_text(text, max_chars=MAX_CHUNK_CHARS):
+    """
+    Splits a string into pieces of at most `max_chars` characters. Splits are
+    made at the last sentence boundary that fits, falling back to the last
+    space and, for text with no spaces at all, to a hard cut.
+    """
+
+    start = 0
+    while len(text) - start > max_chars:
+        end = start + max_chars
+
+        cut = None
+        for match in SENTENCE_BOUNDARY.finditer(text, start + 1, end):
+            cut = match.span()
+        if cut is None:
+            space = text.rfind(' ', start + 1, end)
+            cut = (space, space + 1) if space >= 0 else (end, end)
+
+        yield text[start:cut[0]]
+        start = cut[1]
+
+    yield text[start:]
+
+def is_excluded(word):
+    """
+    Determines whether a spaCy token should be left out of the baseline word
+    list: stop words, URLs, non-alphanumeric tokens and pronouns are excluded.
+    """
+
+    return word.is_stop or word.like_url or not word.text.isalnum() \
+            or word.text.strip() == '' or \
+            word.pos in EXCLUDED_TAGS or \
+            word.tag in EXCLUDED_TAGS
+
+def iter_doc_words(document, nlp=None, max_chars=MAX_CHUNK_CHARS,
+        batch_size=BATCH_SIZE):
+    """
+    Yields the lemmatized, lowercased content words of a Parmenides document.
+    Chunks are parsed `batch_size` at a time; at most one batch of parses is
+    alive at any point. If no pipeline is given, the shared one is used.
+    """
+
+    if nlp is None:
+        nlp = get_nlp()
+
+    for doc in nlp.pipe(get_chunks(document, max_chars),
+            batch_size=batch_size):
+        for word in doc:
+            if is_excluded(word):
+                continue
+
+            yield word.lemma_.strip().lower()
@@ -0,0 +1,81 @@
+"""
+Tests near-duplicate detection: MinHash values are exact universal hashes,
+near-duplicates are grouped under their longest copy, and distinct documents
+are kept.
+"""
+
+import random
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from syntrec.dedup import MERSENNE_PRIME, MinHasher, find_duplicates, \
+        get_shingle_hashes
+
+def make_document(identifier, title, *sections):
+
+    return SimpleNamespace(identifier=identifier, title=title,
+            sections=[SimpleNamespace(name=str(number), content=content) \
+                    for number, content in enumerate(sections)])
+
+def make_text(generator, num_words):
+
+    return ' '.join('w%d' % generator.randint(0, 5000) for _ in \
+            range(num_words))
+
+class MinHasherTest(unittest.TestCase):
+
+    def test_exact_hashes(self):
+
+        hasher = MinHasher(16)
+        hashes = np.array([0, 1, 12345, (1 << 32) - 1, 3141592653],
+                dtype=np.uint64)
+        prime = int(MERSENNE_PRIME)
+        expected = [min((int(a) * int(x) + int(b)) % prime & 0xffffffff \
+                for x in hashes) for a, b in zip(hasher.a, hasher.b)]
+
+        self.assertEqual(hasher.get_signature(hashes).tolist(), expected)
+
+class FindDuplicatesTest(unittest.TestCase):
+
+    def test_near_duplicates(self):
+
+        generator = random.Random(0)
+        abstract = make_text(generator, 60)
+        body = make_text(generator, 400)
+
+        # A copy with a few words changed, and a longer one with an extra
+        # paragraph
+        words = body.split()
+        for position in [50, 200, 350]:
+            words[position] = 'changed'
+        edited = ' '.join(words)
+        extended = body + ' ' + make_text(generator, 20)
+
+        documents = [
+            make_document('original', 'A title', abstract, body),
+            make_document('edited', 'A title', abstract, edited),
+            make_document('extended', 'A title', abstract, extended),
+            make_document('same-abstract', 'A title', abstract,
+                make_text(generator, 400)),
+            make_document('distinct', 'Another title', make_text(generator,
+                60), make_text(generator, 400)),
+            make_document('empty', ''),
+        ]
+        duplicates = find_duplicates(documents)
+
+        self.assertEqual(duplicates.canonical, {'original': 'extended',
+            'edited': 'extended'})
+        self.assertEqual(sorted(duplicates.get_copies('extended')),
+                ['edited', 'original'])
+        for doc_id in ['extended', 'same-abstract', 'distinct', 'empty']:
+            self.assertFalse(duplicates.is_duplicate(doc_id))
+
+    def test_shingles(self):
+
+        self.assertEqual(len(get_shingle_hashes('a b c d e f', 5)), 2)
+        self.assertEqual(len(get_shingle_hashes('a b c', 5)), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Tests that the parallel dictionary builder gives the same dictionary as a
+serial gensim build over the same term file.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from gensim import corpora
+
+from syntrec.corpus import TemplatePolicy, TrecReader
+from syntrec.dictionary import build_dictionary
+
+DOCUMENTS = [
+    'd1 virus spread virus:0:spread the:1:virus:0:spread',
+    'd2 mask spread mask:0:spread mask',
+    'd3 zebra the:1:virus:0:spread apple',
+    'd4',
+    'd5 virus mask:0:spread virus:0:spread virus',
+    'd6 apple apple:0:pie:1:recipe pie',
+    'd7 mask:0:spread the:1:virus:0:spread zebra',
+    'd8 recipe apple:0:pie:1:recipe mask',
+]
+
+class BuildDictionaryTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'terms.txt')
+        with open(self.filename, 'w') as outfile:
+            for document in DOCUMENTS:
+                outfile.write('%s\n' % document)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def get_serial(self, templates=None):
+
+        dictionary = corpora.Dictionary(terms for _, terms in \
+                TrecReader(self.filename, templates))
+        if templates is not None:
+            templates.filter_dictionary(dictionary)
+
+        return dictionary
+
+    def assertSameDictionary(self, dictionary, expected):
+
+        self.assertEqual(dictionary.token2id, expected.token2id)
+        self.assertEqual(dictionary.dfs, expected.dfs)
+        self.assertEqual(dictionary.cfs, expected.cfs)
+        self.assertEqual((dictionary.num_docs, dictionary.num_pos,
+            dictionary.num_nnz), (expected.num_docs, expected.num_pos,
+                expected.num_nnz))
+
+    def test_matches_serial_build(self):
+
+        expected = self.get_serial()
+        for num_workers in [1, 2, 3]:
+            with self.subTest(num_workers=num_workers):
+                self.assertSameDictionary(build_dictionary(self.filename,
+                    num_workers=num_workers), expected)
+
+    def test_matches_serial_build_with_bounds(self):
+
+        templates = TemplatePolicy(min_df=3, max_df=0.5)
+        expected = self.get_serial(templates)
+        for num_workers in [1, 2]:
+            with self.subTest(num_workers=num_workers):
+                self.assertSameDictionary(build_dictionary(self.filename,
+                    templates, num_workers), expected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Tests that a frozen dictionary looks tokens up exactly as the gensim
+dictionary it was frozen from.
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from gensim import corpora
+
+from syntrec.frozendict import FrozenDictionary, freeze, load_dictionary
+
+DOCUMENTS = [
+    ['virus', 'spread', 'virus:0:spread', '_:0:spread', 'virus'],
+    ['mask', 'spread', 'mask:0:spread', 'naïve', 'β-coronavirus'],
+    ['zebra', 'virus', 'the:1:virus:0:spread', 'mask', 'mask', 'mask'],
+]
+
+class FrozenDictionaryTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def freeze(self, dictionary):
+
+        filename = os.path.join(self.directory, 'dictionary.frozen')
+        freeze(dictionary, filename)
+        frozen = load_dictionary(filename)
+        self.addCleanup(frozen.close)
+
+        return frozen
+
+    def test_matches_gensim(self):
+
+        dictionary = corpora.Dictionary(DOCUMENTS)
+        frozen = self.freeze(dictionary)
+
+        self.assertIsInstance(frozen, FrozenDictionary)
+        self.assertEqual(len(frozen), len(dictionary))
+        for token, token_id in dictionary.token2id.items():
+            self.assertEqual(frozen.token2id[token], token_id)
+            self.assertEqual(frozen[token_id], token)
+            self.assertEqual(frozen.dfs[token_id], dictionary.dfs[token_id])
+            self.assertEqual(frozen.cfs[token_id], dictionary.cfs[token_id])
+        self.assertEqual((frozen.num_docs, frozen.num_pos, frozen.num_nnz),
+                (dictionary.num_docs, dictionary.num_pos,
+                    dictionary.num_nnz))
+
+        unknown = ['unknown', 'virus:0:_', 'Virus', '']
+        for document in DOCUMENTS + [unknown, unknown + DOCUMENTS[1], []]:
+            self.assertEqual(frozen.doc2bow(document),
+                    dictionary.doc2bow(document))
+        for token in unknown:
+            self.assertNotIn(token, frozen.token2id)
+            self.assertIsNone(frozen.token2id.get(token))
+            with self.assertRaises(KeyError):
+                frozen.token2id[token]
+
+    def test_empty_dictionary(self):
+
+        frozen = self.freeze(corpora.Dictionary())
+
+        self.assertEqual(len(frozen), 0)
+        self.assertEqual(frozen.doc2bow(['virus', 'virus']), [])
+        self.assertNotIn('virus', frozen.token2id)
+        with self.assertRaises(KeyError):
+            frozen[0]
+
+    def test_pickled(self):
+
+        dictionary = corpora.Dictionary(DOCUMENTS)
+        frozen = pickle.loads(pickle.dumps(self.freeze(dictionary)))
+        self.addCleanup(frozen.close)
+
+        self.assertEqual(frozen.doc2bow(DOCUMENTS[2]),
+                dictionary.doc2bow(DOCUMENTS[2]))
+
+    def test_gaps_are_rejected(self):
+
+        dictionary = corpora.Dictionary(DOCUMENTS)
+        del dictionary.token2id[dictionary[0]]
+
+        with self.assertRaises(ValueError):
+            freeze(dictionary, os.path.join(self.directory, 'gaps.frozen'))
+
+if __name__ == '__main__':
+    unittest.main()
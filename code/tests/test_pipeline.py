@@ -0,0 +1,104 @@
+"""
+Tests the pipeline runner: artifacts are reused while a stage's inputs and
+code are unchanged, and rebuilt when either changes, and the stages of a group
+needing a rebuild are built together.
+"""
+
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from syntrec.pipeline import Pipeline
+
+STAGES = '''
+def make_count(output, size):
+
+    with open(output + '/count.txt', 'w') as outfile:
+        outfile.write(str(size * %d))
+'''
+
+BUILDS = []
+
+def make_group(jobs):
+
+    BUILDS.append(sorted(params['name'] for _, _, params in jobs))
+    for output, _, params in jobs:
+        with open(os.path.join(output, 'size.txt'), 'w') as outfile:
+            outfile.write(str(params['size']))
+
+class PipelineTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.directory, 'cache')
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+        sys.modules.pop('stages', None)
+
+    def load_stages(self, factor):
+        """
+        Writes and imports a module of stage builds whose code depends on
+        `factor`.
+        """
+
+        filename = os.path.join(self.directory, 'stages.py')
+        with open(filename, 'w') as outfile:
+            outfile.write(STAGES % factor)
+        spec = importlib.util.spec_from_file_location('stages', filename)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        return module
+
+    def run_count(self, module, size):
+
+        pipeline = Pipeline(self.cache_dir)
+        pipeline.add('count', module.make_count, params={'size': size})
+        artifact = pipeline.run()['count']
+        with open(artifact.get_path('count.txt'), 'r') as infile:
+            return artifact.key, infile.read()
+
+    def test_unchanged_stage_is_cached(self):
+
+        stages = self.load_stages(2)
+        key, _ = self.run_count(stages, 3)
+
+        self.assertEqual(self.run_count(stages, 3)[0], key)
+        self.assertNotEqual(self.run_count(stages, 4)[0], key)
+
+    def test_changed_code_is_rebuilt(self):
+
+        key, count = self.run_count(self.load_stages(2), 3)
+        changed_key, changed_count = self.run_count(self.load_stages(10), 3)
+
+        self.assertEqual(count, '6')
+        self.assertNotEqual(changed_key, key)
+        self.assertEqual(changed_count, '30')
+
+    def test_group_is_built_together(self):
+
+        def run_group(sizes):
+            pipeline = Pipeline(self.cache_dir)
+            for name, size in sizes.items():
+                pipeline.add(name, make_group, params={'name': name,
+                    'size': size}, group='sizes')
+            return pipeline.run()
+
+        del BUILDS[:]
+        first = run_group({'a': 1, 'b': 2, 'c': 3})
+        second = run_group({'a': 1, 'b': 5, 'c': 3})
+
+        self.assertEqual(BUILDS, [['a', 'b', 'c'], ['b']])
+        self.assertEqual(second['a'].key, first['a'].key)
+        self.assertNotEqual(second['b'].key, first['b'].key)
+        with open(second['b'].get_path('size.txt'), 'r') as infile:
+            self.assertEqual(infile.read(), '5')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Tests that quantized indexes rank documents nearly as the full-precision
+vectors do.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from gensim import matutils, similarities
+
+from syntrec import quantize
+from syntrec.quantize import QuantizedIndex, get_overlap
+from syntrec.sharding import normalize
+
+NUM_DOCS = 500
+NUM_FEATURES = 20
+DEPTH = 10
+MIN_OVERLAP = {'float16': 0.99, 'int8': 0.9}
+
+class QuantizedIndexTest(unittest.TestCase):
+
+    def setUp(self):
+
+        random = np.random.default_rng(0)
+        self.vectors = normalize(random.standard_normal((NUM_DOCS,
+            NUM_FEATURES)))
+        self.queries = [matutils.full2sparse(vector) for vector in \
+                random.standard_normal((30, NUM_FEATURES))]
+
+        queries = normalize(np.vstack([matutils.sparse2full(query,
+            NUM_FEATURES) for query in self.queries]))
+        self.scores = queries @ self.vectors.T
+        self.expected = np.argsort(-self.scores, axis=1)[:, :DEPTH]
+
+    def assertCloseRanking(self, index, dtype):
+
+        positions, values = index.get_top(self.queries, DEPTH)
+
+        self.assertEqual(positions.shape, (len(self.queries), DEPTH))
+        self.assertGreaterEqual(get_overlap(positions, self.expected, DEPTH),
+                MIN_OVERLAP[dtype])
+        np.testing.assert_allclose(values, np.take_along_axis(self.scores,
+            positions, axis=1), atol=0.02)
+
+    def test_top_k_overlap(self):
+
+        for dtype in quantize.DTYPES:
+            with self.subTest(dtype=dtype):
+                index = QuantizedIndex.from_vectors(self.vectors, dtype)
+                self.assertEqual(index.codes.dtype, np.dtype(dtype))
+                self.assertCloseRanking(index, dtype)
+
+    def test_blocks(self):
+
+        # Scoring in blocks smaller than the collection and than the depth
+        # must give the same rankings as a single block.
+        for dtype in quantize.DTYPES:
+            with self.subTest(dtype=dtype):
+                index = QuantizedIndex.from_vectors(self.vectors, dtype)
+                expected = index.get_top(self.queries, DEPTH)
+                with mock.patch.object(quantize, 'BLOCK_SIZE', 7):
+                    positions, values = index.get_top(self.queries, DEPTH)
+
+                np.testing.assert_array_equal(positions, expected[0])
+                np.testing.assert_allclose(values, expected[1], rtol=1e-6)
+
+    def test_from_saved_index(self):
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        prefix = os.path.join(directory, 'index')
+
+        corpus = [matutils.full2sparse(vector) for vector in self.vectors]
+        index = similarities.Similarity(prefix, corpus, NUM_FEATURES,
+                shardsize=200)
+        QuantizedIndex.from_index(index, 'int8').save(prefix)
+
+        self.assertCloseRanking(QuantizedIndex.load(prefix, 'int8'), 'int8')
+
+    def test_unsupported_type(self):
+
+        with self.assertRaises(ValueError):
+            QuantizedIndex.from_vectors(self.vectors, 'int4')
+
+if __name__ == '__main__':
+    unittest.main()
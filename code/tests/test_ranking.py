@@ -0,0 +1,141 @@
+"""
+Tests top-k selection, merging and fusion against plain sorting.
+"""
+
+import unittest
+from collections import defaultdict
+
+import numpy as np
+
+from syntrec.ranking import RRF_K, fuse, merge_top_k, top_k
+
+def get_fused(positions, scores, depth, method):
+    """
+    Fuses rankings one topic and one document at a time, breaking ties by
+    position.
+    """
+
+    fused = []
+    for topic in range(positions.shape[1]):
+        sums = defaultdict(float)
+        for ranking in range(positions.shape[0]):
+            topic_scores = scores[ranking, topic]
+            low, high = topic_scores.min(), topic_scores.max()
+            for rank, position in enumerate(positions[ranking, topic]):
+                if method == 'rrf':
+                    sums[position] += 1.0 / (RRF_K + rank + 1)
+                else:
+                    sums[position] += (topic_scores[rank] - low) / \
+                            ((high - low) if high > low else 1)
+        best = sorted(sums.items(), key=lambda item: (-item[1],
+            item[0]))[:depth]
+        fused.append(([position for position, _ in best], [value for _,
+            value in best]))
+
+    return fused
+
+class TopKTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.random = np.random.default_rng(0)
+
+    def test_matches_sort(self):
+
+        scores = self.random.random((4, 30))
+        for k in [1, 5, 30, 40]:
+            with self.subTest(k=k):
+                positions, values = top_k(scores, k)
+                expected = np.argsort(-scores, axis=1)[:, :k]
+
+                np.testing.assert_array_equal(positions, expected)
+                np.testing.assert_array_equal(values, np.take_along_axis(
+                    scores, expected, axis=1))
+
+    def test_ties(self):
+
+        # Tied documents may be chosen in any order, but the scores must be
+        # the best ones and belong to the positions returned.
+        scores = self.random.integers(0, 4, (5, 20)).astype(np.float32)
+        for k in [3, 10, 20]:
+            with self.subTest(k=k):
+                positions, values = top_k(scores, k)
+
+                np.testing.assert_array_equal(values, -np.sort(-scores,
+                    axis=1)[:, :k])
+                np.testing.assert_array_equal(values, np.take_along_axis(
+                    scores, positions, axis=1))
+                for row in positions:
+                    self.assertEqual(len(set(row)), k)
+
+    def test_merge_matches_sort(self):
+
+        scores = self.random.random((3, 25))
+        bounds = [0, 7, 8, 25]
+        positions = []
+        values = []
+        for start, stop in zip(bounds, bounds[1:]):
+            shard_positions, shard_values = top_k(scores[:, start:stop],
+                    min(6, stop - start))
+            positions.append(shard_positions + start)
+            values.append(shard_values)
+
+        merged, merged_values = merge_top_k(positions, values, 6)
+        expected = np.argsort(-scores, axis=1)[:, :6]
+
+        np.testing.assert_array_equal(merged, expected)
+        np.testing.assert_array_equal(merged_values, np.take_along_axis(
+            scores, expected, axis=1))
+
+class FuseTest(unittest.TestCase):
+
+    def get_rankings(self, scores):
+
+        rankings = [top_k(ranking, 8) for ranking in scores]
+
+        return np.array([positions for positions, _ in rankings]), \
+                np.array([values for _, values in rankings])
+
+    def assertFused(self, positions, scores, depth, method):
+
+        fused = fuse(positions, scores, 50, depth, method)
+        expected = get_fused(positions, scores, depth, method)
+
+        self.assertEqual(len(fused), len(expected))
+        for (fused_positions, fused_scores), (positions, values) in zip(
+                fused, expected):
+            np.testing.assert_array_equal(fused_positions, positions)
+            np.testing.assert_allclose(fused_scores, values)
+
+    def test_matches_per_topic_fusion(self):
+
+        random = np.random.default_rng(0)
+        positions, scores = self.get_rankings(random.random((3, 4, 50)))
+        for method in ['rrf', 'combsum']:
+            for depth in [5, 30]:
+                with self.subTest(method=method, depth=depth):
+                    self.assertFused(positions, scores, depth, method)
+
+    def test_ties(self):
+
+        # Two rankings in opposite orders tie documents in pairs under RRF,
+        # and constant scores tie them all under CombSUM; ties go to the
+        # lower position.
+        positions = np.array([[[3, 1, 4, 0]], [[0, 4, 1, 3]]])
+        scores = np.ones(positions.shape)
+        expected = {'rrf': [0, 3, 1, 4], 'combsum': [0, 1, 3, 4]}
+        for method in ['rrf', 'combsum']:
+            with self.subTest(method=method):
+                self.assertFused(positions, scores, 4, method)
+                fused_positions, _ = fuse(positions, scores, 50, 4,
+                        method)[0]
+                np.testing.assert_array_equal(fused_positions,
+                        expected[method])
+
+    def test_unsupported_method(self):
+
+        with self.assertRaises(ValueError):
+            fuse(np.zeros((1, 1, 1)), np.zeros((1, 1, 1)), 1, 1, 'max')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+Tests the query service: requests are checked before they are batched, topics
+arriving together are ranked together, and the batcher outlives failing
+topics and clients which go away.
+"""
+
+import asyncio
+import time
+import unittest
+
+from syntrec.evaluation import RUN_DEPTH
+from syntrec.service import QueryService, parse_query
+
+TIMEOUT = 5
+
+class FakeService(QueryService):
+    """
+    A service whose rankings are made up from the topic texts, recording the
+    batches it ranks. Topics containing 'fail' fail, and ranking takes
+    `delay` seconds.
+    """
+
+    def __init__(self, max_batch=4, max_wait=0.05, delay=0):
+
+        super().__init__(None, None, None, [], None, max_batch, max_wait)
+        self.batches = []
+        self.delay = delay
+
+    def rank(self, texts, depth=RUN_DEPTH):
+
+        self.batches.append(list(texts))
+        time.sleep(self.delay)
+        if any('fail' in text for text in texts):
+            raise ValueError("Could not rank")
+
+        return [[(text, float(rank)) for rank in range(depth)] for text in \
+                texts]
+
+class ParseQueryTest(unittest.TestCase):
+
+    def test_valid_query(self):
+
+        self.assertEqual(parse_query(b'{"text": "a", "depth": 5}'), ('a', 5))
+        self.assertEqual(parse_query(b'{"text": "a"}'), ('a', RUN_DEPTH))
+
+    def test_malformed_queries(self):
+
+        for body in [b'', b'[]', b'{"text": 1}', b'{"text": "a", "depth": 0}',
+                b'{"text": "a", "depth": "5"}',
+                b'{"text": "a", "depth": true}', b'not json']:
+            with self.subTest(body=body):
+                with self.assertRaises(ValueError):
+                    parse_query(body)
+
+class BatchingTest(unittest.TestCase):
+
+    def run_service(self, service, main):
+
+        async def run():
+            service.queue = asyncio.Queue()
+            batcher = asyncio.create_task(service.run_batches())
+            try:
+                return await asyncio.wait_for(main(), TIMEOUT)
+            finally:
+                batcher.cancel()
+
+        return asyncio.run(run())
+
+    def test_topics_are_batched(self):
+
+        service = FakeService(max_batch=3)
+
+        async def main():
+            return await asyncio.gather(*[service.query(str(number), 2) for \
+                    number in range(5)])
+
+        results = self.run_service(service, main)
+
+        self.assertEqual([len(batch) for batch in service.batches], [3, 2])
+        self.assertEqual(results[4], [('4', 0.0), ('4', 1.0)])
+
+    def test_failing_topic_fails_alone(self):
+
+        service = FakeService()
+
+        async def main():
+            return await asyncio.gather(service.query('a', 1),
+                    service.query('fail', 1), return_exceptions=True)
+
+        ranking, error = self.run_service(service, main)
+
+        self.assertEqual(ranking, [('a', 0.0)])
+        self.assertIsInstance(error, ValueError)
+
+    def test_cancelled_client(self):
+
+        service = FakeService(max_wait=0, delay=0.1)
+
+        async def main():
+            # The client goes away while its batch is being ranked
+            client = asyncio.create_task(service.query('a', 1))
+            await asyncio.sleep(0.05)
+            client.cancel()
+            await asyncio.sleep(0.1)
+
+            return await service.query('b', 1)
+
+        self.assertEqual(self.run_service(service, main), [('b', 0.0)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+Tests the sharded index: its rankings match a search over all the vectors,
+and shard servers turn away clients without the shared key.
+"""
+
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+import numpy as np
+
+from syntrec.sharding import ShardedIndex, check_authkey, \
+        get_shard_filename, normalize, serve_shard
+
+AUTHKEY = b'a shared key'
+NUM_FEATURES = 4
+
+def get_free_port():
+
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+class ShardingTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.prefix = os.path.join(self.directory, 'index')
+
+        random = np.random.default_rng(0)
+        self.vectors = normalize(random.random((10, NUM_FEATURES)))
+        sizes = []
+        for number, shard in enumerate(np.array_split(self.vectors, 3)):
+            np.save(get_shard_filename(self.prefix, number), shard)
+            sizes.append(len(shard))
+        with open('%s.shards.json' % self.prefix, 'w') as outfile:
+            json.dump({'num_features': NUM_FEATURES, 'sizes': sizes},
+                    outfile)
+
+        self.queries = [[(0, 1.0), (2, 0.5)], [(1, 2.0), (3, 1.0)]]
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def get_expected(self, depth):
+
+        queries = np.zeros((len(self.queries), NUM_FEATURES))
+        for row, query in enumerate(self.queries):
+            for feature, value in query:
+                queries[row, feature] = value
+        scores = normalize(queries) @ self.vectors.T
+
+        return np.argsort(-scores, axis=1)[:, :depth]
+
+    def start_server(self, number):
+
+        address = ('localhost', get_free_port())
+        server = multiprocessing.Process(target=serve_shard,
+                args=(self.prefix, number, address, AUTHKEY), daemon=True)
+        server.start()
+        self.addCleanup(server.terminate)
+
+        # Wait for the server to listen
+        for _ in range(100):
+            try:
+                with socket.create_connection(address):
+                    break
+            except OSError:
+                time.sleep(0.05)
+
+        return address
+
+    def test_start_matches_full_search(self):
+
+        with ShardedIndex.start(self.prefix) as index:
+            positions, _ = index.get_top(self.queries, 5)
+
+        np.testing.assert_array_equal(positions, self.get_expected(5))
+
+    def test_connect_matches_full_search(self):
+
+        addresses = [self.start_server(number) for number in range(3)]
+        with ShardedIndex.connect(addresses, NUM_FEATURES, AUTHKEY) as index:
+            positions, _ = index.get_top(self.queries, 5)
+
+        np.testing.assert_array_equal(positions, self.get_expected(5))
+
+    def test_wrong_key_is_rejected(self):
+
+        address = self.start_server(0)
+        with self.assertRaises(AuthenticationError):
+            Client(address, authkey=b'a wrong key')
+
+        # The server keeps serving clients with the right key
+        with ShardedIndex.connect([address], NUM_FEATURES, AUTHKEY) as index:
+            positions, _ = index.get_top(self.queries, 2)
+        self.assertEqual(positions.shape, (2, 2))
+
+    def test_key_is_required(self):
+
+        with self.assertRaises(ValueError):
+            check_authkey(('localhost', 6000), None)
+
+if __name__ == '__main__':
+    unittest.main()
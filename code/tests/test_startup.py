@@ -0,0 +1,54 @@
+"""
+Tests that the syntrec command starts quickly. Its subcommands import gensim,
+numpy, spaCy and Parmenides only when they run, so printing the help must not
+load any of them.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['gensim', 'numpy', 'scipy', 'spacy', 'parmenides']
+MAX_SECONDS = 2.0
+
+# Runs the command with --help, then reports the modules it loaded.
+SCRIPT = """
+import json, runpy, sys
+sys.argv = ['syntrec', '--help']
+try:
+    runpy.run_module('syntrec', run_name='__main__')
+except SystemExit:
+    pass
+sys.stderr.write(json.dumps(sorted(sys.modules)))
+"""
+
+class StartupTest(unittest.TestCase):
+
+    def run_help(self):
+
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', SCRIPT], cwd=CODE_DIR,
+                capture_output=True, text=True, check=True)
+
+        return json.loads(result.stderr), time.perf_counter() - start
+
+    def test_help_imports_no_heavy_modules(self):
+
+        modules, _ = self.run_help()
+        loaded = [name for name in modules if name.split('.')[0] in \
+                HEAVY_MODULES]
+
+        self.assertEqual(loaded, [])
+
+    def test_help_is_fast(self):
+
+        _, seconds = self.run_help()
+
+        self.assertLess(seconds, MAX_SECONDS)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+"""
+Tests that ranking by streaming the shards of an index gives the same
+rankings as querying the gensim index itself.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from gensim import matutils, similarities
+
+from syntrec.streaming import StreamingIndex
+
+NUM_DOCS = 23
+NUM_FEATURES = 6
+SHARD_SIZE = 5
+
+class StreamingIndexTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        prefix = os.path.join(self.directory, 'index')
+
+        random = np.random.default_rng(0)
+        corpus = [matutils.full2sparse(vector) for vector in \
+                random.random((NUM_DOCS, NUM_FEATURES))]
+        self.index = similarities.Similarity(prefix, corpus, NUM_FEATURES,
+                shardsize=SHARD_SIZE)
+        self.index.save(prefix)
+        self.queries = [matutils.full2sparse(vector) for vector in \
+                random.random((7, NUM_FEATURES)) - 0.5]
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def test_matches_gensim(self):
+
+        self.assertGreater(len(self.index.shards), 2)
+
+        scores = self.index[self.queries]
+        for depth in [3, SHARD_SIZE + 3, NUM_DOCS + 10]:
+            for batch_size in [2, 64]:
+                with self.subTest(depth=depth, batch_size=batch_size):
+                    streaming = StreamingIndex(self.index, batch_size)
+                    positions, values = streaming.get_top(self.queries, depth)
+                    expected = np.argsort(-scores, axis=1,
+                            kind='stable')[:, :depth]
+
+                    np.testing.assert_array_equal(positions, expected)
+                    np.testing.assert_allclose(values, np.take_along_axis(
+                        scores, expected, axis=1), rtol=1e-5)
+
+    def test_no_queries(self):
+
+        positions, values = StreamingIndex(self.index).get_top([], 10)
+
+        self.assertEqual(positions.shape, (0, 0))
+        self.assertEqual(values.shape, (0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+Tests that LDA models trained through the corpus fan-out match gensim's own
+training over several passes, including when a job is interrupted and
+resumed from its checkpoint. The trainers reproduce gensim's passes by
+intercepting methods of `LdaModel`, so a change in gensim shows up here.
+"""
+
+import functools
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from gensim import corpora, models
+
+from syntrec import training
+from syntrec.corpus import TrecCorpus, TrecReader
+from syntrec.fanout import LdaTrainer, fan_out
+from syntrec.training import CHECKPOINT, Training, train_models
+
+CHUNK_SIZE = 20
+NUM_DOCS = 200
+NUM_TOPICS = 4
+EVERY = 3
+
+class Interrupted(Exception):
+    pass
+
+def get_trainer(model_type, dictionary, num_topics, num_docs=None,
+        model=None, vectors=None):
+
+    return LdaTrainer(dictionary, num_topics, num_docs, CHUNK_SIZE, model,
+            vectors)
+
+class TrainingTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'terms.txt')
+        generator = random.Random(0)
+        with open(self.filename, 'w') as outfile:
+            for number in range(NUM_DOCS):
+                outfile.write('d%d %s\n' % (number, ' '.join('w%d' % \
+                        generator.randint(0, 40) for _ in range(15))))
+
+        self.dictionary = corpora.Dictionary(terms for _, terms in \
+                TrecReader(self.filename))
+        self.corpus = list(TrecCorpus(self.dictionary, self.filename))
+
+        # Train with small chunks, so that a pass has several checkpoints
+        for name, value in [('get_trainer', get_trainer), ('fan_out',
+                functools.partial(fan_out, chunksize=CHUNK_SIZE))]:
+            patcher = mock.patch.object(training, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def get_expected(self, passes):
+
+        np.random.seed(0)
+
+        return models.LdaModel(self.corpus, id2word=self.dictionary,
+                num_topics=NUM_TOPICS, chunksize=CHUNK_SIZE, passes=passes,
+                eval_every=10)
+
+    def train(self, passes, directory=None):
+
+        return train_models(self.dictionary, self.filename, [('lda', 'lda',
+            NUM_TOPICS)], directory, passes, EVERY)['lda']
+
+    def assertSameModel(self, model, expected):
+
+        np.testing.assert_allclose(model.get_topics(), expected.get_topics(),
+                rtol=0, atol=1e-12)
+        np.testing.assert_allclose(model.alpha, expected.alpha, rtol=0,
+                atol=1e-12)
+
+    def test_matches_gensim(self):
+
+        for passes in [1, 3]:
+            with self.subTest(passes=passes):
+                expected = self.get_expected(passes)
+                np.random.seed(0)
+                self.assertSameModel(self.train(passes), expected)
+
+    def test_resumed_mid_pass_matches_gensim(self):
+
+        checkpoints = os.path.join(self.directory, 'checkpoints')
+        checkpoint = Training.checkpoint
+
+        # Stop at the first checkpoint in the middle of the second pass
+        def checkpoint_and_stop(training):
+            checkpoint(training)
+            if training.pass_ == 1 and training.position:
+                raise Interrupted()
+
+        np.random.seed(0)
+        with mock.patch.object(Training, 'checkpoint', checkpoint_and_stop):
+            with self.assertRaises(Interrupted):
+                self.train(3, checkpoints)
+
+        model = self.train(3, checkpoints)
+        self.assertSameModel(model, self.get_expected(3))
+
+        # Checkpoints after the resumed one still report their statistics
+        with open(os.path.join(checkpoints, CHECKPOINT), 'r') as infile:
+            history = json.load(infile)['history']
+        for entry in history[1:]:
+            self.assertIn('topic_change', entry['models']['lda'])
+        for entry in history[history.index(next(entry for entry in history \
+                if entry['pass'] == 1)):]:
+            self.assertIn('perplexity', entry['models']['lda'])
+
+if __name__ == '__main__':
+    unittest.main()